@@ -0,0 +1,210 @@
+"""
+Асинхронные представления api для режима ASGI (foodgram.asgi).
+
+В Django 3.2 нет асинхронного ORM: представление DRF выполняется
+в ограниченном пуле потоков (sync_to_async с собственным исполнителем),
+а цикл событий воркера в это время обслуживает другие соединения.
+Размер пула (ASGI["ORM_THREADS"]) ограничивает одновременные запросы
+к базе данных и количество соединений процесса; остальные запросы
+ждут в цикле событий, не занимая потоков.
+
+Потоковые ответы (скачивание Списка покупок) формируются в одном
+потоке пула и передаются в цикл событий через ограниченную очередь:
+Django 3.2 перебирает итератор потокового ответа в цикле событий,
+где обращения к базе запрещены, поэтому такой ответ заменяется
+ответом с асинхронным итератором (AsyncStreamingHttpResponse),
+который отправляет ASGIHandler этого модуля (foodgram.asgi).
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, nullcontext
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler as BaseASGIHandler
+from django.db import close_old_connections, connection
+from django.http import StreamingHttpResponse
+
+from .middleware import current_query_counter
+
+# Пул потоков для ORM
+orm_executor = ThreadPoolExecutor(
+    max_workers=settings.ASGI["ORM_THREADS"],
+    thread_name_prefix="orm",
+)
+
+# Маршруты api (имена URL), обслуживаемые асинхронно
+ASYNC_ROUTES = (
+    "recipes-list",
+    "recipes-detail",
+    "recipes-favorite",
+    "recipes-shopping-cart",
+    "recipes-download-shopping-cart",
+    "users-subscribe",
+    "ingredients-list",
+    "ingredients-detail",
+)
+
+# Частей потокового ответа в очереди между потоком пула и циклом
+# событий: поток ждет, пока медленный клиент их не получит
+STREAM_BUFFER = 16
+
+_END = object()
+
+
+def database_sync_to_async(func):
+    """
+    sync_to_async в пуле orm_executor. Соединения потока с базой
+    проверяются до и после вызова (как в обработчике запроса Django),
+    запросы учитываются в метриках текущего запроса к api.
+    """
+
+    def call(*args, **kwargs):
+        close_old_connections()
+        counter = current_query_counter.get()
+        try:
+            with (
+                connection.execute_wrapper(counter)
+                if counter is not None
+                else nullcontext()
+            ):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False, executor=orm_executor)
+
+
+def render_view(view, request, *args, **kwargs):
+    """Ответ представления, сформированный в потоке пула."""
+    response = view(request, *args, **kwargs)
+    if hasattr(response, "render") and callable(response.render):
+        response.render()
+    return response
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """
+    Потоковый ответ с асинхронным итератором содержимого
+    (в Django 3.2 его отправляет только ASGIHandler этого модуля).
+    """
+
+    is_async = True
+
+    @property
+    def streaming_content(self):
+        return self._stream()
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        self._iterator = value
+
+    async def _stream(self):
+        async with aclosing(self._iterator) as parts:
+            async for part in parts:
+                yield self.make_bytes(part)
+
+    def __iter__(self):
+        # ASGIHandler отправляет содержимое сам (send_response)
+        return iter(())
+
+
+async def stream_in_pool(response):
+    """
+    Части потокового ответа response: итератор перебирается в одном
+    потоке пула (чтение из базы идет через одно соединение), в памяти
+    не больше STREAM_BUFFER частей.
+    """
+    loop = asyncio.get_running_loop()
+    parts = asyncio.Queue(STREAM_BUFFER)
+    stopped = threading.Event()
+
+    def put(part):
+        if not stopped.is_set():
+            asyncio.run_coroutine_threadsafe(parts.put(part), loop).result()
+
+    def produce():
+        try:
+            for part in response.streaming_content:
+                if stopped.is_set():
+                    break
+                put(part)
+        finally:
+            response.close()
+            put(_END)
+
+    task = loop.create_task(database_sync_to_async(produce)())
+    try:
+        while True:
+            part = await parts.get()
+            if part is _END:
+                break
+            yield part
+        # Ошибка формирования ответа
+        await task
+    finally:
+        # Клиент отключился: поток пула завершается на следующей части
+        stopped.set()
+        while not parts.empty():
+            parts.get_nowait()
+
+
+def async_view(view):
+    """
+    Асинхронная обертка представления DRF: признаки представления
+    (csrf_exempt, actions для метрик) сохраняются.
+    """
+    run = database_sync_to_async(render_view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response = await run(view, request, *args, **kwargs)
+        if not response.streaming:
+            return response
+        streamed = AsyncStreamingHttpResponse(
+            stream_in_pool(response), status=response.status_code
+        )
+        for header, value in response.items():
+            streamed[header] = value
+        return streamed
+
+    return wrapper
+
+
+class ASGIHandler(BaseASGIHandler):
+    """
+    Обработчик ASGI, который отправляет содержимое
+    AsyncStreamingHttpResponse, не блокируя цикл событий.
+    """
+
+    async def send_response(self, response, send):
+        if not getattr(response, "is_async", False):
+            return await super().send_response(response, send)
+
+        async def send_streamed(message):
+            # Заголовки и cookie отправляет базовый обработчик; части
+            # содержимого - перед его завершающим сообщением
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body"
+            ):
+                async with aclosing(response.streaming_content) as parts:
+                    async for part in parts:
+                        for chunk, _ in self.chunk_bytes(part):
+                            await send({
+                                "type": "http.response.body",
+                                "body": chunk,
+                                "more_body": True,
+                            })
+            await send(message)
+
+        await super().send_response(response, send_streamed)
+
+
+def asyncify(urlpatterns):
+    """Маршруты ASYNC_ROUTES обслуживаются асинхронными представлениями."""
+    for pattern in urlpatterns:
+        if getattr(pattern, "name", None) in ASYNC_ROUTES:
+            pattern.callback = async_view(pattern.callback)
+    return urlpatterns
@@ -0,0 +1,162 @@
+"""
+Условные GET-запросы (If-None-Match, If-Modified-Since) к api.
+
+Версия ответа вычисляется до сериализации по служебным данным:
+времени изменения объекта (updated_at) или количеству и последнему
+изменению объектов выборки, и поколениям связанных данных
+(recipes.generations), например профилей авторов. Если версия
+совпадает с присланной клиентом, возвращается 304 без выборки
+и сериализации объектов.
+"""
+import hashlib
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from recipes import generations
+from recipes.models import Favorite, ShoppingCart
+from users.models import CustomUser, Subscribtion
+
+
+def _stats(model, field):
+    """Количество и последний id записей пользователя (подзапросы)."""
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+    )
+    return (
+        Subquery(rows.annotate(total=Count("id")).values("total")),
+        Subquery(rows.annotate(last=Max("id")).values("last")),
+    )
+
+
+def user_state(user) -> tuple:
+    """
+    Версия персональных данных пользователя: Избранное, Список покупок
+    и Подписки. Добавление меняет последний id, удаление - количество.
+    """
+    expressions = {}
+    for name, model in (
+        ("favorites", Favorite),
+        ("cart", ShoppingCart),
+        ("subscriptions", Subscribtion),
+    ):
+        total, last = _stats(model, "user")
+        expressions[f"{name}_total"] = total
+        expressions[f"{name}_last"] = last
+    return (user.pk,) + tuple(
+        CustomUser.objects.filter(pk=user.pk)
+        .annotate(**expressions)
+        .values_list(*expressions)
+        .get()
+    )
+
+
+def table_version(queryset) -> tuple:
+    """
+    Версия выборки: количество объектов и последнее изменение.
+    Удаление меняет количество, добавление и изменение - updated_at.
+    """
+    version = queryset.order_by().aggregate(
+        total=Count("id", distinct=True), last=Max("updated_at")
+    )
+    return version["total"], version["last"]
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы к list и retrieve.
+    По умолчанию версия вычисляется по updated_at объектов
+    get_version_queryset(); наследник может переопределить
+    get_list_version и get_object_version.
+    """
+
+    # Ответ зависит от Избранного, Списка покупок и Подписок пользователя
+    personalized = False
+    # Группы поколений (recipes.generations) данных, которые входят
+    # в ответ, но не меняют updated_at объектов
+    version_generations = ()
+
+    def get_version_queryset(self):
+        """Выборка для вычисления версии (без аннотаций и prefetch)."""
+        return self.get_queryset()
+
+    def get_list_version(self):
+        """Версия списка (любое значение с repr)."""
+        return table_version(
+            self.filter_queryset(self.get_version_queryset())
+        )
+
+    def get_object_version(self):
+        """Время изменения объекта (None, если объекта нет)."""
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            return (
+                self.get_version_queryset()
+                .filter(**{self.lookup_field: lookup})
+                .values_list("updated_at", flat=True)
+                .first()
+            )
+        except (TypeError, ValueError):
+            return None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.get_list_version(),
+            None,
+            lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        updated_at = self.get_object_version()
+        if updated_at is None:
+            # Ответ 404 сформирует get_object
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            request,
+            updated_at,
+            updated_at.timestamp(),
+            lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    def conditional_response(self, request, version, last_modified, render):
+        """
+        304, если версия (ETag) или время изменения совпадают
+        с присланными клиентом, иначе - ответ render().
+        Last-Modified (секунды) отправляется только для объектов:
+        удаление из списка его не меняет.
+        """
+        if self.version_generations:
+            current = generations.current(*self.version_generations)
+            version = (version, current)
+            if last_modified is not None:
+                # Поколение - время изменения в наносекундах
+                last_modified = max(last_modified, max(current) / 10**9)
+        if self.personalized and request.user.is_authenticated:
+            version = (version, user_state(request.user))
+            # Время изменения не отражает действия пользователя
+            last_modified = None
+        etag = quote_etag(
+            hashlib.md5(
+                repr((self.basename, self.action, version)).encode()
+            ).hexdigest()
+        )
+        if last_modified is not None:
+            last_modified = int(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = render()
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Authorization", "Cookie"))
+        return response
@@ -1,7 +1,10 @@
 from django_filters.rest_framework import FilterSet, filters
 
+from recipes import search
 from recipes.models import CustomUser, Ingredient, Recipe, Tag
 
+from .recipe_cache import filter_ids, user_sets
+
 
 # ReDoc: Поиск по частичному вхождению в начале названия ингредиента
 class IngredientFilter(FilterSet):
@@ -15,9 +18,11 @@ class IngredientFilter(FilterSet):
 
 
 # ReDoc: Доступна фильтрация по избранному, автору, списку покупок и тегам
+# REQ: Полнотекстовый поиск по названию и описанию (search)
 class RecipeFilter(FilterSet):
     """Фильтр для Рецепта (Recipe)."""
 
+    search = filters.CharFilter(method="get_search")
     is_favorited = filters.BooleanFilter(method="get_is_favorited")
     author = filters.ModelChoiceFilter(queryset=CustomUser.objects.all())
     is_in_shopping_cart = filters.BooleanFilter(
@@ -34,20 +39,37 @@ class RecipeFilter(FilterSet):
         fields = (
             "tags",
             "author",
+            "search",
         )
 
     # Определение метода для "is_favorited"
     def get_is_favorited(self, queryset, name, value):
-        """Фильтр наличия в Избранном (Favorite)."""
+        """Фильтр наличия в Избранном (Favorite) по набору id."""
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite__user=user)
+            return filter_ids(
+                queryset,
+                user_sets(self.request).favorites,
+                {"favorite__user": user},
+            )
         return queryset
 
     # Определение метода для "is_in_shopping_cart"
     def get_is_in_shopping_cart(self, queryset, name, value):
-        """Фильтр наличия в Спискe покупок (ShoppingCart)."""
+        """Фильтр наличия в Спискe покупок (ShoppingCart) по набору id."""
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_cart__user=user)
+            return filter_ids(
+                queryset,
+                user_sets(self.request).cart,
+                {"shopping_cart__user": user},
+            )
         return queryset
+
+    # Определение метода для "search"
+    def get_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск (recipes.search): Рецепты по убыванию
+        релевантности. Пагинация по ключу (cursor) сортирует по id.
+        """
+        return search.search(queryset, value)
@@ -0,0 +1,432 @@
+import json
+import re
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, Tag
+from users.models import CustomUser
+
+# Запросы api: (адрес, параметры, от имени пользователя).
+# Значения в фигурных скобках подставляются из sample_values()
+ENDPOINTS = (
+    ("/api/ingredients/", {"name": "{word}"}, False),
+    ("/api/ingredients/", {"q": "{word}"}, False),
+    ("/api/tags/", {}, False),
+    ("/api/tags/{tag_id}/", {}, False),
+    ("/api/recipes/", {}, False),
+    ("/api/recipes/", {}, True),
+    ("/api/recipes/", {"tags": "{tag}"}, True),
+    ("/api/recipes/", {"author": "{author}"}, True),
+    ("/api/recipes/", {"is_favorited": 1}, True),
+    ("/api/recipes/", {"is_in_shopping_cart": 1}, True),
+    ("/api/recipes/", {"search": "{word}"}, True),
+    ("/api/recipes/", {"cursor": "", "limit": 20}, False),
+    ("/api/recipes/{recipe}/", {}, True),
+    ("/api/recipes/download_shopping_cart/", {}, True),
+    ("/api/users/", {}, True),
+    ("/api/users/{author}/", {}, True),
+    ("/api/users/me/", {}, True),
+    ("/api/users/subscriptions/", {"recipes_limit": 3}, True),
+)
+
+# Кэш-заглушка на время анализа: кэш ответов анонимным пользователям,
+# общие тела Рецептов и наборы id пользователя не подменяют SQL-запросы
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+}
+
+# Столбцы, сравниваемые в условии с константой:
+# "таблица"."столбец" = 1 / IN (1, 2) (в SQL с подставленными параметрами)
+CONDITION = r'"{alias}"\."(\w+)" (?:=|IN \() ?(?:-?\d|\'|%s)'
+
+
+def sample_values() -> dict:
+    """
+    Представительные параметры запросов по текущей базе:
+    пользователь с наибольшим Избранным, самый активный автор,
+    самый частый тег и последний Рецепт.
+    """
+    favorite_user = (
+        Favorite.objects.values("user")
+        .annotate(total=Count("id"))
+        .order_by("-total")
+        .values_list("user", flat=True)
+        .first()
+    )
+    user = CustomUser.objects.filter(pk=favorite_user).first()
+    recipe = Recipe.objects.order_by("-id").first()
+    tag = (
+        Tag.objects.annotate(total=Count("recipes"))
+        .order_by("-total")
+        .first()
+    )
+    author = CustomUser.objects.order_by("-recipes_count").first()
+    return {
+        "user": user or CustomUser.objects.first(),
+        "author": author.id if author else 0,
+        "recipe": recipe.id if recipe else 0,
+        "word": recipe.name.split()[0] if recipe else "",
+        "tag": tag.slug if tag else "",
+        "tag_id": tag.id if tag else 0,
+    }
+
+
+class Command(BaseCommand):
+    """
+    Советы по индексам по фактическим запросам api.
+    Каждый запрос ENDPOINTS выполняется тестовым клиентом на текущей
+    базе без кэшей ответов, SQL-запросы перехватываются и анализируются
+    через EXPLAIN (ANALYZE, BUFFERS) в PostgreSQL или EXPLAIN QUERY PLAN
+    в SQLite: полные просмотры таблиц, сортировки без индекса
+    (с выгрузкой на диск) и индексы, которые их устранили бы.
+    Все изменения откатываются по завершении.
+    """
+
+    help = "Анализ планов SQL-запросов api и рекомендации по индексам."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=1000,
+            help="Не сообщать о просмотре таблиц меньшего размера.",
+        )
+        parser.add_argument(
+            "--verbose-sql",
+            action="store_true",
+            help="Выводить SQL-запросы с найденными проблемами.",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.table_rows = {}
+        self.tables = None
+        # {(таблица, столбцы): адреса запросов}
+        self.recommendations = defaultdict(set)
+        values = sample_values()
+        client = APIClient()
+        with override_settings(
+            CACHES=DUMMY_CACHES,
+            RESPONSE_CACHE={
+                **settings.RESPONSE_CACHE, "SHARED_RECIPES": False
+            },
+        ), transaction.atomic():
+            for url, params, authenticated in ENDPOINTS:
+                client.force_authenticate(
+                    values["user"] if authenticated else None
+                )
+                self.check_endpoint(client, url, params, values)
+            transaction.set_rollback(True)
+        self.report_recommendations()
+
+    def check_endpoint(self, client, url, params, values):
+        url = url.format(**values)
+        params = {
+            name: str(value).format(**values)
+            for name, value in params.items()
+        }
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, params)
+            if hasattr(response, "streaming_content"):
+                b"".join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+        title = url + ("?" + "&".join(
+            f"{name}={value}" for name, value in params.items()
+        ) if params else "")
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"GET {title} ({response.status_code}): "
+                f"запросов {len(queries)}, {elapsed:.1f} мс"
+            )
+        )
+        for query in queries.captured_queries:
+            sql = query["sql"]
+            if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            try:
+                with transaction.atomic():
+                    findings = self.explain(sql)
+            except DatabaseError as error:
+                self.stdout.write(f"  EXPLAIN не выполнен: {error}")
+                continue
+            for finding, recommendation in findings:
+                self.stdout.write(f"  {finding}")
+                if recommendation:
+                    self.recommendations[recommendation].add(title)
+            if findings and self.options["verbose_sql"]:
+                self.stdout.write(f"    {sql}")
+
+    def explain(self, sql) -> list:
+        """[(описание проблемы, (таблица, столбцы) или None)]."""
+        if connection.vendor == "postgresql":
+            return self.explain_postgresql(sql)
+        if connection.vendor == "sqlite":
+            return self.explain_sqlite(sql)
+        return []
+
+    # --- PostgreSQL ---
+
+    def explain_postgresql(self, sql) -> list:
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        findings = []
+        self.walk_postgresql(plan[0]["Plan"], findings, sort_keys=None)
+        return findings
+
+    def walk_postgresql(self, node, findings, sort_keys):
+        node_type = node["Node Type"]
+        loops = node.get("Actual Loops", 1)
+        if node_type == "Sort":
+            sort_keys = node.get("Sort Key", [])
+            if node.get("Sort Space Type") == "Disk":
+                findings.append((
+                    f"[sort на диске] {', '.join(sort_keys)}: "
+                    f"{node.get('Sort Method')}, "
+                    f"{node.get('Sort Space Used')} КиБ",
+                    None,
+                ))
+        elif node_type == "Hash" and node.get("Hash Batches", 1) > 1:
+            findings.append((
+                f"[hash на диске] пакетов {node['Hash Batches']}, "
+                f"{node.get('Peak Memory Usage')} КиБ",
+                None,
+            ))
+        elif node_type == "Seq Scan":
+            table = node["Relation Name"]
+            if self.is_large(table):
+                scanned = (
+                    node.get("Actual Rows", 0)
+                    + node.get("Rows Removed by Filter", 0)
+                ) * loops
+                condition = node.get("Filter", "")
+                columns = self.columns(
+                    table, re.findall(r"\(?(\w+) = ", condition)
+                )
+                columns += self.columns(
+                    table,
+                    [key.split(".")[-1] for key in sort_keys or ()],
+                    exclude=columns,
+                )
+                findings.append((
+                    f"[seq scan] {table}: просмотрено {scanned} строк"
+                    + (f", условие {condition}" if condition else "")
+                    + (f", buffers {node.get('Shared Read Blocks', 0)} "
+                       f"прочитано / {node.get('Shared Hit Blocks', 0)} "
+                       f"в кэше"),
+                    self.recommend(table, columns),
+                ))
+        elif node_type in ("Index Scan", "Index Only Scan") and sort_keys:
+            # Сортировка результата просмотра индекса: индекс
+            # с ключом сортировки позволил бы ее избежать
+            table = node["Relation Name"]
+            condition = node.get("Index Cond", "")
+            columns = self.columns(
+                table, re.findall(r"\(?(\w+) = ", condition)
+            )
+            columns += self.columns(
+                table,
+                [key.split(".")[-1] for key in sort_keys],
+                exclude=columns,
+            )
+            if self.is_large(table):
+                findings.append((
+                    f"[sort] {table}: {node.get('Actual Rows', 0) * loops} "
+                    f"строк из индекса {node['Index Name']} сортируются "
+                    f"по {', '.join(sort_keys)}",
+                    self.recommend(table, columns),
+                ))
+        for child in node.get("Plans", ()):
+            self.walk_postgresql(
+                child,
+                findings,
+                sort_keys if node_type in ("Sort", "Limit") else None,
+            )
+
+    # --- SQLite ---
+
+    def explain_sqlite(self, sql) -> list:
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[3] for row in cursor.fetchall()]
+        findings = []
+        for detail in plan:
+            match = re.match(
+                r"(SCAN|SEARCH) (\w+)(?: AS (\w+))?(?: USING (.+))?$", detail
+            )
+            if match:
+                finding = self.sqlite_access(sql, *match.groups())
+                if finding:
+                    findings.append(finding)
+            elif detail.startswith("USE TEMP B-TREE FOR ORDER BY"):
+                findings.append(self.sqlite_sort(sql))
+        return findings
+
+    def sqlite_access(self, sql, access, table, alias, index):
+        """
+        Полный просмотр таблицы или чтение строк таблицы связи после
+        поиска по индексу, который не содержит столбцов соединения
+        (составной индекс позволил бы обойтись без чтения таблицы).
+        """
+        if not self.is_large(table) or (index and "COVERING" in index):
+            return None
+        alias = alias or table
+        columns = self.columns(
+            table, re.findall(CONDITION.format(alias=alias), sql)
+        )
+        if access == "SCAN" and not index:
+            return (
+                f"[seq scan] {table}: {self.rows(table)} строк",
+                self.recommend(table, columns),
+            )
+        if (
+            access == "SEARCH"
+            and "PRIMARY KEY" not in index
+            and self.is_link_table(table)
+        ):
+            # Столбцы используемого индекса, затем столбцы,
+            # по которым таблица соединяется с другими
+            columns = self.columns(
+                table, re.findall(r"(\w+)=\?", index) + columns
+            )
+            joins = re.findall(
+                rf'= "{alias}"\."(\w+)"|"{alias}"\."(\w+)" = "\w+"\.', sql
+            )
+            columns += self.columns(
+                table, [left or right for left, right in joins],
+                exclude=columns,
+            )
+            recommendation = self.recommend(table, columns)
+            if recommendation:
+                return (
+                    f"[lookup] {table}: чтение строк после {index}",
+                    recommendation,
+                )
+        return None
+
+    def sqlite_sort(self, sql):
+        """Сортировка без индекса: ключи внешнего ORDER BY."""
+        keys = sql.rsplit("ORDER BY ", 1)[-1]
+        keys = re.split(r" LIMIT | OFFSET |\)", keys)[0]
+        table_columns = re.findall(r'"(\w+)"\."(\w+)"', keys)
+        recommendation = None
+        # Индекс поможет, только если сортируется ведущая таблица
+        # запроса (первая во FROM)
+        driving = re.search(r'FROM "(\w+)"', sql.rsplit("ORDER BY ", 1)[0])
+        if (
+            table_columns
+            and driving
+            and table_columns[0][0] == driving.group(1)
+            and self.is_large(driving.group(1))
+        ):
+            table = driving.group(1)
+            columns = self.columns(
+                table, re.findall(CONDITION.format(alias=table), sql)
+            )
+            columns += self.columns(
+                table,
+                [column for name, column in table_columns if name == table],
+                exclude=columns,
+            )
+            recommendation = self.recommend(table, columns)
+        return f"[sort] без индекса: ORDER BY {keys}", recommendation
+
+    # --- Общие ---
+
+    def is_large(self, table) -> bool:
+        """Таблица (не подзапрос) не меньше --min-rows строк."""
+        if self.tables is None:
+            self.tables = set(connection.introspection.table_names())
+        return table in self.tables and (
+            self.rows(table) >= self.options["min_rows"]
+        )
+
+    def is_link_table(self, table) -> bool:
+        """Таблица связи: только первичный и внешние ключи."""
+        with connection.cursor() as cursor:
+            description = connection.introspection.get_table_description(
+                cursor, table
+            )
+        return all(
+            column.name == "id" or column.name.endswith("_id")
+            for column in description
+        )
+
+    def rows(self, table) -> int:
+        """Количество строк таблицы (оценка в PostgreSQL)."""
+        if table not in self.table_rows:
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    cursor.execute(
+                        "SELECT reltuples FROM pg_class WHERE relname = %s",
+                        (table,),
+                    )
+                else:
+                    cursor.execute(
+                        f"SELECT count(*) FROM "
+                        f"{connection.ops.quote_name(table)}"
+                    )
+                row = cursor.fetchone()
+            self.table_rows[table] = int(row[0]) if row else 0
+        return self.table_rows[table]
+
+    def columns(self, table, names, exclude=()) -> list:
+        """Существующие столбцы table из names (без повторов)."""
+        with connection.cursor() as cursor:
+            existing = {
+                column.name
+                for column in connection.introspection.get_table_description(
+                    cursor, table
+                )
+            }
+        result = []
+        for name in names:
+            if name in existing and name not in result and (
+                name not in exclude
+            ):
+                result.append(name)
+        return result
+
+    def recommend(self, table, columns):
+        """
+        (таблица, столбцы) нового индекса или None, если столбцов нет
+        либо уже есть индекс, начинающийся с этих столбцов.
+        """
+        if not columns:
+            return None
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, table
+            )
+        for constraint in constraints.values():
+            # Первичный ключ в SQLite не отмечен как index или unique
+            indexed = (
+                constraint["index"]
+                or constraint["unique"]
+                or constraint["primary_key"]
+            )
+            if indexed and constraint["columns"][:len(columns)] == columns:
+                return None
+        return table, tuple(columns)
+
+    def report_recommendations(self):
+        self.stdout.write("")
+        if not self.recommendations:
+            self.stdout.write(self.style.SUCCESS("Новые индексы не нужны."))
+            return
+        self.stdout.write(self.style.WARNING("Рекомендуемые индексы:"))
+        for (table, columns), urls in sorted(self.recommendations.items()):
+            self.stdout.write(
+                f"  CREATE INDEX ON {table} ({', '.join(columns)});"
+                f"  -- {', '.join(sorted(urls))}"
+            )
@@ -0,0 +1,797 @@
+import base64
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections import defaultdict, namedtuple
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.backends.utils import CursorDebugWrapper
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, resolve
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes import generations, images
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import CustomUser, Subscribtion
+
+# Бюджеты запросов api по СУБД (--write-budgets формирует бюджеты
+# текущей СУБД заново)
+BUDGETS = os.path.join(settings.BASE_DIR, "benchmarks", "budgets.json")
+
+# Запас бюджета относительно замера (--write-budgets)
+# (память зависит от состояния кэшей и аллокатора - запас вдвое)
+BUDGET_MARGINS = {"queries": 1.0, "rows": 1.5, "peak_kib": 2.0, "p95_ms": 3.0}
+
+# Меньшая выборка дает вместо p95 максимум задержки: бюджет
+# задержки для нее не проверяется
+LATENCY_MIN_REQUESTS = 20
+
+# Пароли пользователя бенчмарка (users/set_password/ меняет их по кругу)
+PASSWORDS = ("Fennel-Route-417", "Saffron-Lake-902")
+
+# Маршруты api без сценариев: письма (активация, сброс пароля и email)
+# в проекте не используются
+NOT_BENCHMARKED = {
+    "api-root",
+    "users-activation",
+    "users-resend-activation",
+    "users-reset-password",
+    "users-reset-password-confirm",
+    "users-reset-username",
+    "users-reset-username-confirm",
+    "users-set-username",
+}
+
+# Запрос сценария. В адресе подставляются значения итерации
+# ({recipe}, {created} и т.д.), body(values) - тело запроса
+Scenario = namedtuple(
+    "Scenario",
+    ("name", "method", "path", "user", "body"),
+    defaults=(None, None),
+)
+
+
+def png_data_uri() -> str:
+    """Картинка Рецепта в base64 (формат Base64ImageField)."""
+    output = BytesIO()
+    Image.new("RGB", (64, 48), (200, 120, 40)).save(output, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        output.getvalue()
+    ).decode()
+
+
+IMAGE = png_data_uri()
+
+
+def recipe_body(values):
+    return {
+        "ingredients": [
+            {"id": ingredient_id, "amount": 10}
+            for ingredient_id in values["ingredients"]
+        ],
+        "tags": values["tags"],
+        "image": IMAGE,
+        "name": f"Бенчмарк {values['i']}",
+        "text": "Рецепт бенчмарка api.",
+        "cooking_time": 10,
+    }
+
+
+def user_body(values):
+    return {
+        "email": f"benchmark_{values['i']}@foodgram.local",
+        "username": f"benchmark_{values['i']}",
+        "first_name": "Benchmark",
+        "last_name": "Benchmark",
+        "password": PASSWORDS[0],
+    }
+
+
+def login_body(values):
+    return {"email": values["email"], "password": PASSWORDS[0]}
+
+
+def password_body(current, new):
+    return lambda values: {
+        "current_password": PASSWORDS[current],
+        "new_password": PASSWORDS[new],
+    }
+
+
+# Группы сценариев: запросы группы выполняются по очереди на каждой
+# итерации (создание - изменение - удаление, добавление - удаление)
+SCENARIOS = (
+    (Scenario("ingredients-list", "get", "/api/ingredients/"),),
+    (Scenario("ingredients-name", "get", "/api/ingredients/?name=мол"),),
+    (Scenario("ingredients-fuzzy", "get", "/api/ingredients/?q=малако"),),
+    (
+        Scenario(
+            "ingredients-detail", "get", "/api/ingredients/{ingredient}/"
+        ),
+    ),
+    (Scenario("tags-list", "get", "/api/tags/"),),
+    (Scenario("tags-detail", "get", "/api/tags/{tag}/"),),
+    (Scenario("recipes-list-anonymous", "get", "/api/recipes/"),),
+    (Scenario("recipes-list", "get", "/api/recipes/", "user"),),
+    (Scenario("recipes-list-page", "get", "/api/recipes/?page=3", "user"),),
+    (
+        Scenario(
+            "recipes-list-cursor", "get", "/api/recipes/?cursor=", "user"
+        ),
+    ),
+    (
+        Scenario(
+            "recipes-tags", "get", "/api/recipes/?tags={tag_slug}", "user"
+        ),
+    ),
+    (
+        Scenario(
+            "recipes-author", "get", "/api/recipes/?author={author}", "user"
+        ),
+    ),
+    (
+        Scenario(
+            "recipes-favorited", "get", "/api/recipes/?is_favorited=1", "user"
+        ),
+    ),
+    (
+        Scenario(
+            "recipes-in-cart",
+            "get",
+            "/api/recipes/?is_in_shopping_cart=1",
+            "user",
+        ),
+    ),
+    (Scenario("recipes-search", "get", "/api/recipes/?search=суп", "user"),),
+    (Scenario("recipes-detail", "get", "/api/recipes/{recipe}/", "user"),),
+    (
+        Scenario("recipes-create", "post", "/api/recipes/", "user", recipe_body),
+        Scenario(
+            "recipes-update",
+            "patch",
+            "/api/recipes/{created}/",
+            "user",
+            recipe_body,
+        ),
+        Scenario("recipes-delete", "delete", "/api/recipes/{created}/", "user"),
+    ),
+    (
+        Scenario(
+            "favorite-add", "post", "/api/recipes/{free_recipe}/favorite/",
+            "user",
+        ),
+        Scenario(
+            "favorite-remove", "delete",
+            "/api/recipes/{free_recipe}/favorite/", "user",
+        ),
+    ),
+    (
+        Scenario(
+            "cart-add", "post", "/api/recipes/{free_recipe}/shopping_cart/",
+            "user",
+        ),
+        Scenario(
+            "cart-remove", "delete",
+            "/api/recipes/{free_recipe}/shopping_cart/", "user",
+        ),
+    ),
+    (
+        Scenario(
+            "shopping-cart-txt",
+            "get",
+            "/api/recipes/download_shopping_cart/",
+            "user",
+        ),
+    ),
+    (
+        Scenario(
+            "shopping-cart-pdf",
+            "get",
+            "/api/recipes/download_shopping_cart/?format=pdf",
+            "user",
+        ),
+    ),
+    (Scenario("users-list", "get", "/api/users/", "user"),),
+    (Scenario("users-detail", "get", "/api/users/{author}/", "user"),),
+    (Scenario("users-me", "get", "/api/users/me/", "user"),),
+    (Scenario("users-create", "post", "/api/users/", None, user_body),),
+    (
+        Scenario(
+            "users-set-password", "post", "/api/users/set_password/",
+            "user", password_body(0, 1),
+        ),
+        Scenario(
+            "users-set-password", "post", "/api/users/set_password/",
+            "user", password_body(1, 0),
+        ),
+    ),
+    (
+        Scenario(
+            "users-subscriptions",
+            "get",
+            "/api/users/subscriptions/?recipes_limit=3",
+            "user",
+        ),
+    ),
+    (
+        Scenario(
+            "subscribe", "post", "/api/users/{free_author}/subscribe/",
+            "user",
+        ),
+        Scenario(
+            "unsubscribe", "delete", "/api/users/{free_author}/subscribe/",
+            "user",
+        ),
+    ),
+    (
+        Scenario(
+            "token-login", "post", "/api/auth/token/login/", None, login_body
+        ),
+        Scenario("token-logout", "post", "/api/auth/token/logout/", "user"),
+    ),
+    (Scenario("metrics", "get", "/api/_metrics", "admin"),),
+)
+
+
+class RowCountingCursor(CursorDebugWrapper):
+    """Курсор, считающий полученные из базы строки."""
+
+    def __init__(self, cursor, db, counter):
+        super().__init__(cursor, db)
+        self.counter = counter
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        self.counter.rows += row is not None
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        self.counter.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.counter.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in super().__iter__():
+            self.counter.rows += 1
+            yield row
+
+
+class QueryCounter(CaptureQueriesContext):
+    """SQL-запросы и количество полученных строк внутри блока."""
+
+    def __enter__(self):
+        self.rows = 0
+        self.connection.make_debug_cursor = lambda cursor: (
+            RowCountingCursor(cursor, self.connection, self)
+        )
+        return super().__enter__()
+
+    def __exit__(self, *args):
+        del self.connection.make_debug_cursor
+        super().__exit__(*args)
+
+
+def seed_dataset(scale: int, seed: int):
+    """
+    Синтетические данные бенчмарка: 20 * scale пользователей,
+    200 * scale Рецептов с тегами и ингредиентами, Избранное,
+    Списки покупок и Подписки. Возвращает пользователя бенчмарка.
+    """
+    generator = random.Random(seed)
+    ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+    if len(ingredient_ids) < 10:
+        raise CommandError("Нет ингредиентов: выполните load_ingredients.")
+    stamp = timezone.now().strftime("%H%M%S")
+    CustomUser.objects.bulk_create(
+        CustomUser(
+            username=f"benchmark_{stamp}_{number}",
+            email=f"benchmark_{stamp}_{number}@foodgram.local",
+            first_name="Benchmark",
+            last_name="Benchmark",
+        )
+        for number in range(max(20, 20 * scale))
+    )
+    users = list(CustomUser.objects.filter(username__startswith=(
+        f"benchmark_{stamp}_"
+    )))
+    tags = [
+        Tag.objects.create(
+            name=f"benchmark {stamp} {number}",
+            color=f"#BE{stamp[-2:]}{number:02X}",
+            slug=f"benchmark_{stamp}_{number}",
+        )
+        for number in range(5)
+    ]
+    words = ("суп", "салат", "пирог", "каша", "рагу", "запеканка")
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=generator.choice(users),
+            name=f"{generator.choice(words)} {number}",
+            text=" ".join(generator.choices(words, k=12)),
+            cooking_time=generator.randint(5, 120),
+        )
+        for number in range(200 * scale)
+    )
+    recipe_ids = list(
+        Recipe.objects.filter(author__in=users).values_list("id", flat=True)
+    )
+    recipe_tags = Recipe.tags.through
+    recipe_tags.objects.bulk_create(
+        recipe_tags(recipe_id=recipe_id, tag_id=tag.id)
+        for recipe_id in recipe_ids
+        for tag in generator.sample(tags, generator.randint(1, 3))
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=generator.randint(1, 500),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in generator.sample(
+            ingredient_ids, generator.randint(3, 10)
+        )
+    )
+    for model, per_user in ((Favorite, 20), (ShoppingCart, 10)):
+        model.objects.bulk_create(
+            model(user=user, recipe_id=recipe_id)
+            for user in users
+            for recipe_id in generator.sample(recipe_ids, per_user)
+        )
+    Subscribtion.objects.bulk_create(
+        Subscribtion(user=user, author=author)
+        for user in users
+        for author in generator.sample(users, 5)
+        if author != user
+    )
+    # bulk_create не вызывает сигналы: счетчики и Списки покупок
+    # пересчитываются командами
+    call_command("reconcile_counters", stdout=StringIO())
+    call_command("rebuild_shopping_lists", stdout=StringIO())
+    return users[0]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ("git", "rev-parse", "--short", "HEAD"),
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк всех маршрутов api через тестовый клиент Django.
+
+    Данные создаются (seed_dataset) или берутся из текущей базы
+    (--existing) во временной транзакции и откатываются по завершении.
+    Для каждого сценария измеряются задержка (p50, p95, p99),
+    количество SQL-запросов и полученных строк на запрос и пиковая
+    память (tracemalloc, отдельный повторный запрос). Результаты
+    сохраняются в JSON (--output) для сравнения между коммитами
+    (--compare).
+    Команда завершается с ошибкой, если запрос вернул ошибку или
+    превышен бюджет из benchmarks/budgets.json. Бюджеты хранятся
+    для каждой СУБД отдельно (без бюджетов текущей СУБД проверяются
+    только ошибки ответов). Бюджеты задержки, строк и памяти
+    проверяются только для масштаба, на котором они сформированы
+    (задержки - еще и при --requests не меньше 20); бюджет количества
+    запросов - всегда.
+    """
+
+    help = "Бенчмарк маршрутов api с проверкой бюджетов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=int,
+            default=1,
+            help="Масштаб данных (200 * scale Рецептов).",
+        )
+        parser.add_argument(
+            "--existing",
+            action="store_true",
+            help="Использовать данные текущей базы вместо синтетических.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=20,
+            help="Количество замеряемых запросов каждого сценария.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=2,
+            help="Количество запросов прогрева (без замера).",
+        )
+        parser.add_argument(
+            "--only",
+            default="",
+            help="Только сценарии с этими названиями (через запятую).",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Файл JSON с результатами.")
+        parser.add_argument(
+            "--compare", help="Файл JSON предыдущего запуска для сравнения."
+        )
+        parser.add_argument("--budgets", default=BUDGETS)
+        parser.add_argument(
+            "--write-budgets",
+            action="store_true",
+            help="Записать бюджеты по результатам с запасом.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("--requests должен быть не меньше 2.")
+        self.options = options
+        only = {name for name in options["only"].split(",") if name}
+        groups = [
+            group
+            for group in SCENARIOS
+            if not only or {scenario.name for scenario in group} & only
+        ]
+        if not only:
+            self.check_coverage()
+        image_name = images.storage().content_name(
+            "recipes/img/image.png",
+            ContentFile(base64.b64decode(IMAGE.split(",", 1)[1])),
+        )
+        image_existed = images.storage().exists(image_name)
+        with transaction.atomic():
+            started = time.perf_counter()
+            if options["existing"]:
+                user = self.busiest_user()
+            else:
+                user = seed_dataset(options["scale"], options["seed"])
+            self.stderr.write(
+                f"Данные подготовлены за {time.perf_counter() - started:.1f} "
+                f"с, СУБД: {connection.vendor}."
+            )
+            results = self.run(groups, user)
+            transaction.set_rollback(True)
+        # Ответы, закэшированные по откаченным данным, недостижимы
+        # с новыми поколениями
+        generations.bump(
+            generations.RECIPES, generations.TAGS, generations.USERS
+        )
+        # Картинку созданных Рецептов освобождает on_commit,
+        # который при откате транзакции не выполняется
+        if not image_existed and images.storage().exists(image_name):
+            images.storage().delete(image_name)
+        report = {
+            "revision": git_revision(),
+            "vendor": connection.vendor,
+            "scale": None if options["existing"] else options["scale"],
+            "requests": options["requests"],
+            "created": timezone.now().isoformat(),
+            "results": results,
+        }
+        self.print_results(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        if options["compare"]:
+            self.print_comparison(options["compare"], results)
+        if options["write_budgets"]:
+            self.write_budgets(report)
+            return
+        self.check_budgets(report)
+
+    def busiest_user(self):
+        user = (
+            CustomUser.objects.annotate(total=Count("favorite"))
+            .order_by("-total")
+            .first()
+        )
+        if user is None:
+            raise CommandError("В базе нет пользователей.")
+        return user
+
+    def check_coverage(self):
+        """Предупреждает о маршрутах api без сценариев."""
+        covered = {
+            resolve(scenario.path.split("?")[0].format(
+                ingredient=1, tag=1, recipe=1, created=1, free_recipe=1,
+                author=1, free_author=1,
+            )).url_name
+            for group in SCENARIOS
+            for scenario in group
+        }
+        routes = defaultdict(set)
+        for pattern in get_resolver("api.urls").url_patterns:
+            for route in getattr(pattern, "url_patterns", (pattern,)):
+                if "format" not in str(route.pattern):
+                    routes[str(route.pattern)].add(route.name)
+        for names in routes.values():
+            if not names & (covered | NOT_BENCHMARKED):
+                self.stderr.write(
+                    self.style.WARNING(
+                        f"Маршрут без сценария: {', '.join(sorted(names))}"
+                    )
+                )
+
+    def run(self, groups, user) -> dict:
+        stamp = timezone.now().strftime("%H%M%S%f")
+        admin = CustomUser.objects.create(
+            username=f"benchmark_admin_{stamp}",
+            email=f"benchmark_admin_{stamp}@foodgram.local",
+            is_staff=True,
+        )
+        user.set_password(PASSWORDS[0])
+        user.save()
+        clients = {None: APIClient(), "user": APIClient(), "admin": APIClient()}
+        clients["user"].force_authenticate(user)
+        clients["admin"].force_authenticate(admin)
+        pools = self.pools(user)
+        results = {}
+        total = self.options["warmup"] + self.options["requests"]
+        for group in groups:
+            samples = defaultdict(list)
+            for iteration in range(total + 1):
+                values = self.values(pools, user, iteration)
+                if iteration == 0:
+                    first = values
+                # Последняя итерация - замер памяти
+                memory = iteration == total
+                for scenario in group:
+                    # Память замеряется в установившемся режиме и
+                    # независимо от --requests: GET-запрос повторяет
+                    # адрес первой итерации, ответ которой уже в кэше
+                    sample = self.request(
+                        clients[scenario.user],
+                        scenario,
+                        first if memory and scenario.method == "get"
+                        else values,
+                        memory,
+                    )
+                    if iteration >= self.options["warmup"]:
+                        samples[scenario.name].append(sample)
+            for name, name_samples in samples.items():
+                results[name] = self.summary(name_samples)
+            self.stderr.write(f"{', '.join(samples)}: готово.")
+        return results
+
+    def pools(self, user) -> dict:
+        """Объекты для подстановки в адреса сценариев."""
+        taken = set(
+            Favorite.objects.filter(user=user).values_list(
+                "recipe_id", flat=True
+            )
+        ) | set(
+            ShoppingCart.objects.filter(user=user).values_list(
+                "recipe_id", flat=True
+            )
+        )
+        subscribed = set(
+            Subscribtion.objects.filter(user=user).values_list(
+                "author_id", flat=True
+            )
+        )
+        recipes = list(
+            Recipe.objects.order_by("-id").values_list("id", flat=True)[:200]
+        )
+        authors = list(
+            CustomUser.objects.filter(recipes_count__gt=0)
+            .exclude(id=user.id)
+            .order_by("-recipes_count")
+            .values_list("id", flat=True)[:200]
+        )
+        tags = list(Tag.objects.values_list("id", "slug"))
+        pools = {
+            "recipes": recipes,
+            "free_recipes": [
+                recipe for recipe in recipes if recipe not in taken
+            ],
+            "authors": authors,
+            "free_authors": [
+                author for author in authors if author not in subscribed
+            ],
+            "tags": tags,
+            "ingredients": list(
+                Ingredient.objects.values_list("id", flat=True)[:500]
+            ),
+        }
+        empty = [name for name, pool in pools.items() if not pool]
+        if empty:
+            raise CommandError(f"Недостаточно данных: {', '.join(empty)}.")
+        return pools
+
+    def values(self, pools, user, iteration) -> dict:
+        def pick(name):
+            return pools[name][iteration % len(pools[name])]
+
+        tag_id, tag_slug = pick("tags")
+        ingredients = pools["ingredients"]
+        start = (iteration * 7) % max(1, len(ingredients) - 10)
+        return {
+            "i": iteration,
+            "email": user.email,
+            "recipe": pick("recipes"),
+            "free_recipe": pick("free_recipes"),
+            "author": pick("authors"),
+            "free_author": pick("free_authors"),
+            "tag": tag_id,
+            "tag_slug": tag_slug,
+            "tags": [tag_id],
+            "ingredient": ingredients[iteration % len(ingredients)],
+            "ingredients": ingredients[start:start + 10],
+        }
+
+    def request(self, client, scenario, values, memory) -> dict:
+        path = scenario.path.format(**values)
+        body = scenario.body(values) if scenario.body else None
+        if memory:
+            tracemalloc.start()
+        # Точка сохранения: ошибка базы в запросе не прерывает бенчмарк
+        with transaction.atomic(), QueryCounter(connection) as counter:
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(
+                path, body, format="json"
+            )
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = (time.perf_counter() - started) * 1000
+        peak = None
+        if memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        if scenario.method == "post" and response.status_code == 201:
+            values["created"] = response.data.get("id")
+        return {
+            "ms": elapsed,
+            "queries": len(counter),
+            "rows": counter.rows,
+            "status": response.status_code,
+            "peak_kib": None if peak is None else peak / 1024,
+        }
+
+    def summary(self, samples) -> dict:
+        timed = [sample for sample in samples if sample["peak_kib"] is None]
+        latencies = sorted(sample["ms"] for sample in timed)
+        quantiles = statistics.quantiles(
+            latencies, n=100, method="inclusive"
+        )
+        return {
+            "requests": len(timed),
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(quantiles[94], 2),
+            "p99_ms": round(quantiles[98], 2),
+            "queries": max(sample["queries"] for sample in timed),
+            "rows": max(sample["rows"] for sample in timed),
+            "peak_kib": round(
+                max(sample["peak_kib"] or 0 for sample in samples), 1
+            ),
+            "errors": sorted({
+                sample["status"]
+                for sample in samples
+                if sample["status"] >= 400
+            }),
+        }
+
+    def print_results(self, results):
+        self.stdout.write(
+            f"{'Сценарий':<24} {'p50':>7} {'p95':>7} {'p99':>7} "
+            f"{'запр.':>5} {'строк':>6} {'КиБ':>7}  ошибки"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<24} {result['p50_ms']:>7.1f} "
+                f"{result['p95_ms']:>7.1f} {result['p99_ms']:>7.1f} "
+                f"{result['queries']:>5} {result['rows']:>6} "
+                f"{result['peak_kib']:>7.0f}  "
+                f"{','.join(map(str, result['errors']))}"
+            )
+
+    def print_comparison(self, path, results):
+        with open(path, encoding="utf-8") as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(
+            f"\nСравнение с {previous.get('revision') or path}:"
+        )
+        for name, result in results.items():
+            before = previous["results"].get(name)
+            if before is None:
+                continue
+            self.stdout.write(
+                f"{name:<24} p95 {before['p95_ms']:>7.1f} -> "
+                f"{result['p95_ms']:>7.1f} мс, запросов "
+                f"{before['queries']} -> {result['queries']}, строк "
+                f"{before['rows']} -> {result['rows']}"
+            )
+
+    def load_budgets(self) -> dict:
+        """Бюджеты по СУБД: {СУБД: {"scale": ..., "budgets": ...}}."""
+        if not os.path.exists(self.options["budgets"]):
+            return {}
+        with open(self.options["budgets"], encoding="utf-8") as budgets_file:
+            return json.load(budgets_file)
+
+    def write_budgets(self, report):
+        budgets = self.load_budgets()
+        budgets[report["vendor"]] = {
+            "scale": report["scale"],
+            "budgets": {
+                name: {
+                    metric: round(result[metric] * margin + (
+                        5 if metric == "p95_ms" else 0
+                    ), 1)
+                    for metric, margin in BUDGET_MARGINS.items()
+                }
+                for name, result in report["results"].items()
+            },
+        }
+        with open(self.options["budgets"], "w", encoding="utf-8") as output:
+            json.dump(budgets, output, ensure_ascii=False, indent=2)
+            output.write("\n")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Бюджеты {report['vendor']} записаны: "
+                f"{self.options['budgets']}"
+            )
+        )
+
+    def check_budgets(self, report):
+        budgets = self.load_budgets().get(report["vendor"])
+        if budgets is None:
+            self.stderr.write(
+                self.style.WARNING(
+                    f"Нет бюджетов для СУБД {report['vendor']} "
+                    f"(--write-budgets): проверены только ответы."
+                )
+            )
+        same_scale = budgets is not None and (
+            report["scale"] == budgets["scale"]
+        )
+        violations = []
+        for name, result in report["results"].items():
+            if result["errors"]:
+                violations.append(f"{name}: ответы {result['errors']}")
+            if budgets is None:
+                continue
+            budget = budgets["budgets"].get(name)
+            if budget is None:
+                violations.append(f"{name}: нет бюджета")
+                continue
+            for metric, limit in budget.items():
+                if metric != "queries" and not same_scale:
+                    continue
+                if (
+                    metric == "p95_ms"
+                    and result["requests"] < LATENCY_MIN_REQUESTS
+                ):
+                    continue
+                if result[metric] > limit:
+                    violations.append(
+                        f"{name}: {metric} {result[metric]} > {limit}"
+                    )
+        if violations:
+            raise CommandError(
+                "Бюджеты превышены:\n" + "\n".join(violations)
+            )
+        self.stdout.write(self.style.SUCCESS("Бюджеты соблюдены."))
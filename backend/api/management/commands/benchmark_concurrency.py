@@ -0,0 +1,471 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from recipes.models import Ingredient, Recipe
+from rest_framework.authtoken.models import Token
+from users.models import CustomUser
+
+# Сценарии нагрузки: (название, вес)
+SCENARIOS = (
+    ("recipes-list-anonymous", 40),
+    ("recipes-detail-anonymous", 20),
+    ("ingredients-search", 15),
+    ("recipes-list", 15),
+    ("favorite-toggle", 10),
+)
+
+# Режимы сервера (SERVER_MODE в gunicorn.conf.py)
+MODES = ("wsgi", "asgi")
+
+
+class HttpClient:
+    """
+    Минимальный клиент HTTP/1.1 на asyncio для генерации нагрузки:
+    одно соединение keep-alive, переподключение после Connection: close.
+    """
+
+    def __init__(self, host, port, timeout):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=()):
+        """Статус ответа; тело читается и отбрасывается."""
+        reused = self.writer is not None
+        try:
+            return await asyncio.wait_for(
+                self._request(method, path, headers), self.timeout
+            )
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+        # Сервер закрыл простаивающее соединение: повтор на новом
+        return await asyncio.wait_for(
+            self._request(method, path, headers), self.timeout
+        )
+
+    async def _request(self, method, path, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Connection: keep-alive",
+            "Content-Length: 0",
+            *headers,
+        ]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        response_headers = {}
+        for line in header_lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+        elif "content-length" in response_headers:
+            await self.reader.readexactly(
+                int(response_headers["content-length"])
+            )
+        else:
+            await self.reader.read()
+            response_headers["connection"] = "close"
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return int(status_line.split()[1])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    """
+    Сравнение пропускной способности и задержек api в режимах WSGI
+    (синхронные воркеры gunicorn) и ASGI (воркеры uvicorn, асинхронные
+    представления api.async_views) при 100-1000 одновременных клиентах.
+    Серверы запускаются командой на локальном порту с текущими
+    настройками базы данных; клиенты - соединения asyncio в этом
+    процессе. Смесь запросов - SCENARIOS: анонимные список и Рецепт,
+    поиск ингредиентов, список пользователя и переключение Избранного
+    (каждый клиент возвращает Избранное в исходное состояние).
+    Задержки - по запросам, пересекающим время замера, запросы в
+    секунду - по завершенным за это время; ошибки - ответы 5xx, обрывы
+    соединения и ответы дольше --timeout.
+    """
+
+    help = "Бенчмарк api при одновременных клиентах: WSGI против ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clients",
+            default="100,300,1000",
+            help="Количество одновременных клиентов (через запятую).",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=15,
+            help="Длительность замера на уровень нагрузки (секунды).",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=float,
+            default=3,
+            help="Прогрев перед замером (секунды).",
+        )
+        parser.add_argument(
+            "--modes",
+            default=",".join(MODES),
+            help="Режимы сервера (wsgi, asgi).",
+        )
+        parser.add_argument(
+            "--url",
+            help="Адрес уже запущенного сервера (режимы не запускаются).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=int(os.getenv("WEB_CONCURRENCY", default=2)),
+            help="Количество воркеров gunicorn.",
+        )
+        parser.add_argument(
+            "--orm-threads",
+            type=int,
+            default=settings.ASGI["ORM_THREADS"],
+            help="Потоков ORM на воркер в режиме ASGI.",
+        )
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=50,
+            help="Пользователей для авторизованных запросов.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30,
+            help="Предельное время ответа (секунды), дольше - ошибка.",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Файл JSON с результатами.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        levels = [int(value) for value in options["clients"].split(",")]
+        if not levels or min(levels) < 1:
+            raise CommandError("--clients: положительные числа.")
+        modes = [mode for mode in options["modes"].split(",") if mode]
+        if not options["url"] and set(modes) - set(MODES):
+            raise CommandError(f"--modes: допустимы {', '.join(MODES)}.")
+        self.prepare(max(levels))
+        results = []
+        try:
+            if options["url"]:
+                address = urlsplit(options["url"])
+                for clients in levels:
+                    results.append(
+                        self.measure(
+                            "external", address.hostname, address.port or 80,
+                            clients,
+                        )
+                    )
+            else:
+                for mode in modes:
+                    with self.server(mode):
+                        for clients in levels:
+                            results.append(
+                                self.measure(
+                                    mode, "127.0.0.1", options["port"],
+                                    clients,
+                                )
+                            )
+        finally:
+            Token.objects.filter(key__in=self.created_tokens).delete()
+        self.print_results(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+
+    def prepare(self, clients):
+        """
+        Данные запросов: id Рецептов, префиксы ингредиентов, токены
+        пользователей и для каждого клиента - пара (токен, Рецепт
+        не из Избранного пользователя) для переключения Избранного.
+        """
+        self.recipe_ids = list(
+            Recipe.objects.order_by("?").values_list("id", flat=True)[:500]
+        )
+        # Страницы списка по 6 Рецептов, не более 10
+        self.pages = max(1, min(10, Recipe.objects.count() // 6))
+        self.prefixes = sorted(
+            {
+                name[:2]
+                for name in Ingredient.objects.values_list("name", flat=True)
+            }
+        )
+        users = list(
+            CustomUser.objects.annotate(total=Count("favorite")).order_by(
+                "-total", "id"
+            )[:self.options["users"]]
+        )
+        if not self.recipe_ids or not self.prefixes or not users:
+            raise CommandError(
+                "Нужны Рецепты, ингредиенты и пользователи: "
+                "выполните generate_dataset."
+            )
+        existing = dict(
+            Token.objects.filter(user__in=users).values_list("user_id", "key")
+        )
+        self.created_tokens = []
+        tokens = {}
+        for user in users:
+            if user.id not in existing:
+                token = Token.objects.create(user=user)
+                self.created_tokens.append(token.key)
+                existing[user.id] = token.key
+            tokens[user.id] = existing[user.id]
+        per_user = -(-clients // len(users))
+        candidates = {
+            user.id: list(
+                Recipe.objects.exclude(favorite__user=user)
+                .order_by("id")
+                .values_list("id", flat=True)[:per_user]
+            )
+            for user in users
+        }
+        self.toggles = []
+        for number in range(clients):
+            user = users[number % len(users)]
+            recipes = candidates[user.id]
+            if number // len(users) < len(recipes):
+                self.toggles.append(
+                    (tokens[user.id], recipes[number // len(users)])
+                )
+            else:
+                self.toggles.append((tokens[user.id], None))
+
+    def server(self, mode):
+        return GunicornServer(
+            mode,
+            self.options["port"],
+            self.options["workers"],
+            self.options["orm_threads"],
+            self.stderr,
+        )
+
+    def measure(self, mode, host, port, clients):
+        self.stderr.write(f"{mode}: {clients} клиентов...")
+        measure_from, deadline, samples = asyncio.run(
+            self.load(host, port, clients)
+        )
+        # Задержки - запросы, пересекающие замер; пропускная способность -
+        # завершенные за время замера
+        measured = [
+            (started, finished, status)
+            for started, finished, status in samples
+            if finished >= measure_from and started < deadline
+        ]
+        completed = sum(1 for _, finished, _ in measured if finished <= deadline)
+        latencies = sorted(
+            (finished - started) * 1000 for started, finished, _ in measured
+        )
+        statuses = [status for _, _, status in measured]
+        errors = sum(
+            1 for status in statuses if status is None or status >= 500
+        )
+        quantiles = (
+            statistics.quantiles(latencies, n=100)
+            if len(latencies) > 1
+            else latencies * 99
+        )
+        return {
+            "mode": mode,
+            "clients": clients,
+            "requests": len(measured),
+            "rps": completed / self.options["duration"],
+            "p50_ms": quantiles[49] if quantiles else None,
+            "p95_ms": quantiles[94] if quantiles else None,
+            "p99_ms": quantiles[98] if quantiles else None,
+            "max_ms": latencies[-1] if latencies else None,
+            "errors": errors,
+            "client_errors": sum(
+                1 for status in statuses if status and 400 <= status < 500
+            ),
+        }
+
+    async def load(self, host, port, clients):
+        started = time.monotonic()
+        measure_from = started + self.options["warmup"]
+        deadline = measure_from + self.options["duration"]
+        samples = []
+        await asyncio.gather(
+            *(
+                self.client(number, host, port, deadline, samples)
+                for number in range(clients)
+            )
+        )
+        return measure_from, deadline, samples
+
+    async def client(self, number, host, port, deadline, samples):
+        generator = random.Random(f"{self.options['seed']}:{number}")
+        names = [name for name, _ in SCENARIOS]
+        weights = [weight for _, weight in SCENARIOS]
+        token, toggle_recipe = self.toggles[number]
+        favorited = False
+        http = HttpClient(host, port, self.options["timeout"])
+        # Клиенты начинают не одновременно
+        await asyncio.sleep(generator.random() * 0.5)
+        try:
+            while time.monotonic() < deadline:
+                scenario = generator.choices(names, weights)[0]
+                if scenario == "favorite-toggle" and toggle_recipe is None:
+                    scenario = "recipes-list"
+                method, path, headers = self.build_request(
+                    generator, scenario, token, toggle_recipe, favorited
+                )
+                request_started = time.monotonic()
+                try:
+                    status = await http.request(method, path, headers)
+                except (OSError, asyncio.TimeoutError,
+                        asyncio.IncompleteReadError, ValueError):
+                    http.close()
+                    status = None
+                if scenario == "favorite-toggle" and status in (201, 204):
+                    favorited = not favorited
+                samples.append((request_started, time.monotonic(), status))
+            if favorited:
+                # Избранное пользователя - в исходное состояние
+                await http.request(
+                    "DELETE",
+                    f"/api/recipes/{toggle_recipe}/favorite/",
+                    (f"Authorization: Token {token}",),
+                )
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            http.close()
+
+    def build_request(self, generator, scenario, token, toggle_recipe,
+                      favorited):
+        """Метод, путь и заголовки запроса сценария scenario."""
+        if scenario == "recipes-list-anonymous":
+            page = generator.randint(1, self.pages)
+            return "GET", f"/api/recipes/?page={page}&limit=6", ()
+        if scenario == "recipes-detail-anonymous":
+            recipe_id = generator.choice(self.recipe_ids)
+            return "GET", f"/api/recipes/{recipe_id}/", ()
+        if scenario == "ingredients-search":
+            prefix = quote(generator.choice(self.prefixes))
+            return "GET", f"/api/ingredients/?name={prefix}", ()
+        headers = (f"Authorization: Token {token}",)
+        if scenario == "recipes-list":
+            return "GET", "/api/recipes/?limit=6", headers
+        return (
+            "DELETE" if favorited else "POST",
+            f"/api/recipes/{toggle_recipe}/favorite/",
+            headers,
+        )
+
+    def print_results(self, results):
+        self.stdout.write(
+            "Режим     Клиенты  Запросов  Запр./с   p50, мс   p95, мс   "
+            "p99, мс   max, мс  Ошибки  4xx"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<8}  {result['clients']:>7}  "
+                f"{result['requests']:>8}  {result['rps']:>7.0f}  "
+                + "  ".join(
+                    f"{result[key]:>8.1f}" if result[key] is not None
+                    else f"{'-':>8}"
+                    for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")
+                )
+                + f"  {result['errors']:>6}  {result['client_errors']:>3}"
+            )
+        by_level = {}
+        for result in results:
+            by_level.setdefault(result["clients"], {})[result["mode"]] = (
+                result
+            )
+        for clients, modes in sorted(by_level.items()):
+            if {"wsgi", "asgi"} <= modes.keys() and modes["wsgi"]["rps"]:
+                wsgi, asgi = modes["wsgi"], modes["asgi"]
+                self.stdout.write(
+                    f"{clients} клиентов: ASGI/WSGI запросов в секунду "
+                    f"x{asgi['rps'] / wsgi['rps']:.2f}, p99 "
+                    f"{wsgi['p99_ms'] or 0:.0f} -> "
+                    f"{asgi['p99_ms'] or 0:.0f} мс."
+                )
+
+
+class GunicornServer:
+    """gunicorn (gunicorn.conf.py) в режиме mode на время замера."""
+
+    def __init__(self, mode, port, workers, orm_threads, stderr):
+        self.mode, self.port = mode, port
+        self.workers, self.orm_threads = workers, orm_threads
+        self.stderr = stderr
+
+    def __enter__(self):
+        env = {
+            **os.environ,
+            "SERVER_MODE": self.mode,
+            "ASGI_ORM_THREADS": str(self.orm_threads),
+        }
+        self.process = subprocess.Popen(
+            (
+                sys.executable, "-m", "gunicorn",
+                "--config", "gunicorn.conf.py",
+                "--bind", f"127.0.0.1:{self.port}",
+                "--workers", str(self.workers),
+                "--backlog", "4096",
+                "--log-level", "warning",
+            ),
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"gunicorn ({self.mode}) не запустился.")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), 1):
+                    break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            self.process.terminate()
+            raise CommandError(f"gunicorn ({self.mode}) не отвечает.")
+        self.stderr.write(
+            f"gunicorn ({self.mode}): {self.workers} воркеров, "
+            f"порт {self.port}."
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
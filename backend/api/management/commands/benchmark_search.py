@@ -0,0 +1,157 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+# Слова описаний, кроме названий ингредиентов
+WORDS = (
+    "варить жарить запекать тушить нарезать смешать добавить посолить "
+    "поперчить охладить подавать горячим холодным духовке сковороде "
+    "кастрюле минут часа быстро медленно аккуратно домашний праздничный"
+).split()
+
+
+class Command(BaseCommand):
+    """
+    Замер времени поиска Рецептов (параметр search) через api
+    на синтетических Рецептах. Для сравнения выводится время поиска
+    по вхождению подстроки (LIKE) без индекса. Данные создаются
+    во временной транзакции и откатываются по завершении.
+    """
+
+    help = "Бенчмарк полнотекстового поиска Рецептов (search)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=100000,
+            help="Количество синтетических Рецептов.",
+        )
+        parser.add_argument(
+            "--queries",
+            default="курица,молоко сахар,запекать духовке,тыквенный",
+            help="Поисковые запросы (через запятую).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Количество повторов каждого запроса.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=6,
+            help="Размер страницы.",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        vocabulary = list(
+            Ingredient.objects.values_list("name", flat=True)[:2000]
+        )
+        if not vocabulary:
+            raise CommandError(
+                "Нет ингредиентов: выполните load_ingredients."
+            )
+        with transaction.atomic():
+            author = CustomUser.objects.create(
+                username="benchmark_search",
+                email="benchmark_search@foodgram.local",
+                first_name="Benchmark",
+                last_name="Benchmark",
+            )
+            tag = Tag.objects.create(
+                name="benchmark_search",
+                color="#BE4C11",
+                slug="benchmark_search",
+            )
+            started = time.perf_counter()
+            self._create_recipes(author, tag, vocabulary, options)
+            self.stdout.write(
+                f"Создано Рецептов: {options['recipes']} "
+                f"({time.perf_counter() - started:.1f} с), "
+                f"СУБД: {connection.vendor}."
+            )
+            client = APIClient()
+            self.stdout.write(
+                "Запрос                    Найдено  p50, мс  p95, мс  "
+                "+тег p50, мс  LIKE p50, мс"
+            )
+            for query in options["queries"].split(","):
+                self._measure(client, query.strip(), tag, options)
+            transaction.set_rollback(True)
+
+    def _create_recipes(self, author, tag, vocabulary, options):
+        generator = random.Random(options["seed"])
+        recipe_tags = Recipe.tags.through
+        batch_size = 5000
+        for start in range(0, options["recipes"], batch_size):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=" ".join(generator.sample(vocabulary, 2)),
+                    text=" ".join(
+                        generator.sample(vocabulary, 5)
+                        + generator.sample(WORDS, 10)
+                    ),
+                    cooking_time=generator.randint(1, 120),
+                )
+                for _ in range(
+                    min(batch_size, options["recipes"] - start)
+                )
+            )
+            if recipes[0].id is None:
+                recipes = Recipe.objects.filter(author=author).order_by(
+                    "-id"
+                )[:len(recipes)]
+            # Тег у каждого десятого Рецепта
+            recipe_tags.objects.bulk_create(
+                recipe_tags(recipe_id=recipe.id, tag_id=tag.id)
+                for recipe in recipes
+                if recipe.id % 10 == 0
+            )
+
+    def _timings(self, request, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = request()
+            timings.append((time.perf_counter() - started) * 1000)
+        return result, timings
+
+    def _measure(self, client, query, tag, options):
+        params = {"search": query, "limit": options["limit"]}
+        response, timings = self._timings(
+            lambda: client.get("/api/recipes/", params), options["repeat"]
+        )
+        if response.status_code != 200:
+            raise CommandError(f"Ответ {response.status_code}: {query}")
+        _, tag_timings = self._timings(
+            lambda: client.get(
+                "/api/recipes/", {**params, "tags": tag.slug}
+            ),
+            options["repeat"],
+        )
+        like = Recipe.objects.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).values_list("id", flat=True)
+        _, like_timings = self._timings(
+            lambda: (like.count(), list(like[:options["limit"]])),
+            options["repeat"],
+        )
+        quantiles = statistics.quantiles(timings, n=20)
+        self.stdout.write(
+            f"{query:<24}  {response.data['count']:>7}  "
+            f"{statistics.median(timings):>7.1f}  {quantiles[-1]:>7.1f}  "
+            f"{statistics.median(tag_timings):>12.1f}  "
+            f"{statistics.median(like_timings):>12.1f}"
+        )
@@ -0,0 +1,102 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, ShoppingCart
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    """
+    Замер времени и пиковой памяти скачивания Списка покупок
+    для корзин разного размера. Данные создаются во временной
+    транзакции и откатываются по завершении.
+    """
+
+    help = "Бенчмарк скачивания Списка покупок (download_shopping_cart)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="100,500,1000",
+            help="Количество рецептов в корзине (через запятую).",
+        )
+        parser.add_argument(
+            "--ingredients",
+            type=int,
+            default=10,
+            help="Количество ингредиентов в рецепте.",
+        )
+        parser.add_argument(
+            "--format",
+            default="txt",
+            choices=("txt", "csv", "pdf"),
+            help="Формат Списка покупок.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        ingredients = list(Ingredient.objects.values_list("id", flat=True))
+        if len(ingredients) < options["ingredients"]:
+            raise CommandError(
+                "Недостаточно ингредиентов: выполните load_ingredients."
+            )
+        with transaction.atomic():
+            user = CustomUser.objects.create(
+                username="benchmark_shopping_cart",
+                email="benchmark_shopping_cart@foodgram.local",
+                first_name="Benchmark",
+                last_name="Benchmark",
+            )
+            client = APIClient()
+            client.force_authenticate(user)
+            self.stdout.write("Рецептов  Строк  Пик памяти, КиБ  Время, мс")
+            in_cart = 0
+            for size in sizes:
+                self._fill_cart(user, ingredients, size - in_cart, options)
+                in_cart = size
+                self._measure(client, size, options["format"])
+            transaction.set_rollback(True)
+
+    def _fill_cart(self, user, ingredients, count, options):
+        recipe_ingredients = []
+        carts = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=user,
+                name=f"Рецепт {number}",
+                text="Бенчмарк",
+                cooking_time=1,
+            )
+            start = number % (len(ingredients) - options["ingredients"])
+            recipe_ingredients.extend(
+                RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient, amount=1
+                )
+                for ingredient in ingredients[
+                    start:start + options["ingredients"]
+                ]
+            )
+            carts.append(ShoppingCart(user=user, recipe=recipe))
+        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        ShoppingCart.objects.bulk_create(carts)
+
+    def _measure(self, client, size, file_format):
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = client.get(
+            "/api/recipes/download_shopping_cart/", {"format": file_format}
+        )
+        lines = 0
+        for chunk in response.streaming_content:
+            lines += chunk.count(b"\n")
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{size:>8}  {lines:>5}  {peak / 1024:>15.0f}  "
+            f"{elapsed * 1000:>9.1f}"
+        )
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from recipes import shopping_list
+from recipes.models import Favorite, Recipe, ShoppingCart
+from rest_framework.test import APIClient
+from users.models import CustomUser, Subscribtion
+
+# Ожидаемые ответы волны одновременных запросов одной пары:
+# изменение выполняет один запрос, остальные получают 400
+EXPECTED = {"post": 201, "delete": 204}
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочная проверка переключателей Избранного, Списка покупок
+    и Подписок (recipes.toggles): потоки одновременно (threading.Barrier)
+    отправляют POST, затем DELETE для одной пары пользователь - Рецепт
+    (автор). В каждой волне ровно один ответ 201 / 204, остальные - 400,
+    ошибок сервера нет; после проверки счетчики и Список покупок
+    пользователя сходятся с фактическими данными.
+    """
+
+    help = "Одновременные переключения Избранного, Списка покупок, Подписок."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=16,
+            help="Количество одновременных запросов в волне.",
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=20,
+            help="Количество пар волн POST / DELETE на переключатель.",
+        )
+
+    def handle(self, *args, **options):
+        threads, rounds = options["threads"], options["rounds"]
+        if threads < 2 or rounds < 1:
+            raise CommandError("Нужно не менее 2 потоков и 1 волны.")
+        user, recipe, author = self.pair()
+        paths = (
+            ("favorite", f"/api/recipes/{recipe.id}/favorite/"),
+            ("shopping_cart", f"/api/recipes/{recipe.id}/shopping_cart/"),
+            ("subscribe", f"/api/users/{author.id}/subscribe/"),
+        )
+        waves = [
+            (name, method, path)
+            for name, path in paths
+            for _ in range(rounds)
+            for method in EXPECTED
+        ]
+        barrier = threading.Barrier(threads)
+        statuses = [[] for _ in waves]
+        started = time.monotonic()
+        with ThreadPoolExecutor(threads) as executor:
+            for result in [
+                executor.submit(self.worker, user, waves, barrier, statuses)
+                for _ in range(threads)
+            ]:
+                result.result()
+        elapsed = time.monotonic() - started
+        failures = self.report(waves, statuses, threads)
+        failures.extend(self.check_consistency(user, recipe, author))
+        self.stdout.write(
+            f"{len(waves) * threads} запросов, {threads} потоков "
+            f"за {elapsed:.1f} с."
+        )
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write("Переключатели в порядке.")
+
+    def pair(self):
+        """
+        Пользователь, Рецепт не из его Избранного и Списка покупок
+        и автор, на которого он не подписан.
+        """
+        for user in CustomUser.objects.order_by("id"):
+            recipe = (
+                Recipe.objects.exclude(favorite__user=user)
+                .exclude(shopping_cart__user=user)
+                .order_by("id")
+                .first()
+            )
+            author = (
+                CustomUser.objects.exclude(id=user.id)
+                .exclude(author__user=user)
+                .order_by("id")
+                .first()
+            )
+            if recipe is not None and author is not None:
+                return user, recipe, author
+        raise CommandError(
+            "Нет пары пользователь - Рецепт (автор): выполните "
+            "generate_dataset."
+        )
+
+    def worker(self, user, waves, barrier, statuses):
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        try:
+            for number, (_, method, path) in enumerate(waves):
+                barrier.wait()
+                response = getattr(client, method)(path)
+                statuses[number].append(response.status_code)
+        finally:
+            connection.close()
+
+    def report(self, waves, statuses, threads):
+        """Итоги по переключателям; нарушения - списком."""
+        failures = []
+        totals = {}
+        for (name, method, _), codes in zip(waves, statuses):
+            counts = Counter(codes)
+            expected = Counter({EXPECTED[method]: 1, 400: threads - 1})
+            if counts != expected:
+                failures.append(
+                    f"{name} {method.upper()}: {dict(counts)}, "
+                    f"ожидалось {dict(expected)}."
+                )
+            totals.setdefault((name, method), Counter()).update(counts)
+        for (name, method), counts in totals.items():
+            self.stdout.write(
+                f"{name:<14} {method.upper():<6} "
+                + ", ".join(
+                    f"{status}: {count}"
+                    for status, count in sorted(counts.items())
+                )
+            )
+        return failures
+
+    def check_consistency(self, user, recipe, author):
+        """Связи удалены, счетчики и Список покупок сходятся."""
+        failures = []
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        for model, filters in (
+            (Favorite, {"user": user, "recipe": recipe}),
+            (ShoppingCart, {"user": user, "recipe": recipe}),
+            (Subscribtion, {"user": user, "author": author}),
+        ):
+            if model.objects.filter(**filters).exists():
+                failures.append(f"{model.__name__}: связь не удалена.")
+        for name, stored, actual in (
+            (
+                "Recipe.favorites_count",
+                recipe.favorites_count,
+                Favorite.objects.filter(recipe=recipe).count(),
+            ),
+            (
+                "Recipe.in_carts_count",
+                recipe.in_carts_count,
+                ShoppingCart.objects.filter(recipe=recipe).count(),
+            ),
+            (
+                "CustomUser.followers_count",
+                author.followers_count,
+                Subscribtion.objects.filter(author=author).count(),
+            ),
+        ):
+            if stored != actual:
+                failures.append(f"{name}: {stored}, фактически {actual}.")
+        if shopping_list.stored_items([user.id]) != (
+            shopping_list.expected_items([user.id])
+        ):
+            failures.append("Список покупок расходится с ShoppingCart.")
+        return failures
@@ -0,0 +1,337 @@
+"""
+Метрики запросов к api в формате Prometheus.
+
+Каждый процесс (воркер gunicorn) пишет свои счетчики в отдельный
+файл, отображенный в память (mmap), в каталоге RUNTIME_DIR/metrics.
+Запись - это несколько присваиваний в памяти, без системных вызовов.
+При выгрузке метрик файлы всех процессов суммируются. Файл
+завершившегося процесса (хук worker_exit gunicorn или выгрузка,
+не нашедшая процесс) прибавляется к общему файлу ARCHIVE и удаляется:
+счетчики не уменьшаются, а файлы не накапливаются.
+
+Файл процесса - массив ячеек (серий) фиксированного размера:
+[длина ключа][ключ, KEY_SIZE байт][значения, float64].
+Длина ключа записывается последней: ячейка с нулевой длиной не занята.
+Ключ длиннее KEY_SIZE байт сокращается: начало маршрута и хэш ключа.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Границы корзин гистограммы длительности запросов (секунды)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Значения серии запросов
+REQUESTS, SECONDS, QUERIES, SQL_SECONDS, RESPONSE_BYTES = range(5)
+FIRST_BUCKET = 5
+VALUES = FIRST_BUCKET + len(BUCKETS) + 1
+
+KEY_SIZE = 128
+# Размер ячейки в float64: длина ключа, ключ, значения
+SLOT = 1 + KEY_SIZE // 8 + VALUES
+SLOT_BYTES = SLOT * 8
+
+# Разделитель полей ключа серии
+SEPARATOR = "\t"
+# Префикс ключа для простых счетчиков (increment)
+COUNTER = "#"
+
+REQUEST_LABELS = ("route", "action", "method", "status")
+
+# Файл метрик завершившихся процессов и блокировка для его изменения
+ARCHIVE = "archive.bin"
+LOCK = "archive.lock"
+
+
+def _metrics_dir() -> str:
+    return os.path.join(settings.RUNTIME_DIR, "metrics")
+
+
+def fit_key(key: str) -> str:
+    """
+    Ключ серии не длиннее KEY_SIZE байт: у длинного ключа первое поле
+    (маршрут, имя счетчика) сокращается до начала и хэша всего ключа,
+    остальные поля сохраняются.
+    """
+    encoded = key.encode()
+    if len(encoded) <= KEY_SIZE:
+        return key
+    digest = hashlib.blake2b(encoded, digest_size=8).hexdigest()
+    first, *rest = key.split(SEPARATOR)
+    tail = "".join(SEPARATOR + field for field in rest)
+    room = KEY_SIZE - len(tail.encode()) - len(digest) - 1
+    if room < 0:
+        return digest
+    prefix = first.encode()[:room].decode(errors="ignore")
+    return f"{prefix}~{digest}{tail}"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsFile:
+    """
+    Файл метрик одного процесса, отображенный в память.
+    """
+
+    def __init__(self, path: str, slots: int, readonly: bool = False):
+        self.slots = slots
+        size = slots * SLOT_BYTES
+        if readonly:
+            fd = os.open(path, os.O_RDONLY)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                if readonly:
+                    raise ValueError(f"Неверный размер файла метрик {path}")
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(
+                fd, size, access=mmap.ACCESS_READ if readonly else
+                mmap.ACCESS_WRITE
+            )
+        finally:
+            os.close(fd)
+        self.values = memoryview(self._mmap).cast("d")
+        self.positions = {key: pos for pos, key in self.read_keys()}
+
+    def close(self) -> None:
+        self.values.release()
+        self._mmap.close()
+
+    def read_keys(self):
+        """Занятые ячейки: (смещение в float64, ключ)."""
+        for slot in range(self.slots):
+            pos = slot * SLOT
+            length = int(self.values[pos])
+            if not length:
+                # Ячейки занимаются по порядку
+                return
+            start = pos * 8 + 8
+            key = self._mmap[start:start + length].decode()
+            yield pos, key
+
+    def position(self, key: str):
+        """Смещение значений серии key (None, если файл заполнен)."""
+        key = fit_key(key)
+        pos = self.positions.get(key)
+        if pos is not None:
+            return pos
+        slot = len(self.positions)
+        if slot >= self.slots:
+            return None
+        encoded = key.encode()
+        pos = slot * SLOT
+        start = pos * 8 + 8
+        self._mmap[start:start + len(encoded)] = encoded
+        self.values[pos] = len(encoded)
+        self.positions[key] = pos
+        return pos
+
+
+class MetricsStore:
+    """
+    Хранилище метрик процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+
+    def _get_file(self) -> MetricsFile:
+        # После fork у процесса должен быть собственный файл
+        if self._pid != os.getpid():
+            os.makedirs(_metrics_dir(), exist_ok=True)
+            self._pid = os.getpid()
+            self._file = MetricsFile(
+                os.path.join(_metrics_dir(), f"{self._pid}.bin"),
+                settings.METRICS["MAX_SERIES"],
+            )
+        return self._file
+
+    def record_request(
+        self, route, action, method, status, seconds, queries,
+        sql_seconds, response_bytes,
+    ) -> None:
+        key = SEPARATOR.join((route, action, method, str(status)))
+        bucket = FIRST_BUCKET + bisect_left(BUCKETS, seconds)
+        with self._lock:
+            metrics_file = self._get_file()
+            pos = metrics_file.position(key)
+            if pos is None:
+                return
+            values = metrics_file.values
+            base = pos + 1 + KEY_SIZE // 8
+            values[base + REQUESTS] += 1
+            values[base + SECONDS] += seconds
+            values[base + QUERIES] += queries
+            values[base + SQL_SECONDS] += sql_seconds
+            values[base + RESPONSE_BYTES] += response_bytes
+            values[base + bucket] += 1
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Увеличивает простой счетчик name."""
+        with self._lock:
+            metrics_file = self._get_file()
+            pos = metrics_file.position(COUNTER + name)
+            if pos is not None:
+                metrics_file.values[pos + 1 + KEY_SIZE // 8] += value
+
+    def collect(self):
+        """
+        Суммирует значения серий по файлам всех процессов.
+        Возвращает словарь: ключ серии -> список значений.
+        """
+        totals = {}
+        self._get_file()
+        retire_dead()
+        with _archive_lock(fcntl.LOCK_SH):
+            for filename in sorted(os.listdir(_metrics_dir())):
+                if filename.endswith(".bin"):
+                    _add_file(totals, os.path.join(_metrics_dir(), filename))
+        return totals
+
+
+def _add_file(totals, path) -> None:
+    """Прибавляет значения серий файла path к totals."""
+    try:
+        metrics_file = MetricsFile(
+            path, settings.METRICS["MAX_SERIES"], readonly=True
+        )
+    except (OSError, ValueError):
+        return
+    for key, pos in metrics_file.positions.items():
+        base = pos + 1 + KEY_SIZE // 8
+        series = totals.setdefault(key, [0.0] * VALUES)
+        for index in range(VALUES):
+            series[index] += metrics_file.values[base + index]
+    metrics_file.close()
+
+
+@contextmanager
+def _archive_lock(operation):
+    """Блокировка файла LOCK (fcntl.flock) на время блока with."""
+    os.makedirs(_metrics_dir(), exist_ok=True)
+    fd = os.open(
+        os.path.join(_metrics_dir(), LOCK), os.O_RDWR | os.O_CREAT, 0o644
+    )
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
+
+
+def retire(pid) -> None:
+    """
+    Прибавляет метрики завершившегося процесса pid к ARCHIVE
+    и удаляет его файл.
+    """
+    path = os.path.join(_metrics_dir(), f"{pid}.bin")
+    with _archive_lock(fcntl.LOCK_EX):
+        if not os.path.exists(path):
+            return
+        totals = {}
+        _add_file(totals, path)
+        archive = MetricsFile(
+            os.path.join(_metrics_dir(), ARCHIVE),
+            settings.METRICS["MAX_SERIES"],
+        )
+        for key, values in totals.items():
+            pos = archive.position(key)
+            if pos is None:
+                continue
+            base = pos + 1 + KEY_SIZE // 8
+            for index, value in enumerate(values):
+                archive.values[base + index] += value
+        archive.close()
+        os.remove(path)
+
+
+def retire_dead() -> None:
+    """Переносит в ARCHIVE файлы процессов, которые уже завершились."""
+    os.makedirs(_metrics_dir(), exist_ok=True)
+    for filename in os.listdir(_metrics_dir()):
+        name, extension = os.path.splitext(filename)
+        if extension == ".bin" and name.isdigit() and not _alive(int(name)):
+            retire(name)
+
+
+def _labels(names, values, extra="") -> str:
+    pairs = [
+        f'{name}="{value}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+def export() -> str:
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    totals = store.collect()
+    requests = sorted(
+        (key.split(SEPARATOR), values)
+        for key, values in totals.items()
+        if not key.startswith(COUNTER)
+    )
+    lines = [
+        "# HELP foodgram_http_request_duration_seconds "
+        "Длительность обработки запроса.",
+        "# TYPE foodgram_http_request_duration_seconds histogram",
+    ]
+    for labels, values in requests:
+        cumulative = 0
+        for index, bound in enumerate(BUCKETS + ("+Inf",)):
+            cumulative += values[FIRST_BUCKET + index]
+            lines.append(
+                "foodgram_http_request_duration_seconds_bucket"
+                + _labels(REQUEST_LABELS, labels, f'le="{bound}"')
+                + f" {cumulative:.0f}"
+            )
+        lines.append(
+            "foodgram_http_request_duration_seconds_sum"
+            + _labels(REQUEST_LABELS, labels)
+            + f" {values[SECONDS]}"
+        )
+        lines.append(
+            "foodgram_http_request_duration_seconds_count"
+            + _labels(REQUEST_LABELS, labels)
+            + f" {values[REQUESTS]:.0f}"
+        )
+    for name, index, help_text in (
+        ("sql_queries", QUERIES, "Количество SQL-запросов."),
+        ("sql_duration_seconds", SQL_SECONDS, "Суммарное время SQL."),
+        ("response_bytes", RESPONSE_BYTES, "Суммарный размер ответов."),
+    ):
+        lines.append(f"# HELP foodgram_http_{name}_total {help_text}")
+        lines.append(f"# TYPE foodgram_http_{name}_total counter")
+        for labels, values in requests:
+            lines.append(
+                f"foodgram_http_{name}_total"
+                + _labels(REQUEST_LABELS, labels)
+                + f" {values[index]}"
+            )
+    for key, values in sorted(totals.items()):
+        if key.startswith(COUNTER):
+            name = f"foodgram_{key[len(COUNTER):]}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {values[0]}")
+    return "\n".join(lines) + "\n"
+
+
+store = MetricsStore()
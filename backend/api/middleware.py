@@ -0,0 +1,95 @@
+"""
+Middleware приложения api.
+"""
+import asyncio
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connection
+
+from .metrics import store
+
+# Счетчик SQL текущего запроса: в режиме ASGI запросы к базе выполняются
+# в потоках пула (api.async_views), которые подключают его к своему
+# соединению
+current_query_counter = ContextVar("current_query_counter", default=None)
+
+
+class QueryCounter:
+    """
+    Обертка выполнения SQL (connection.execute_wrapper):
+    считает запросы и их суммарное время.
+    """
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики каждого запроса к маршрутам api:
+    длительность, количество и время SQL-запросов,
+    размер и статус ответа (см. api.metrics).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Признак асинхронного middleware (как в MiddlewareMixin)
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        started = perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        return self.record(request, response, counter, started)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = current_query_counter.set(counter)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_counter.reset(token)
+        return self.record(request, response, counter, started)
+
+    def record(self, request, response, counter, started):
+        seconds = perf_counter() - started
+        match = request.resolver_match
+        if match is None or match.namespace != "api":
+            return response
+        # Действие ViewSet (list, retrieve, favorite, ...)
+        actions = getattr(match.func, "actions", None) or {}
+        if response.streaming:
+            response_bytes = int(response.get("Content-Length", 0))
+        else:
+            response_bytes = len(response.content)
+        store.record_request(
+            route=match.url_name or "",
+            action=actions.get(request.method.lower(), ""),
+            method=request.method,
+            status=response.status_code,
+            seconds=seconds,
+            queries=counter.count,
+            sql_seconds=counter.seconds,
+            response_bytes=response_bytes,
+        )
+        return response
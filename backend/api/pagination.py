@@ -1,9 +1,97 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+# Максимальный размер страницы (параметр limit)
+MAX_PAGE_SIZE = 100
+
+# Время кэширования приблизительного количества объектов (секунды)
+APPROX_COUNT_TTL = 30
+
+
+def approximate_count(queryset) -> int:
+    """
+    Приблизительное количество объектов в выборке.
+    В PostgreSQL - оценка планировщика (EXPLAIN) вместо COUNT(*),
+    в остальных СУБД - точный подсчет. Результат кэшируется.
+    """
+    queryset = queryset.order_by()
+    sql, params = queryset.query.sql_with_params()
+    key = "approx_count:" + hashlib.md5(
+        f"{sql}{params}".encode()
+    ).hexdigest()
+    count = cache.get(key)
+    if count is not None:
+        return count
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        count = int(plan[0]["Plan"]["Plan Rows"])
+    else:
+        count = queryset.count()
+    cache.set(key, count, APPROX_COUNT_TTL)
+    return count
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Пагинация по ключу (keyset): следующая страница выбирается
+    условием id > последнего id вместо OFFSET, без COUNT(*).
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "limit"
+    max_page_size = MAX_PAGE_SIZE
+    # Уникальное индексированное поле (первичный ключ)
+    ordering = "id"
+    # Параметр запроса приблизительного общего количества объектов
+    approx_count_query_param = "approx_count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.approx_count_query_param):
+            self.count = approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        content = OrderedDict()
+        if self.count is not None:
+            content["count"] = self.count
+        content["next"] = self.get_next_link()
+        content["previous"] = self.get_previous_link()
+        content["results"] = data
+        return Response(content)
 
 
 class CustomPagination(PageNumberPagination):
     """
     Класс пагинации (по-умолчанию).
+    Номер страницы (page, limit); при наличии параметра cursor -
+    пагинация по ключу (KeysetPagination).
     """
 
     page_size_query_param = "limit"
+    max_page_size = MAX_PAGE_SIZE
+
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,232 @@
+"""
+Общие тела Рецептов и признаки пользователя наложением.
+
+Ответ RecipeReadSerializer авторизованному пользователю отличается
+от ответа анонимному только признаками is_favorited,
+is_in_shopping_cart и author.is_subscribed. Тело Рецепта сериализуется
+один раз и хранится в общем кэше (ключ - id Рецепта и поколения
+recipes.generations), признаки накладываются по наборам id
+пользователя: Рецепты Избранного и Списка покупок, авторы Подписок.
+Наборы читаются одним запросом на запрос к api и кэшируются; действия
+favorite, shopping_cart и subscribe меняют поколение наборов
+в их ключе (invalidate_user_sets). Изменения наборов в админке
+учитываются по истечении USER_SETS_TIMEOUT; изменения состава
+Рецептов в админке сразу меняют поколение Рецептов
+(recipes.admin.touch_recipes).
+"""
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import BooleanField, IntegerField, Prefetch, Value
+from django.http import Http404
+from recipes import generations
+from recipes.models import (Favorite, Recipe, RecipeIngredient, ShoppingCart,
+                            Tag)
+from rest_framework.response import Response
+from users.models import Subscribtion
+
+from .serializers import RecipeReadSerializer
+
+UserSets = namedtuple("UserSets", ("favorites", "cart", "subscriptions"))
+
+EMPTY_SETS = UserSets(frozenset(), frozenset(), frozenset())
+
+# Атрибут запроса с наборами текущего пользователя
+REQUEST_ATTRIBUTE = "_recipe_user_sets"
+
+
+def read_queryset():
+    """
+    Рецепты для RecipeReadSerializer: автор в том же запросе,
+    теги и ингредиенты - по одному запросу на выборку.
+    """
+    return Recipe.objects.select_related("author").prefetch_related(
+        Prefetch("tags", queryset=Tag.objects.all()),
+        Prefetch(
+            "recipe_ingredient",
+            queryset=RecipeIngredient.objects.select_related("ingredient"),
+        ),
+    )
+
+
+def user_sets_generation(user_id) -> str:
+    """Группа recipes.generations наборов пользователя."""
+    return f"user_sets:{user_id}"
+
+
+def user_sets_key(user_id) -> str:
+    """
+    Ключ наборов с их текущим поколением: наборы, прочитанные до
+    изменения и записанные в кэш после него, остаются под прежним
+    ключом, который больше не читается.
+    """
+    (generation,) = generations.current(user_sets_generation(user_id))
+    return f"user_sets:{user_id}:{generation}"
+
+
+def load_user_sets(user_id) -> UserSets:
+    """Наборы id пользователя одним запросом (UNION ALL)."""
+    rows = (
+        Favorite.objects.filter(user_id=user_id)
+        .order_by()
+        .annotate(kind=Value(0, output_field=IntegerField()))
+        .values_list("kind", "recipe_id")
+        .union(
+            ShoppingCart.objects.filter(user_id=user_id)
+            .order_by()
+            .annotate(kind=Value(1, output_field=IntegerField()))
+            .values_list("kind", "recipe_id"),
+            Subscribtion.objects.filter(user_id=user_id)
+            .order_by()
+            .annotate(kind=Value(2, output_field=IntegerField()))
+            .values_list("kind", "author_id"),
+            all=True,
+        )
+    )
+    ids = ([], [], [])
+    for kind, object_id in rows:
+        ids[kind].append(object_id)
+    return UserSets(*map(frozenset, ids))
+
+
+def user_sets(request) -> UserSets:
+    """
+    Наборы текущего пользователя: из кэша или базы данных,
+    не более одного раза за запрос к api.
+    """
+    sets = getattr(request, REQUEST_ATTRIBUTE, None)
+    if sets is not None:
+        return sets
+    user = request.user
+    if not user.is_authenticated:
+        sets = EMPTY_SETS
+    else:
+        key = user_sets_key(user.id)
+        sets = cache.get(key)
+        if sets is None:
+            sets = load_user_sets(user.id)
+            cache.set(key, sets, settings.RESPONSE_CACHE["USER_SETS_TIMEOUT"])
+    setattr(request, REQUEST_ATTRIBUTE, sets)
+    return sets
+
+
+def invalidate_user_sets(user_id) -> None:
+    """Наборы пользователя устарели: новое поколение после фиксации."""
+    generations.bump(user_sets_generation(user_id))
+
+
+def filter_ids(queryset, ids, lookup):
+    """
+    Рецепты с id из набора ids. Набор больше допустимого числа
+    параметров запроса СУБД заменяется соединением lookup.
+    """
+    limit = connections[queryset.db].features.max_query_params
+    if limit is not None and len(ids) >= limit:
+        return queryset.filter(**lookup)
+    return queryset.filter(id__in=ids)
+
+
+def recipe_bodies(request, recipe_ids) -> dict:
+    """
+    Тела Рецептов recipe_ids без признаков пользователя: {id: тело}.
+    Отсутствующие в кэше сериализуются одной выборкой.
+    """
+    # Ссылки в теле (картинки) - абсолютные
+    prefix = "recipe:" + hashlib.md5(
+        repr(
+            (
+                request.build_absolute_uri("/"),
+                generations.current(
+                    generations.RECIPES, generations.TAGS, generations.USERS
+                ),
+            )
+        ).encode()
+    ).hexdigest()
+    keys = {recipe_id: f"{prefix}:{recipe_id}" for recipe_id in recipe_ids}
+    cached = cache.get_many(keys.values())
+    bodies = {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items()
+        if key in cached
+    }
+    missing = [
+        recipe_id for recipe_id in recipe_ids if recipe_id not in bodies
+    ]
+    if missing:
+        recipes = read_queryset().filter(id__in=missing).annotate(
+            # Признаки накладываются при ответе: запросов на Рецепт нет
+            is_favorited=Value(False, output_field=BooleanField()),
+            is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            author_is_subscribed=Value(False, output_field=BooleanField()),
+        )
+        serializer = RecipeReadSerializer(
+            recipes, many=True, context={"request": request}
+        )
+        new = {body["id"]: dict(body) for body in serializer.data}
+        cache.set_many(
+            {keys[recipe_id]: body for recipe_id, body in new.items()},
+            settings.RESPONSE_CACHE["TIMEOUT"],
+        )
+        bodies.update(new)
+    return bodies
+
+
+def overlay(body, sets, authenticated) -> dict:
+    """Тело Рецепта с признаками пользователя."""
+    author = body["author"]
+    return {
+        **body,
+        "author": {
+            **author,
+            "is_subscribed": (
+                author["id"] in sets.subscriptions if authenticated else None
+            ),
+        },
+        "is_favorited": body["id"] in sets.favorites,
+        "is_in_shopping_cart": body["id"] in sets.cart,
+    }
+
+
+class SharedRecipeMixin:
+    """
+    list и retrieve из общих тел Рецептов с признаками пользователя
+    (RESPONSE_CACHE["SHARED_RECIPES"]). Выборка и пагинация
+    обрабатывают только id.
+    """
+
+    def render_recipes(self, request, recipe_ids):
+        bodies = recipe_bodies(request, recipe_ids)
+        sets = user_sets(request)
+        authenticated = request.user.is_authenticated
+        return [
+            overlay(bodies[recipe_id], sets, authenticated)
+            for recipe_id in recipe_ids
+            if recipe_id in bodies
+        ]
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE["SHARED_RECIPES"]:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(Recipe.objects.only("id"))
+        page = self.paginate_queryset(queryset)
+        recipes = queryset if page is None else page
+        data = self.render_recipes(request, [recipe.id for recipe in recipes])
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE["SHARED_RECIPES"]:
+            return super().retrieve(request, *args, **kwargs)
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            recipe_id = int(lookup)
+        except ValueError:
+            raise Http404
+        data = self.render_recipes(request, [recipe_id])
+        if not data:
+            raise Http404
+        return Response(data[0])
@@ -0,0 +1,133 @@
+"""
+Кэш ответов api анонимным пользователям: список и просмотр Рецептов.
+
+Ответ анонимному пользователю не зависит от Избранного, Списка покупок
+и Подписок, поэтому он общий для всех. В кэше (CACHES["default"])
+хранятся данные ответа до отрисовки (формат выбирается для каждого
+запроса) и его ETag / Last-Modified. Ключ - действие, нормализованные
+параметры запроса и поколения Рецептов, Тегов и Пользователей
+(recipes.generations): изменение любого из них делает прежние ключи
+недостижимыми.
+
+Попадания и промахи считаются в метриках api (response_cache_hits,
+response_cache_misses), доля попаданий - stats().
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+from recipes import generations
+from rest_framework.response import Response
+
+from .metrics import COUNTER, store
+
+# Параметры списка, от которых зависит ответ
+LIST_PARAMS = ("tags", "author", "page", "limit")
+# Параметры, которые для анонимного пользователя ничего не меняют
+IGNORED_PARAMS = ("is_favorited", "is_in_shopping_cart")
+
+HITS = "response_cache_hits"
+MISSES = "response_cache_misses"
+
+
+def cache_key(request, action, lookup=None):
+    """
+    Ключ кэша ответа или None, если ответ не кэшируется:
+    пользователь авторизован или в запросе есть другие параметры
+    (search, cursor, ...).
+    """
+    if request.user.is_authenticated:
+        return None
+    params = []
+    for name in request.query_params:
+        if name in IGNORED_PARAMS:
+            continue
+        if name not in LIST_PARAMS or action != "list":
+            return None
+        params.append((name, sorted(request.query_params.getlist(name))))
+    versions = generations.current(
+        generations.RECIPES, generations.TAGS, generations.USERS
+    )
+    # Ссылки в ответе (next, картинки) - абсолютные
+    origin = request.build_absolute_uri("/")
+    digest = hashlib.md5(
+        repr((origin, lookup, sorted(params), versions)).encode()
+    ).hexdigest()
+    return f"response:{action}:{digest}"
+
+
+def stats() -> dict:
+    """Попадания, промахи и доля попаданий по всем процессам."""
+    totals = store.collect()
+    hits = totals.get(COUNTER + HITS, [0.0])[0]
+    misses = totals.get(COUNTER + MISSES, [0.0])[0]
+    requests = hits + misses
+    return {
+        "hits": int(hits),
+        "misses": int(misses),
+        "ratio": hits / requests if requests else None,
+    }
+
+
+class AnonymousCacheMixin:
+    """
+    Кэш list и retrieve для анонимных пользователей.
+    Располагается перед ConditionalGetMixin: попадание в кэш
+    не требует запросов к базе данных, в том числе для версии (ETag).
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            cache_key(request, "list"),
+            lambda: super(AnonymousCacheMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached_response(
+            request,
+            cache_key(request, "retrieve", lookup),
+            lambda: super(AnonymousCacheMixin, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    def cached_response(self, request, key, render):
+        if key is None:
+            return render()
+        entry = cache.get(key)
+        if entry is None:
+            store.increment(MISSES)
+            response = render()
+            if response.status_code == 200:
+                headers = {
+                    header: response[header]
+                    for header in ("ETag", "Last-Modified")
+                    if response.has_header(header)
+                }
+                cache.set(
+                    key,
+                    (headers, response.data),
+                    settings.RESPONSE_CACHE["TIMEOUT"],
+                )
+            return response
+        store.increment(HITS)
+        headers, data = entry
+        response = get_conditional_response(
+            request,
+            etag=headers.get("ETag"),
+            last_modified=parse_http_date_safe(
+                headers.get("Last-Modified", "")
+            ),
+        )
+        if response is None:
+            response = Response(data)
+        for header, value in headers.items():
+            response[header] = value
+        patch_vary_headers(response, ("Authorization", "Cookie"))
+        return response
@@ -1,17 +1,71 @@
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from recipes import images, shopping_list
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
-from rest_framework import status
 from rest_framework.exceptions import ValidationError
-from rest_framework.serializers import (ImageField, IntegerField,
+from rest_framework.serializers import (Field, IntegerField, ListField,
                                         ModelSerializer,
                                         PrimaryKeyRelatedField, ReadOnlyField,
                                         SerializerMethodField)
 from users.models import CustomUser, Subscribtion
 
 
+def media_url(request, name):
+    """Адрес файла: абсолютный, если известен запрос."""
+    url = images.storage().url(name)
+    if request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
+class RecipeImageField(Field):
+    """
+    Картинка Рецепта (Recipe): обработанный оригинал без метаданных
+    (recipes.images), пока он не готов - загруженный файл.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        name = images.variant_name(recipe, images.FULL) or recipe.image.name
+        if not name:
+            return None
+        return media_url(self.context.get("request"), name)
+
+
+class ImageVariantsField(RecipeImageField):
+    """
+    Уменьшенные варианты картинки Рецепта (Recipe):
+    {"thumbnail": {"jpeg": адрес, "webp": адрес}, "card": {...}}.
+    Пока варианты не сформированы - пустой словарь.
+    """
+
+    def to_representation(self, recipe):
+        request = self.context.get("request")
+        return {
+            variant: {
+                extension: media_url(request, name)
+                for extension, name in formats.items()
+            }
+            for variant, formats in recipe.image_variants.get(
+                "variants", {}
+            ).items()
+            if variant != images.FULL
+        }
+
+
+def does_not_exist(pk_value) -> str:
+    """Сообщение PrimaryKeyRelatedField об отсутствующем объекте."""
+    return PrimaryKeyRelatedField.default_error_messages[
+        "does_not_exist"
+    ].format(pk_value=pk_value)
+
+
 class CustomUserSerializer(UserSerializer):
     """ "
     Серилизатор модели Пользователя (CustomUser).
@@ -39,6 +93,9 @@ class CustomUserSerializer(UserSerializer):
         user = self.context.get("request").user
         if user.is_anonymous:
             return None
+        # Значение аннотации из RecipeViewSet.get_queryset
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         return Subscribtion.objects.filter(user=user, author=obj).exists()
 
     def create(self, validated_data):
@@ -52,6 +109,9 @@ class SubscribtionRecipeListSerializer(ModelSerializer):
     формирование списка Рецептов (Recipes).
     """
 
+    image = RecipeImageField(source="*")
+    image_variants = ImageVariantsField(source="*")
+
     class Meta:
         model = Recipe
         fields = (
@@ -59,6 +119,7 @@ class SubscribtionRecipeListSerializer(ModelSerializer):
             "name",
             "cooking_time",
             "image",
+            "image_variants",
         )
 
 
@@ -93,27 +154,22 @@ class SubscribtionSerializer(ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Возвращает значение существования Подписки (Subscription)."""
-        return obj.author.recipes.exists()
+        # Сериализуются только существующие Подписки
+        return True
 
     def get_recipes(self, obj):
-        """Возвращает Рецепты (Recipies) автора."""
-        request = self.context.get("request")
-        recipes = obj.author.recipes.all()
-        # ReDoc: Количество объектов внутри поля recipes
-        recipes_limit = request.GET.get("recipes_limit")
-        if recipes_limit is not None:
-            try:
-                recipes_limit = int(recipes_limit)
-            except ValueError:
-                raise ValidationError(
-                    detail="recipes_limit: Ожидается целое число",
-                    code=status.HTTP_400_BAD_REQUEST)
-            recipes = recipes[:recipes_limit]
-        return SubscribtionRecipeListSerializer(recipes, many=True).data
+        """
+        Возвращает Рецепты (Recipies) автора.
+        Загружаются заранее (CustomUserViewSet.get_subscriptions_context).
+        """
+        recipes = self.context["recipes"].get(obj.author_id, [])
+        return SubscribtionRecipeListSerializer(
+            recipes, many=True, context=self.context
+        ).data
 
     def get_recipes_count(self, obj):
         """Возвращает количество Рецептов (Recipies) автора."""
-        return obj.author.recipes.count()
+        return obj.author.recipes_count
 
 
 # ReDoc: Список ингредиентов - GET
@@ -195,7 +251,8 @@ class RecipeReadSerializer(ModelSerializer):
     is_favorited = SerializerMethodField()
     # ReDoc: is_in_shopping_cart (boolean)
     is_in_shopping_cart = SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField(source="*")
+    image_variants = ImageVariantsField(source="*")
 
     class Meta:
         model = Recipe
@@ -211,14 +268,23 @@ class RecipeReadSerializer(ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
         )
         read_only_fields = fields
 
+    def to_representation(self, instance):
+        # Подписка на автора вычислена аннотацией запроса Рецептов
+        if hasattr(instance, "author_is_subscribed"):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     # Определение метода для "is_favorited"
     def get_is_favorited(self, obj):
         """Проверка наличия в Избранном (Favorite)."""
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         request = self.context.get("request")
         return (
             request.user.is_authenticated
@@ -228,6 +294,8 @@ class RecipeReadSerializer(ModelSerializer):
     # Определение метода для "is_in_shopping_cart"
     def get_is_in_shopping_cart(self, obj):
         """Проверка наличия в Спискe покупок (ShoppingCart)."""
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         request = self.context.get("request")
         return (
             request.user.is_authenticated
@@ -244,7 +312,9 @@ class RecipeIngredientWriteSerializer(ModelSerializer):
     Рецепта (Recipe) и Ингридиента (Ingredient)(RecipeIngredien).
     """
 
-    id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    # Ингредиенты Рецепта загружаются одним запросом
+    # (RecipeWriteSerializer.validate_ingredients)
+    id = IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -264,10 +334,8 @@ class RecipeWriteSerializer(ModelSerializer):
     """
 
     ingredients = RecipeIngredientWriteSerializer(many=True)
-    tags = PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-    )
+    # Теги загружаются одним запросом (validate_tags)
+    tags = ListField(child=IntegerField())
     image = Base64ImageField()
 
     class Meta:
@@ -286,17 +354,30 @@ class RecipeWriteSerializer(ModelSerializer):
     def validate_ingredients(self, value):
         """ "
         Валидирует назначение Ингредиентов (Ingredient) Рецепту (Recipes).
+        Все Ингредиенты загружаются одним запросом (IN).
         """
         if not value:
             raise ValidationError(
                 {"ingredients": "Рецепт не может быть без ингредиентов!"}
             )
-        ingredients_list = []
+        ingredients = Ingredient.objects.in_bulk(
+            {item["id"] for item in value}
+        )
+        if len(ingredients) < len({item["id"] for item in value}):
+            raise ValidationError(
+                [
+                    {}
+                    if item["id"] in ingredients
+                    else {"id": [does_not_exist(item["id"])]}
+                    for item in value
+                ]
+            )
+        ingredients_set = set()
         error_msg = []
         for item in value:
-            ingredient = get_object_or_404(Ingredient, name=item["id"])
+            ingredient = ingredients[item["id"]]
             err = []
-            if ingredient in ingredients_list:
+            if ingredient.id in ingredients_set:
                 err.append(
                     f"'{ingredient.name}' id={ingredient.id} повторяется."
                 )
@@ -306,7 +387,8 @@ class RecipeWriteSerializer(ModelSerializer):
                 )
             if err:
                 error_msg.append(err)
-            ingredients_list.append(ingredient)
+            ingredients_set.add(ingredient.id)
+            item["id"] = ingredient
 
         if error_msg:
             raise ValidationError(error_msg)
@@ -315,35 +397,85 @@ class RecipeWriteSerializer(ModelSerializer):
     def validate_tags(self, value):
         """
         Валидирует назначение Тэгов (Tag) Рецепту (Recipes).
+        Все Теги загружаются одним запросом (IN).
         """
         if not value:
             raise ValidationError({"tags": "Нужно указать хотя бы один тег!"})
-        tags_list = []
+        tags = Tag.objects.in_bulk(set(value))
+        for tag_id in value:
+            if tag_id not in tags:
+                raise ValidationError(does_not_exist(tag_id))
+        tags_set = set()
         error_msg = ""
-        for tag in value:
-            err = ""
-            if tag in tags_list:
-                err += f"Тег {tag.name} повторяется!\n"
-            error_msg += err
-            tags_list.append(tag)
+        for tag_id in value:
+            if tag_id in tags_set:
+                error_msg += f"Тег {tags[tag_id].name} повторяется!\n"
+            tags_set.add(tag_id)
         if error_msg:
             raise ValidationError({"tags": error_msg})
-        return value
+        return [tags[tag_id] for tag_id in value]
 
-    def take_ingredients_tags(self, recipe, ingredients, tags):
+    def take_ingredients_tags(self, recipe, ingredients, tags, new=False):
         """ "
         Создает связи между:
         Рецептом (Recipe) и Ингридиентами (Ingredient),
         Рецептом (Recipe) и Тегами (Tag).
+        Изменяются только отличающиеся строки: не более одного
+        bulk_create, bulk_update и delete на каждую таблицу связей.
+        Возвращает прежний состав: {id ингредиента: количество}.
         """
-        for ingredient in ingredients:
-            RecipeIngredient.objects.update_or_create(
-                recipe=recipe,
-                ingredient=ingredient["id"],
-                amount=ingredient["amount"],
+        amounts = {item["id"].id: item["amount"] for item in ingredients}
+        rows = (
+            {}
+            if new
+            else {
+                row.ingredient_id: row
+                for row in RecipeIngredient.objects.filter(recipe=recipe)
+            }
+        )
+        changed = [
+            RecipeIngredient(id=row.id, amount=amounts[ingredient_id])
+            for ingredient_id, row in rows.items()
+            if amounts.get(ingredient_id, row.amount) != row.amount
+        ]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
             )
-        recipe.tags.set(tags)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in rows
+        )
+        RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        removed = rows.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+
+        recipe_tags = Recipe.tags.through
+        tag_ids = {tag.id for tag in tags}
+        old_tag_ids = (
+            set()
+            if new
+            else set(
+                recipe_tags.objects.filter(recipe=recipe).values_list(
+                    "tag_id", flat=True
+                )
+            )
+        )
+        recipe_tags.objects.bulk_create(
+            recipe_tags(recipe_id=recipe.id, tag_id=tag_id)
+            for tag_id in tag_ids - old_tag_ids
+        )
+        if old_tag_ids - tag_ids:
+            recipe_tags.objects.filter(
+                recipe=recipe, tag_id__in=old_tag_ids - tag_ids
+            ).delete()
+        return {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop("ingredients")
         tags = validated_data.pop("tags")
@@ -352,23 +484,40 @@ class RecipeWriteSerializer(ModelSerializer):
             **validated_data,
         )
         self.take_ingredients_tags(
-            recipe=recipe, ingredients=ingredients, tags=tags
+            recipe=recipe, ingredients=ingredients, tags=tags, new=True
         )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop("ingredients")
         tags = validated_data.pop("tags")
-        instance.ingredients.clear()
-        instance.tags.clear()
-        self.take_ingredients_tags(
+        old_amounts = self.take_ingredients_tags(
             recipe=instance,
             ingredients=ingredients,
             tags=tags,
         )
+        # Пересчет Списков покупок, в которых есть этот Рецепт
+        shopping_list.change_recipe(
+            instance.id,
+            old_amounts,
+            {
+                ingredient["id"].id: ingredient["amount"]
+                for ingredient in ingredients
+            },
+        )
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        # Состав и теги для ответа - двумя запросами
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                "recipe_ingredient",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+            "tags",
+        )
         return RecipeReadSerializer(instance, context=self.context).data
 
 
@@ -379,14 +528,15 @@ class FavoriteSerializer(ModelSerializer):
 
     id = PrimaryKeyRelatedField(source="recipe", read_only=True)
     name = ReadOnlyField(source="recipe.name")
-    image = ImageField(source="recipe.image", read_only=True)
+    image = RecipeImageField(source="recipe")
+    image_variants = ImageVariantsField(source="recipe")
     cooking_time = IntegerField(source="recipe.cooking_time", read_only=True)
 
     class Meta:
         model = Favorite
         fields = (
             # ReDoc: "id", "name", "image", "cooking_time"
-            "id", "name", "image", "cooking_time",
+            "id", "name", "image", "image_variants", "cooking_time",
         )
 
 
@@ -397,7 +547,8 @@ class ShoppingCartSerializer(ModelSerializer):
 
     id = PrimaryKeyRelatedField(source="recipe", read_only=True)
     name = ReadOnlyField(source="recipe.name")
-    image = ImageField(source="recipe.image", read_only=True)
+    image = RecipeImageField(source="recipe")
+    image_variants = ImageVariantsField(source="recipe")
     cooking_time = IntegerField(source="recipe.cooking_time", read_only=True)
 
     class Meta:
@@ -407,5 +558,6 @@ class ShoppingCartSerializer(ModelSerializer):
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
@@ -0,0 +1,142 @@
+"""
+Формирование Списка покупок (ShoppingCart) для скачивания.
+
+Суммы Ингредиентов читаются из ShoppingListItem и выводятся потоково:
+txt и csv формируются построчно по мере чтения из базы,
+pdf собирается в ограниченном пуле потоков.
+"""
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from recipes.models import ShoppingListItem
+from rest_framework.renderers import BaseRenderer
+
+# Размер блока при чтении строк из базы и при выдаче pdf
+CHUNK_SIZE = 2000
+PDF_CHUNK_SIZE = 64 * 1024
+
+FOOTER = "Сформирован Продуктовым помощником Foodgram"
+
+# Пул потоков для формирования pdf
+pdf_executor = ThreadPoolExecutor(
+    max_workers=settings.SHOPPING_CART["PDF_WORKERS"],
+    thread_name_prefix="shopping-cart-pdf",
+)
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """
+    Формат Списка покупок (?format=txt|csv|pdf или заголовок Accept).
+    Файл формирует само представление, рендерер только выбирается
+    и выводит сообщения об ошибках.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode()
+
+
+class TxtRenderer(ShoppingCartRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CsvRenderer(ShoppingCartRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class PdfRenderer(ShoppingCartRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+
+
+def shopping_cart_ingredients(user):
+    """
+    Суммарное количество Ингредиентов (Ingredient) в Списке покупок:
+    чтение готовых сумм (ShoppingListItem) по индексу пользователя.
+    """
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .order_by("ingredient__name", "ingredient__measurement_unit")
+        .values_list(
+            "ingredient__name", "ingredient__measurement_unit", "amount"
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def render_txt(title, rows):
+    yield f"{title}\n"
+    for name, measurement_unit, amount in rows:
+        yield f"\n- {name}: {amount} {measurement_unit}"
+    yield f"\n\n{FOOTER}\n"
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(title, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(("Ингредиент", "Количество", "Единица измерения"))
+    for name, measurement_unit, amount in rows:
+        yield writer.writerow((name, amount, measurement_unit))
+
+
+def _build_pdf(title, rows) -> bytes:
+    """Формирует pdf-документ (выполняется в pdf_executor)."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = "ShoppingCartFont"
+    if font not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(font, settings.SHOPPING_CART["PDF_FONT"])
+        )
+    buffer = BytesIO()
+    document = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin, line_height = 50, 18
+    lines = title.splitlines() + [""]
+    lines += [
+        f"- {name}: {amount} {measurement_unit}"
+        for name, measurement_unit, amount in rows
+    ]
+    lines += ["", FOOTER]
+    y = height - margin
+    document.setFont(font, 12)
+    for line in lines:
+        if y < margin:
+            document.showPage()
+            document.setFont(font, 12)
+            y = height - margin
+        document.drawString(margin, y, line)
+        y -= line_height
+    document.save()
+    return buffer.getvalue()
+
+
+def render_pdf(title, rows):
+    # Строки читаются в потоке запроса (соединение с базой привязано
+    # к потоку), документ собирается в пуле.
+    content = pdf_executor.submit(_build_pdf, title, list(rows)).result()
+    for start in range(0, len(content), PDF_CHUNK_SIZE):
+        yield content[start:start + PDF_CHUNK_SIZE]
+
+
+RENDERERS = {
+    "txt": render_txt,
+    "csv": render_csv,
+    "pdf": render_pdf,
+}
@@ -0,0 +1,70 @@
+"""
+Данные для тестов api: Пользователи, Теги, Ингредиенты и Рецепты.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.test import APIClient
+from users.models import CustomUser
+
+# Кэш процесса вместо файлового: тесты не видят ответов друг друга
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+def create_user(username, **kwargs):
+    return CustomUser.objects.create_user(
+        email=f"{username}@example.com",
+        username=username,
+        first_name="Имя",
+        last_name="Фамилия",
+        password="Fennel-Route-417",
+        **kwargs,
+    )
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(
+            name=f"Тег {number}",
+            color=f"#{number:06X}",
+            slug=f"tag-{number}",
+        )
+        for number in range(count)
+    ]
+
+
+def create_ingredients(count):
+    return [
+        Ingredient.objects.create(
+            name=f"Ингредиент {number:03}", measurement_unit="г"
+        )
+        for number in range(count)
+    ]
+
+
+def create_recipe(author, tags, ingredients, amount=10, name="Рецепт"):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text="Описание", cooking_time=10
+    )
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+def count_queries(callback):
+    """(результат callback, количество запросов к базе данных)."""
+    with CaptureQueriesContext(connection) as queries:
+        result = callback()
+    return result, len(queries)
@@ -0,0 +1,70 @@
+"""
+Команда advise_indexes: существующие индексы не рекомендуются повторно,
+каждый запрос api выполняет SQL даже при заполненных кэшах ответов.
+"""
+import re
+from io import StringIO
+
+from api.management.commands.advise_indexes import ENDPOINTS, Command
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from .factories import (LOCMEM_CACHES, client_for, create_ingredients,
+                        create_recipe, create_tags, create_user)
+
+# Строка отчета о запросе: GET адрес (статус): запросов N
+REPORT = re.compile(r"^GET (\S+) \((\d+)\): запросов (\d+)", re.MULTILINE)
+
+
+class RecommendTest(TestCase):
+    def test_existing_indexes(self):
+        command = Command()
+        for table, columns in (
+            ("recipes_recipe", ["id"]),
+            ("recipes_recipeingredient", ["recipe_id", "ingredient_id"]),
+        ):
+            with self.subTest(table=table, columns=columns):
+                self.assertIsNone(command.recommend(table, columns))
+
+    def test_missing_index(self):
+        self.assertEqual(
+            Command().recommend("recipes_recipe", ["text"]),
+            ("recipes_recipe", ("text",)),
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AdviseIndexesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("buyer")
+        author = create_user("author")
+        tags = create_tags(2)
+        ingredients = create_ingredients(3)
+        recipes = [
+            create_recipe(author, tags, ingredients, name=f"Суп {number}")
+            for number in range(3)
+        ]
+        client = client_for(cls.user)
+        for recipe in recipes[:2]:
+            client.post(f"/api/recipes/{recipe.id}/favorite/")
+            client.post(f"/api/recipes/{recipe.id}/shopping_cart/")
+        client.post(f"/api/users/{author.id}/subscribe/")
+
+    def test_every_endpoint_queries_database(self):
+        # Кэши ответов заполнены до анализа
+        for client in (client_for(), client_for(self.user)):
+            client.get("/api/recipes/")
+        stdout = StringIO()
+        call_command("advise_indexes", stdout=stdout)
+        reports = REPORT.findall(stdout.getvalue())
+        self.assertEqual(len(reports), len(ENDPOINTS))
+        for url, status, queries in reports:
+            with self.subTest(url=url):
+                self.assertEqual(status, "200")
+                if "?q=" in url and connection.vendor != "postgresql":
+                    # Нечеткий поиск в SQLite - по индексу в памяти
+                    # (recipes.ingredient_index), без запросов
+                    continue
+                self.assertGreater(int(queries), 0)
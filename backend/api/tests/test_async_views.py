@@ -0,0 +1,115 @@
+"""
+Потоковые ответы асинхронных представлений (режим ASGI): части
+формируются в потоке пула ORM и отправляются клиенту по мере готовности.
+"""
+import threading
+
+from api.async_views import ASGIHandler, async_view
+from asgiref.sync import async_to_sync
+from django.http import StreamingHttpResponse
+from django.test import TransactionTestCase, override_settings
+from django.urls import path
+from recipes.models import Ingredient
+
+from .factories import LOCMEM_CACHES, create_ingredients
+
+# Ожидание событий между потоком пула и циклом событий (секунды)
+TIMEOUT = 5
+
+
+class Stream:
+    """Содержимое ответа: названия Ингредиентов по одному на часть."""
+
+    def __init__(self):
+        self.first_sent = threading.Event()
+        self.closed = threading.Event()
+        self.threads = set()
+        self.waited = None
+
+    def __iter__(self):
+        try:
+            for number, name in enumerate(
+                Ingredient.objects.order_by("id")
+                .values_list("name", flat=True)
+                .iterator(chunk_size=2)
+            ):
+                self.threads.add(threading.current_thread().name)
+                yield f"{name}\n"
+                if number == 0:
+                    # Первая часть уже у клиента, ответ не собран целиком
+                    self.waited = self.first_sent.wait(TIMEOUT)
+        finally:
+            self.closed.set()
+
+
+stream = None
+
+
+def stream_view(request):
+    return StreamingHttpResponse(iter(stream), content_type="text/plain")
+
+
+urlpatterns = [path("stream/", async_view(stream_view))]
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ROOT_URLCONF=__name__)
+class AsyncStreamingTest(TransactionTestCase):
+    def setUp(self):
+        global stream
+        stream = Stream()
+        self.stream = stream
+        self.names = [
+            ingredient.name for ingredient in create_ingredients(40)
+        ]
+
+    def request(self, send):
+        received = []
+
+        async def receive():
+            if received:
+                raise AssertionError("Тело запроса уже прочитано")
+            received.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/stream/",
+            "query_string": b"",
+            "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 1),
+            "scheme": "http",
+            "root_path": "",
+        }
+        async_to_sync(ASGIHandler())(scope, receive, send)
+
+    def test_parts_sent_while_streaming(self):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+            if message.get("body"):
+                self.stream.first_sent.set()
+
+        self.request(send)
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertTrue(self.stream.waited)
+        self.assertEqual(
+            b"".join(message.get("body", b"") for message in messages[1:]),
+            "".join(f"{name}\n" for name in self.names).encode(),
+        )
+        self.assertGreater(len(messages), len(self.names))
+        self.assertFalse(messages[-1].get("more_body"))
+        self.assertEqual(len(self.stream.threads), 1)
+        self.assertTrue(self.stream.threads.pop().startswith("orm"))
+
+    def test_disconnect_stops_stream(self):
+        async def send(message):
+            if message.get("body"):
+                self.stream.first_sent.set()
+                raise OSError("Клиент отключился")
+
+        with self.assertRaises(OSError):
+            self.request(send)
+        self.assertTrue(self.stream.closed.wait(TIMEOUT))
@@ -0,0 +1,46 @@
+"""
+Условные GET-запросы Рецептов: версия учитывает профили авторов.
+"""
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .factories import (LOCMEM_CACHES, client_for, create_ingredients,
+                        create_recipe, create_tags, create_user)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecipeConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user("reader")
+        cls.author = create_user("author")
+        cls.recipe = create_recipe(
+            cls.author, create_tags(1), create_ingredients(2)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_author_change_invalidates_version(self):
+        paths = ("/api/recipes/", f"/api/recipes/{self.recipe.id}/")
+        for number, (user, path) in enumerate(
+            (user, path) for user in (None, self.reader) for path in paths
+        ):
+            with self.subTest(user=user, path=path):
+                client = client_for(user)
+                etag = client.get(path)["ETag"]
+                response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.author.first_name = f"Имя {number}"
+                    self.author.save()
+                response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+                self.assertEqual(
+                    response.data["results"][0]["author"]["first_name"]
+                    if path == paths[0]
+                    else response.data["author"]["first_name"],
+                    f"Имя {number}",
+                )
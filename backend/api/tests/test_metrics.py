@@ -0,0 +1,60 @@
+"""
+Метрики процессов: длинные ключи серий и файлы завершившихся процессов.
+"""
+import os
+import subprocess
+import tempfile
+
+from api import metrics
+from django.test import SimpleTestCase, override_settings
+
+
+class MetricsTest(SimpleTestCase):
+    def setUp(self):
+        runtime = tempfile.TemporaryDirectory()
+        self.addCleanup(runtime.cleanup)
+        settings = override_settings(RUNTIME_DIR=runtime.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.store = metrics.MetricsStore()
+
+    def record(self, store, route, requests=1):
+        for _ in range(requests):
+            store.record_request(route, "list", "GET", 200, 0.01, 2, 0, 10)
+
+    def test_long_keys_do_not_collide(self):
+        first, second = "маршрут-" * 20 + "1", "маршрут-" * 20 + "2"
+        self.record(self.store, first)
+        self.record(self.store, second, requests=2)
+        totals = self.store.collect()
+        self.assertEqual(len(totals), 2)
+        for key, values in totals.items():
+            self.assertLessEqual(len(key.encode()), metrics.KEY_SIZE)
+            self.assertEqual(
+                key.split(metrics.SEPARATOR)[1:], ["list", "GET", "200"]
+            )
+        self.assertEqual(
+            sorted(values[metrics.REQUESTS] for values in totals.values()),
+            [1, 2],
+        )
+
+    def test_dead_process_files_are_archived(self):
+        self.record(self.store, "recipes-list", requests=3)
+        process = subprocess.Popen(["true"])
+        process.wait()
+        dead = metrics.MetricsFile(
+            os.path.join(metrics._metrics_dir(), f"{process.pid}.bin"),
+            self.store._get_file().slots,
+        )
+        pos = dead.position("recipes-list\tlist\tGET\t200")
+        dead.values[pos + 1 + metrics.KEY_SIZE // 8 + metrics.REQUESTS] = 4
+        dead.close()
+        for _ in range(2):
+            totals = self.store.collect()
+            self.assertEqual(
+                totals["recipes-list\tlist\tGET\t200"][metrics.REQUESTS], 7
+            )
+        self.assertEqual(
+            sorted(os.listdir(metrics._metrics_dir())),
+            sorted([metrics.ARCHIVE, metrics.LOCK, f"{os.getpid()}.bin"]),
+        )
@@ -0,0 +1,88 @@
+"""
+Фиксированный план запросов списка и просмотра Рецептов:
+количество запросов не зависит от размера страницы и Рецепта.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscribtion
+
+from .factories import (LOCMEM_CACHES, client_for, count_queries,
+                        create_ingredients, create_recipe, create_tags,
+                        create_user)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecipeQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user("reader")
+        authors = [create_user(f"author{number}") for number in range(5)]
+        tags = create_tags(3)
+        ingredients = create_ingredients(40)
+        cls.recipes = [
+            create_recipe(
+                authors[number % 5],
+                tags[: 1 + number % 3],
+                ingredients[: 1 + number % 40],
+            )
+            for number in range(60)
+        ]
+        for recipe in cls.recipes[::2]:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        for author in authors[:3]:
+            Subscribtion.objects.create(user=cls.reader, author=author)
+        cls.small = create_recipe(authors[0], tags[:1], ingredients[:1])
+        cls.large = create_recipe(authors[1], tags, ingredients)
+
+    def get(self, path, user):
+        """Ответ без кэша и количество запросов."""
+        cache.clear()
+        response, queries = count_queries(
+            lambda: client_for(user).get(path)
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def plans(self):
+        """Оба плана: общие тела Рецептов и get_queryset."""
+        for shared in (True, False):
+            for user in (None, self.reader):
+                with self.subTest(shared=shared, user=user), override_settings(
+                    RESPONSE_CACHE={
+                        **settings.RESPONSE_CACHE,
+                        "SHARED_RECIPES": shared,
+                    }
+                ):
+                    yield user
+
+    def test_list_queries_do_not_depend_on_limit(self):
+        for user in self.plans():
+            single, single_queries = self.get("/api/recipes/?limit=1", user)
+            page, page_queries = self.get("/api/recipes/?limit=50", user)
+            self.assertEqual(len(single.data["results"]), 1)
+            self.assertEqual(len(page.data["results"]), 50)
+            self.assertEqual(single_queries, page_queries)
+
+    def test_detail_queries_do_not_depend_on_recipe_size(self):
+        for user in self.plans():
+            small, small_queries = self.get(
+                f"/api/recipes/{self.small.id}/", user
+            )
+            large, large_queries = self.get(
+                f"/api/recipes/{self.large.id}/", user
+            )
+            self.assertEqual(len(small.data["ingredients"]), 1)
+            self.assertEqual(len(large.data["ingredients"]), 40)
+            self.assertEqual(small_queries, large_queries)
+
+    def test_user_flags(self):
+        for user in self.plans():
+            response, _ = self.get("/api/recipes/?limit=6", user)
+            recipe = response.data["results"][0]
+            self.assertEqual(recipe["id"], self.recipes[0].id)
+            self.assertEqual(recipe["is_favorited"], user is not None)
+            self.assertEqual(recipe["is_in_shopping_cart"], user is not None)
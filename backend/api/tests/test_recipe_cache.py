@@ -0,0 +1,37 @@
+"""
+Наборы id пользователя (api.recipe_cache): наборы, прочитанные
+до изменения и записанные в кэш после него, не читаются.
+"""
+from api.recipe_cache import (invalidate_user_sets, load_user_sets, user_sets,
+                              user_sets_key)
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from recipes.models import Favorite
+
+from .factories import (LOCMEM_CACHES, create_ingredients, create_recipe,
+                        create_tags, create_user)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserSetsTest(TestCase):
+    def setUp(self):
+        self.user = create_user("reader")
+        self.recipe = create_recipe(
+            create_user("author"), create_tags(1), create_ingredients(1)
+        )
+
+    def current_sets(self):
+        request = RequestFactory().get("/api/recipes/")
+        request.user = self.user
+        return user_sets(request)
+
+    def test_late_write_of_stale_sets(self):
+        # Параллельный запрос прочитал наборы до добавления в Избранное
+        stale_key = user_sets_key(self.user.id)
+        stale = load_user_sets(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=self.recipe)
+            invalidate_user_sets(self.user.id)
+        # и записал их в кэш уже после фиксации
+        cache.set(stale_key, stale)
+        self.assertEqual(self.current_sets().favorites, {self.recipe.id})
@@ -0,0 +1,69 @@
+"""
+Изменение состава Рецепта (PATCH): количество запросов не зависит
+от количества измененных ингредиентов.
+"""
+from django.test import TestCase, override_settings
+from recipes import shopping_list
+from recipes.models import RecipeIngredient, ShoppingCart
+
+from .factories import (LOCMEM_CACHES, client_for, count_queries,
+                        create_ingredients, create_recipe, create_tags,
+                        create_user)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecipeUpdateQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.buyers = [create_user(f"buyer{number}") for number in range(3)]
+        cls.tags = create_tags(2)
+        cls.ingredients = create_ingredients(40)
+        cls.recipes = [
+            create_recipe(cls.author, cls.tags, cls.ingredients)
+            for _ in range(2)
+        ]
+        for recipe in cls.recipes:
+            for buyer in cls.buyers:
+                ShoppingCart.objects.create(user=buyer, recipe=recipe)
+        shopping_list.rebuild([buyer.id for buyer in cls.buyers])
+
+    def patch(self, recipe, changed):
+        """PATCH с новым количеством первых changed ингредиентов."""
+        amounts = {
+            ingredient.id: 10 + (number < changed) * (number + 1)
+            for number, ingredient in enumerate(self.ingredients)
+        }
+        response, queries = count_queries(
+            lambda: client_for(self.author).patch(
+                f"/api/recipes/{recipe.id}/",
+                {
+                    "ingredients": [
+                        {"id": ingredient_id, "amount": amount}
+                        for ingredient_id, amount in amounts.items()
+                    ],
+                    "tags": [tag.id for tag in self.tags],
+                },
+                format="json",
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(
+                RecipeIngredient.objects.filter(recipe=recipe).values_list(
+                    "ingredient_id", "amount"
+                )
+            ),
+            amounts,
+        )
+        return queries
+
+    def test_queries_do_not_depend_on_changed_ingredients(self):
+        single = self.patch(self.recipes[0], 1)
+        many = self.patch(self.recipes[1], 30)
+        self.assertEqual(single, many)
+        user_ids = [buyer.id for buyer in self.buyers]
+        self.assertEqual(
+            shopping_list.stored_items(user_ids),
+            shopping_list.expected_items(user_ids),
+        )
@@ -0,0 +1,41 @@
+"""
+Подписки пользователя (users/subscriptions/) с recipes_limit.
+"""
+from django.test import TestCase, override_settings
+
+from .factories import (LOCMEM_CACHES, client_for, create_ingredients,
+                        create_recipe, create_tags, create_user)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SubscriptionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user("reader")
+        cls.author = create_user("author")
+        tags, ingredients = create_tags(1), create_ingredients(1)
+        for _ in range(3):
+            create_recipe(cls.author, tags, ingredients)
+
+    def subscriptions(self, **params):
+        response = client_for(self.reader).get(
+            "/api/users/subscriptions/", params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_no_subscriptions(self):
+        for params in ({}, {"recipes_limit": 3}):
+            with self.subTest(params=params):
+                data = self.subscriptions(**params)
+                self.assertEqual(data["count"], 0)
+                self.assertEqual(data["results"], [])
+
+    def test_recipes_limit(self):
+        client_for(self.reader).post(
+            f"/api/users/{self.author.id}/subscribe/"
+        )
+        data = self.subscriptions(recipes_limit=2)
+        self.assertEqual(data["count"], 1)
+        self.assertEqual(len(data["results"][0]["recipes"]), 2)
+        self.assertEqual(data["results"][0]["recipes_count"], 3)
@@ -1,10 +1,12 @@
 """
 api URL Configuration
 """
+from django.conf import settings
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
 from . import views
+from .async_views import asyncify
 
 
 # ReDoc: '/api/'
@@ -55,8 +57,18 @@ router_api.register(
 )
 
 urlpatterns = [
+    # Метрики в формате Prometheus (только для администраторов)
+    path("_metrics", views.MetricsView.as_view(), name="metrics"),
     # api
-    path("", include(router_api.urls)),
+    # В режиме ASGI горячие маршруты - асинхронные (api.async_views)
+    path(
+        "",
+        include(
+            asyncify(router_api.urls)
+            if settings.ASGI["ASYNC_VIEWS"]
+            else router_api.urls
+        ),
+    ),
     # Djoser
     # https://djoser.readthedocs.io/en/latest/authentication_backends.html
     path("", include("djoser.urls")),
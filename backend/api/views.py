@@ -1,27 +1,73 @@
 from datetime import datetime
 
-from django.db.models import Sum
-from django.shortcuts import HttpResponse, get_object_or_404
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
+from recipes import generations, toggles
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
-from users.models import CustomUser, Subscribtion
+from users.models import Subscribtion
 
+from . import metrics
+from .conditional import ConditionalGetMixin
 from .filters import IngredientFilter, RecipeFilter
 from .permissions import IsAuthorOrReadOnly
+from .recipe_cache import (SharedRecipeMixin, invalidate_user_sets,
+                           read_queryset)
+from .response_cache import AnonymousCacheMixin
 from .serializers import (FavoriteSerializer, IngredientSerializer,
                           RecipeReadSerializer, RecipeWriteSerializer,
                           ShoppingCartSerializer, SubscribtionSerializer,
                           TagSerializer)
+from .shopping_cart import (RENDERERS, CsvRenderer, PdfRenderer, TxtRenderer,
+                            shopping_cart_ingredients)
 
 # --- users app ---
 
 
+def limited_recipes(author_ids, limit=None):
+    """
+    Рецепты авторов author_ids одним запросом, не более limit
+    на автора: ROW_NUMBER() в разрезе автора и отбор по номеру.
+    """
+    if not author_ids:
+        # Для пустого фильтра sql_with_params() вызывает EmptyResultSet
+        return Recipe.objects.none()
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit is None:
+        return recipes
+    ranked = recipes.annotate(
+        author_position=Window(
+            expression=RowNumber(),
+            partition_by=[F("author_id")],
+            order_by=F("id").asc(),
+        )
+    )
+    sql, params = ranked.query.sql_with_params()
+    return Recipe.objects.raw(
+        f'SELECT * FROM ({sql}) ranked WHERE "author_position" <= %s',
+        (*params, limit),
+    )
+
+
+def object_id(value) -> int:
+    """id объекта из адреса: не число - 404."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404
+
+
 class CustomUserViewSet(UserViewSet):
     """
     Viewset для Пользователя (CustomUser) и
@@ -37,13 +83,45 @@ class CustomUserViewSet(UserViewSet):
         Возвращает пользователей, на которых подписан текущий пользователь.
         В выдачу добавляются рецепты.
         """
-        subscribtions = Subscribtion.objects.filter(user=request.user)
-        pages = self.paginate_queryset(subscribtions)
+        pages = self.paginate_queryset(
+            self.get_subscriptions_queryset(request.user)
+        )
         serializer = SubscribtionSerializer(
-            pages, many=True, context={"request": request}
+            pages, many=True, context=self.get_subscriptions_context(pages)
         )
         return self.get_paginated_response(serializer.data)
 
+    def get_subscriptions_queryset(self, user):
+        """Подписки пользователя (со счетчиками автора)."""
+        return (
+            Subscribtion.objects.filter(user=user)
+            .select_related("author")
+            .order_by("id")
+        )
+
+    def get_subscriptions_context(self, subscribtions):
+        """
+        Контекст SubscribtionSerializer: рецепты всех авторов страницы,
+        полученные одним запросом (не более recipes_limit на автора).
+        """
+        # ReDoc: Количество объектов внутри поля recipes
+        recipes_limit = self.request.query_params.get("recipes_limit")
+        if recipes_limit is not None:
+            try:
+                recipes_limit = int(recipes_limit)
+            except ValueError:
+                recipes_limit = -1
+            if recipes_limit < 0:
+                raise ValidationError(
+                    detail="recipes_limit: Ожидается целое число",
+                    code=status.HTTP_400_BAD_REQUEST,
+                )
+        recipes = {}
+        author_ids = [subscribtion.author_id for subscribtion in subscribtions]
+        for recipe in limited_recipes(author_ids, recipes_limit):
+            recipes.setdefault(recipe.author_id, []).append(recipe)
+        return {"request": self.request, "recipes": recipes}
+
     @action(
         detail=True,
         # ReDoc: Доступно только авторизованным пользователям
@@ -54,21 +132,23 @@ class CustomUserViewSet(UserViewSet):
     def subscribe(self, request, id=None):
         """Подписывает / отписывает Пользователя от автора."""
         user = request.user
-        author = get_object_or_404(CustomUser, id=id)
+        author_id = object_id(id)
         # Котроль ограничения подписки на самого себя
-        if user == author:
+        if author_id == user.id:
             message = (
                 "Вы не можете подписаться " "на самого себя (или отписаться)."
             )
             return Response(
                 {"errors": message}, status=status.HTTP_400_BAD_REQUEST
             )
-        is_subscribed = Subscribtion.objects.filter(
-            user=user, author=author
-        ).exists()
         # Блок POST-запроса
         if self.request.method == "POST":
-            if is_subscribed:
+            author, added = toggles.add(
+                toggles.SUBSCRIBTION, user.id, author_id
+            )
+            if author is None:
+                raise Http404
+            if not added:
                 return Response(
                     {
                         "errors": (
@@ -78,16 +158,21 @@ class CustomUserViewSet(UserViewSet):
                     },
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            subscribtion = Subscribtion.objects.create(
-                user=user, author=author
-            )
+            invalidate_user_sets(user.id)
+            subscribtion = Subscribtion(user=user, author=author)
             serializer = SubscribtionSerializer(
-                subscribtion, context={"request": request}
+                subscribtion,
+                context=self.get_subscriptions_context([subscribtion]),
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         # Блок DELETE-запроса
-        if is_subscribed:
-            Subscribtion.objects.filter(user=user, author=author).delete()
+        author, removed = toggles.remove(
+            toggles.SUBSCRIBTION, user.id, author_id
+        )
+        if author is None:
+            raise Http404
+        if removed:
+            invalidate_user_sets(user.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {
@@ -102,7 +187,7 @@ class CustomUserViewSet(UserViewSet):
 # --- recipes app ---
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     """ViewSet модели Ингредиент (Ingredient)."""
 
     queryset = Ingredient.objects.all()
@@ -113,8 +198,36 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """
+        Список и автодополнение обслуживаются из индекса в памяти процесса
+        (recipes.ingredient_index) без запросов к базе данных
+        (кроме нечеткого поиска q в PostgreSQL).
+        """
+        # Версия списка - версия индекса, запросов к базе нет
+        ingredient_index.refresh()
+        return self.conditional_response(
+            request,
+            ingredient_index.version,
+            None,
+            lambda: self.list_from_index(request),
+        )
+
+    def list_from_index(self, request):
+        name = request.query_params.get("name")
+        # REQ: Нечеткий поиск с опечатками (q)
+        query = request.query_params.get("q")
+        if query:
+            ingredients = ingredient_index.fuzzy(query)
+        elif name:
+            ingredients = ingredient_index.search(name)
+        else:
+            ingredients = ingredient_index.all()
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
 
-class TagViewSet(ReadOnlyModelViewSet):
+
+class TagViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     """ViewSet модели Тег (Tag)."""
 
     queryset = Tag.objects.all()
@@ -123,14 +236,51 @@ class TagViewSet(ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class RecipeViewSet(ModelViewSet):
-    """ViewSet модели Рецепт (Recipe)."""
+class RecipeViewSet(
+    AnonymousCacheMixin, ConditionalGetMixin, SharedRecipeMixin, ModelViewSet
+):
+    """
+    ViewSet модели Рецепт (Recipe).
+    Ответы анонимным пользователям кэшируются (api.response_cache),
+    list и retrieve собираются из общих тел Рецептов (api.recipe_cache).
+    """
 
-    queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     # ReDoc: Доступна фильтрация по избранному, автору, списку покупок и тегам
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    # Рецепты содержат признаки is_favorited, is_in_shopping_cart
+    # и подписку на автора
+    personalized = True
+    # Рецепты содержат профили авторов
+    version_generations = (generations.USERS,)
+
+    def get_version_queryset(self):
+        return Recipe.objects.all()
+
+    def get_queryset(self):
+        """
+        Фиксированный план запросов для списка и детального просмотра:
+        автор в том же запросе, теги и ингредиенты - по одному запросу
+        на страницу, признаки текущего пользователя - аннотации Exists.
+        """
+        queryset = read_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            author_is_subscribed=Exists(
+                Subscribtion.objects.filter(
+                    user=user, author=OuterRef("author")
+                )
+            ),
+        )
 
     # Опрелеяем сериализатор в зависимости от типа запроса
     def get_serializer_class(self):
@@ -149,33 +299,29 @@ class RecipeViewSet(ModelViewSet):
     # ReDoc: recipes/{id}/favorite/
     def favorite(self, request, *args, **kwargs):
         """Обработка Избранного (Favorite)."""
-        recipe = get_object_or_404(Recipe, id=self.kwargs.get("pk"))
+        recipe_id = object_id(self.kwargs.get("pk"))
         user = request.user
-        in_favorite = Favorite.objects.filter(
-            recipe=recipe, user=user
-        ).exists()
         # Блок POST-запроса
         if request.method == "POST":
+            recipe, added = toggles.add(toggles.FAVORITE, user.id, recipe_id)
+            if recipe is None:
+                raise Http404
             # Проверка наличия в Избранном
-            if in_favorite:
+            if not added:
                 return Response(
                     # ReDoc: "errors": "string"
                     {"errors": "Рецепт был добавлен в Избранное ранее!"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-
-            serializer = FavoriteSerializer(data=request.data)
-            if serializer.is_valid(raise_exception=True):
-                serializer.save(recipe=recipe, user=user)
-                return Response(
-                    serializer.data, status=status.HTTP_201_CREATED
-                )
-            return Response(
-                serializer.errors, status=status.HTTP_400_BAD_REQUEST
-            )
+            invalidate_user_sets(user.id)
+            serializer = FavoriteSerializer(Favorite(recipe=recipe, user=user))
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
         # Блок DELETE-запроса
-        if in_favorite:
-            Favorite.objects.filter(recipe=recipe, user=user).delete()
+        recipe, removed = toggles.remove(toggles.FAVORITE, user.id, recipe_id)
+        if recipe is None:
+            raise Http404
+        if removed:
+            invalidate_user_sets(user.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             # ReDoc: "errors": "string"
@@ -193,32 +339,34 @@ class RecipeViewSet(ModelViewSet):
     # ReDoc: recipes/{id}/shopping_cart/
     def shopping_cart(self, request, **kwargs):
         """Обработка Списка покупок (ShoppingCart)."""
-        recipe = get_object_or_404(Recipe, id=self.kwargs.get("pk"))
-        in_shopping_cart = ShoppingCart.objects.filter(
-            user=request.user, recipe=recipe
-        ).exists()
+        recipe_id = object_id(self.kwargs.get("pk"))
+        user = request.user
         # Блок POST-запроса
         if request.method == "POST":
-            if in_shopping_cart:
+            recipe, added = toggles.add(
+                toggles.SHOPPING_CART, user.id, recipe_id
+            )
+            if recipe is None:
+                raise Http404
+            if not added:
                 return Response(
                     # ReDoc: "errors": "string"
                     {"errors": "Рецепт был добавлен в списке покупок ранее."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-
-            serializer = ShoppingCartSerializer(data=request.data)
-            if serializer.is_valid(raise_exception=True):
-                serializer.save(recipe=recipe, user=request.user)
-                return Response(
-                    # 'Рецепт успешно удалён из списка покупок.',
-                    serializer.data,
-                    status=status.HTTP_201_CREATED,
-                )
+            invalidate_user_sets(user.id)
+            serializer = ShoppingCartSerializer(
+                ShoppingCart(recipe=recipe, user=user)
+            )
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
         # Блок DELETE-запроса
-        if in_shopping_cart:
-            ShoppingCart.objects.filter(
-                user=request.user, recipe=recipe
-            ).delete()
+        recipe, removed = toggles.remove(
+            toggles.SHOPPING_CART, user.id, recipe_id
+        )
+        if recipe is None:
+            raise Http404
+        if removed:
+            invalidate_user_sets(user.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             # ReDoc: "errors": "string"
@@ -231,37 +379,49 @@ class RecipeViewSet(ModelViewSet):
         methods=["GET"],
         # Доступно только авторизованным пользователям
         permission_classes=(IsAuthenticated,),
+        # Формат: ?format=txt|csv|pdf (по-умолчанию txt)
+        renderer_classes=(
+            TxtRenderer,
+            CsvRenderer,
+            PdfRenderer,
+        ),
     )
     # recipes/download_shopping_cart/
     def download_shopping_cart(self, request):
         """Скачать Список покупок (ShoppingCart)."""
-        ingredients = (
-            ShoppingCart.objects.filter(user=request.user)
-            .values(
-                "recipe__ingredients__name",
-                "recipe__ingredients__measurement_unit",
-            )
-            .annotate(amount=Sum("recipe__recipe_ingredient__amount"))
-        )
+        renderer = request.accepted_renderer
         today = datetime.today()
-        shopping_cart = (
+        title = (
             f"Список покупок от {today:%Y-%m-%d %H:%M}\n"
             f"Пользователь: {request.user.get_full_name()} "
-            f"({request.user.username})\n"
+            f"({request.user.username})"
         )
-        for ingredient in ingredients:
-            shopping_cart += (
-                f'\n- {ingredient["recipe__ingredients__name"]}: '
-                f'{ingredient["amount"]} '
-                f'{ingredient["recipe__ingredients__measurement_unit"]}'
-            )
-
-        shopping_cart += "\n\nСформирован Продуктовым помощником Foodgram"
-
-        filename = f"{today:%Y-%m-%d}_{request.user.username}_ShoppingCart.txt"
-        response = HttpResponse(
-            shopping_cart, content_type="text.txt; charset=utf-8"
+        rows = shopping_cart_ingredients(request.user)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f"; charset={renderer.charset}"
+        response = StreamingHttpResponse(
+            RENDERERS[renderer.format](title, rows),
+            content_type=content_type,
+        )
+        filename = (
+            f"{today:%Y-%m-%d}_{request.user.username}_ShoppingCart."
+            f"{renderer.format}"
         )
         response["Content-Disposition"] = f"attachment; filename={filename}"
-
         return response
+
+
+# --- service ---
+
+
+class MetricsView(APIView):
+    """Метрики запросов к api в формате Prometheus."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.export(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
+# Горячие маршруты api - асинхронные представления (api.async_views)
+os.environ.setdefault("ASYNC_VIEWS", "1")
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+# Обработчик с асинхронной отправкой потоковых ответов
+from api.async_views import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -3,6 +3,7 @@ Django settings for foodgram project.
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -48,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики запросов к api (api.metrics)
+    "api.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -143,6 +146,88 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Каталог служебных файлов, общих для всех процессов (воркеров) сервера
+RUNTIME_DIR = os.getenv(
+    "RUNTIME_DIR", default=os.path.join(tempfile.gettempdir(), "foodgram")
+)
+
+# Общий кэш процессов (воркеров): кэш ответов api (api.response_cache)
+# и поколения данных для его инвалидации (recipes.generations)
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": os.path.join(RUNTIME_DIR, "cache"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# Кэш ответов анонимным пользователям (api.response_cache)
+# и тел Рецептов (api.recipe_cache)
+RESPONSE_CACHE = {
+    # Срок хранения ответа и тела Рецепта (секунды)
+    "TIMEOUT": 300,
+    # list и retrieve Рецептов из общих тел с признаками пользователя
+    # (api.recipe_cache)
+    "SHARED_RECIPES": True,
+    # Срок хранения наборов id Избранного, Списка покупок и Подписок
+    "USER_SETS_TIMEOUT": 300,
+}
+
+# Индекс автодополнения Ингредиентов (recipes.ingredient_index)
+INGREDIENT_INDEX = {
+    # Максимальное количество подсказок в ответе
+    "LIMIT": 20,
+    # Срок актуальности рейтинга популярности ингредиентов (секунды)
+    "POPULARITY_TTL": 300,
+    # Минимальное сходство триграмм для нечеткого поиска (параметр q)
+    "SIMILARITY": 0.15,
+}
+
+# Скачивание Списка покупок (api.shopping_cart)
+SHOPPING_CART = {
+    # Количество потоков для одновременного формирования pdf
+    "PDF_WORKERS": int(os.getenv("SHOPPING_CART_PDF_WORKERS", default=2)),
+    # Шрифт с поддержкой кириллицы
+    "PDF_FONT": os.getenv(
+        "SHOPPING_CART_PDF_FONT",
+        default="/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    ),
+}
+
+# Обработка картинок Рецептов (recipes.images)
+RECIPE_IMAGES = {
+    # Количество потоков обработки картинок
+    "WORKERS": int(os.getenv("RECIPE_IMAGES_WORKERS", default=2)),
+    # Наибольшая сторона сохраняемого оригинала (пиксели)
+    "MAX_SIZE": 1920,
+    # Качество JPEG и WebP
+    "QUALITY": 85,
+    # Варианты картинки: название -> (ширина, высота)
+    "VARIANTS": {
+        "thumbnail": (240, 240),
+        "card": (640, 480),
+    },
+}
+
+# Режим ASGI (foodgram.asgi, воркеры uvicorn под gunicorn: SERVER_MODE=asgi)
+ASGI = {
+    # Горячие маршруты api - асинхронные представления (api.async_views);
+    # включается в foodgram.asgi
+    "ASYNC_VIEWS": os.getenv("ASYNC_VIEWS", default="") == "1",
+    # Потоков ORM на процесс: предел одновременных запросов к базе
+    # и соединений с ней
+    "ORM_THREADS": int(os.getenv("ASGI_ORM_THREADS", default=16)),
+}
+
+# Метрики запросов к api (api.metrics), выгрузка: /api/_metrics
+METRICS = {
+    # Максимальное количество серий (маршрут, метод, статус) на процесс
+    "MAX_SERIES": 1024,
+}
+
 # Djoser settings
 # https://djoser.readthedocs.io/en/latest/settings.html
 DJOSER = {
@@ -0,0 +1,33 @@
+"""
+Настройки gunicorn.
+
+SERVER_MODE=asgi - приложение foodgram.asgi на воркерах uvicorn
+(асинхронные представления api), иначе - foodgram.wsgi на синхронных
+воркерах. Количество воркеров - переменная WEB_CONCURRENCY.
+"""
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
+if os.getenv("SERVER_MODE") == "asgi":
+    # Настройки читаются при импорте api.metrics, до foodgram.asgi
+    os.environ.setdefault("ASYNC_VIEWS", "1")
+
+from api import metrics  # noqa: E402
+
+bind = os.getenv("GUNICORN_BIND", default="0:8000")
+
+if os.getenv("SERVER_MODE") == "asgi":
+    wsgi_app = "foodgram.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "foodgram.wsgi:application"
+
+
+def on_starting(server):
+    """Файлы метрик процессов прошлого запуска переносятся в общий файл."""
+    metrics.retire_dead()
+
+
+def worker_exit(server, worker):
+    """Метрики завершающегося воркера переносятся в общий файл."""
+    metrics.retire(worker.pid)
@@ -1,11 +1,92 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
 
-from . import models
+from . import counters, generations, models, shopping_list, toggles
 
 # Вывод "пустого" значения.
 EMPTY_VALUE: str = "-пусто-"
 
 
+def touch_recipes(recipe_ids) -> None:
+    """
+    Обновляет время изменения Рецептов (версия для условных GET)
+    и поколение кэша Рецептов: update() не отправляет сигналов.
+    """
+    models.Recipe.objects.filter(id__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    generations.bump(generations.RECIPES)
+
+
+def change_parts(old_parts, new_parts) -> None:
+    """
+    Строки состава Рецептов (Рецепт, Ингредиент, количество) заменены:
+    разница по каждому Рецепту переносится в Списки покупок.
+    """
+    amounts = ({}, {})
+    for parts, recipes in zip((old_parts, new_parts), amounts):
+        for recipe_id, ingredient_id, amount in parts:
+            recipe = recipes.setdefault(recipe_id, {})
+            recipe[ingredient_id] = recipe.get(ingredient_id, 0) + amount
+    old, new = amounts
+    for recipe_id in old.keys() | new.keys():
+        shopping_list.change_recipe(
+            recipe_id, old.get(recipe_id, {}), new.get(recipe_id, {})
+        )
+
+
+def change_carts(removed, added) -> None:
+    """
+    Строки Списков покупок (пользователь, Рецепт) удалены и добавлены:
+    изменяются суммы Ингредиентов и счетчики Рецептов.
+    """
+    for user_id, recipe_id in removed:
+        shopping_list.remove_recipe(user_id, recipe_id)
+        counters.increment(models.Recipe, recipe_id, "in_carts_count", -1)
+    for user_id, recipe_id in added:
+        shopping_list.add_recipe(user_id, recipe_id)
+        counters.increment(models.Recipe, recipe_id, "in_carts_count")
+
+
+class CountedLinkAdmin(admin.ModelAdmin):
+    """
+    Связь пользователя с объектом (relation из recipes.toggles):
+    счетчик объекта изменяется вместе со строками, как в api.
+    """
+
+    relation = None
+
+    def change_counts(self, removed, added) -> None:
+        model = toggles.target_model(self.relation)
+        for target_id in removed:
+            counters.increment(model, target_id, self.relation.counter, -1)
+        for target_id in added:
+            counters.increment(model, target_id, self.relation.counter)
+
+    def save_model(self, request, obj, form, change):
+        field = f"{self.relation.field}_id"
+        removed = list(
+            self.model.objects.filter(pk=obj.pk).values_list(
+                field, flat=True
+            )
+        ) if change else []
+        super().save_model(request, obj, form, change)
+        self.change_counts(removed, [getattr(obj, field)])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.change_counts([getattr(obj, f"{self.relation.field}_id")], [])
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        removed = list(
+            queryset.values_list(f"{self.relation.field}_id", flat=True)
+        )
+        super().delete_queryset(request, queryset)
+        self.change_counts(removed, [])
+
+
 # REQ: Вывести все модели с возможностью редактирования и удаление записей.
 class IngredientAdmin(admin.ModelAdmin):
     # REQ: В список вывести название ингредиента и единицы измерения.
@@ -26,7 +107,9 @@ class IngredientAdmin(admin.ModelAdmin):
         "measurement_unit",
     )
     # REQ: Добавить фильтр по названию.
-    list_filter = ("name",)
+    # Фильтр по названию перечислял бы все Ингредиенты,
+    # по названию - поиск, фильтр - по единице измерения.
+    list_filter = ("measurement_unit",)
     empty_value_display = EMPTY_VALUE
 
 
@@ -72,22 +155,28 @@ class RecipeAdmin(admin.ModelAdmin):
     # REQ: - редактировать/удалять любые рецепты.
     list_editable = (
         "name",
-        "author",
         "image",
     )
     # REQ: Добавить фильтры по автору, названию рецепта, тегам.
-    list_filter = (
-        "author",
+    # Автор и название - через поиск: фильтры по ним перечисляли бы
+    # всех пользователей и все рецепты.
+    list_filter = ("tags",)
+    search_fields = (
         "name",
-        "tags",
+        "author__username",
+        "author__email",
     )
+    autocomplete_fields = ("author",)
+    filter_horizontal = ("tags",)
+    list_select_related = ("author",)
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE
 
     # REQ: На странице рецепта вывести общее число добавлений
     # этого рецепта в избранное.
     def count_favorites(self, obj) -> int:
-        # Связь с models.Favorite: related_name = 'favorites'.
-        return obj.favorite.count()
+        # Счетчик models.Recipe.favorites_count
+        return obj.favorites_count
 
 
 class RecipeIngredientAdmin(admin.ModelAdmin):
@@ -97,19 +186,66 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         "ingredient",
         "amount",
     )
+    raw_id_fields = ("recipe",)
+    autocomplete_fields = ("ingredient",)
+    list_select_related = (
+        "recipe",
+        "ingredient",
+    )
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE
 
+    # Состав входит в описание Рецепта: обновляется время его изменения
+    # и суммы Списков покупок с этим Рецептом
+    def save_model(self, request, obj, form, change):
+        old_parts = list(
+            self.model.objects.filter(pk=obj.pk).values_list(
+                "recipe_id", "ingredient_id", "amount"
+            )
+        ) if change else []
+        super().save_model(request, obj, form, change)
+        change_parts(
+            old_parts, [(obj.recipe_id, obj.ingredient_id, obj.amount)]
+        )
+        touch_recipes(
+            {obj.recipe_id, *(recipe_id for recipe_id, _, _ in old_parts)}
+        )
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        change_parts([(obj.recipe_id, obj.ingredient_id, obj.amount)], [])
+        touch_recipes([obj.recipe_id])
 
-class FavoriteAdmin(admin.ModelAdmin):
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        old_parts = list(
+            queryset.values_list("recipe_id", "ingredient_id", "amount")
+        )
+        super().delete_queryset(request, queryset)
+        change_parts(old_parts, [])
+        touch_recipes({recipe_id for recipe_id, _, _ in old_parts})
+
+
+class FavoriteAdmin(CountedLinkAdmin):
+    relation = toggles.FAVORITE
     list_display = (
         "pk",
         "user",
         "recipe",
     )
     search_fields = (
+        "user__username",
+        "recipe__name",
+    )
+    autocomplete_fields = (
         "user",
         "recipe",
     )
+    list_select_related = (
+        "user",
+        "recipe",
+    )
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE
 
 
@@ -120,9 +256,58 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         "recipe",
     )
     search_fields = (
+        "user__username",
+        "recipe__name",
+    )
+    autocomplete_fields = (
+        "user",
+        "recipe",
+    )
+    list_select_related = (
         "user",
         "recipe",
     )
+    show_full_result_count = False
+    empty_value_display = EMPTY_VALUE
+
+    # Суммы Списков покупок и счетчики Рецептов изменяются вместе
+    # со строками, как в api (recipes.toggles)
+    def save_model(self, request, obj, form, change):
+        removed = list(
+            self.model.objects.filter(pk=obj.pk).values_list(
+                "user_id", "recipe_id"
+            )
+        ) if change else []
+        super().save_model(request, obj, form, change)
+        change_carts(removed, [(obj.user_id, obj.recipe_id)])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        change_carts([(obj.user_id, obj.recipe_id)], [])
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        removed = list(queryset.values_list("user_id", "recipe_id"))
+        super().delete_queryset(request, queryset)
+        change_carts(removed, [])
+
+
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        "pk",
+        "user",
+        "ingredient",
+        "amount",
+    )
+    raw_id_fields = (
+        "user",
+        "ingredient",
+    )
+    list_select_related = (
+        "user",
+        "ingredient",
+    )
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE
 
 
@@ -132,3 +317,4 @@ admin.site.register(models.Recipe, RecipeAdmin)
 admin.site.register(models.RecipeIngredient, RecipeIngredientAdmin)
 admin.site.register(models.Favorite, FavoriteAdmin)
 admin.site.register(models.ShoppingCart, ShoppingCartAdmin)
+admin.site.register(models.ShoppingListItem, ShoppingListItemAdmin)
@@ -0,0 +1,83 @@
+"""
+Счетчики Рецептов (Recipe) и Пользователей (CustomUser).
+
+Счетчики изменяются выражениями F() в тех же транзакциях,
+что и связанные записи. reconcile() пересчитывает их по фактическим
+данным одним UPDATE на счетчик (исправляются только расхождения).
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def increment(model, pk, field, delta=1) -> None:
+    """Атомарно изменяет счетчик field объекта model с ключом pk."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, related_field):
+    """Подзапрос: фактическое количество связанных записей."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef("pk")})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count("pk"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def counters(apps):
+    """
+    Описание счетчиков: (модель, поле счетчика,
+    связанная модель, поле связи).
+    """
+    model = apps.get_model
+    return (
+        (
+            model("recipes.Recipe"),
+            "favorites_count",
+            model("recipes.Favorite"),
+            "recipe",
+        ),
+        (
+            model("recipes.Recipe"),
+            "in_carts_count",
+            model("recipes.ShoppingCart"),
+            "recipe",
+        ),
+        (
+            model("users.CustomUser"),
+            "recipes_count",
+            model("recipes.Recipe"),
+            "author",
+        ),
+        (
+            model("users.CustomUser"),
+            "followers_count",
+            model("users.Subscribtion"),
+            "author",
+        ),
+    )
+
+
+def reconcile(apps, check=False) -> dict:
+    """
+    Находит и (если не check) исправляет расхождения счетчиков.
+    Возвращает {"Модель.поле": количество исправленных объектов}.
+    """
+    drift = {}
+    for model, field, related_model, related_field in counters(apps):
+        drifted = model.objects.exclude(
+            **{field: actual_count(related_model, related_field)}
+        )
+        if check:
+            count = drifted.count()
+        else:
+            count = drifted.update(
+                **{field: actual_count(related_model, related_field)}
+            )
+        drift[f"{model.__name__}.{field}"] = count
+    return drift
@@ -0,0 +1,50 @@
+"""
+Поколения данных для инвалидации кэшей (api.response_cache).
+
+Поколение - число в общем кэше (CACHES["default"]), которое меняется
+при каждом изменении данных своей группы: Рецептов, Тегов или
+Пользователей. Ключи кэша включают поколения, от которых зависит
+значение: после изменения данных старые ключи не используются
+и удаляются по истечении срока, перечислять их не нужно.
+
+Значение поколения - время изменения в наносекундах, а не счетчик:
+одновременные изменения не требуют атомарного инкремента, а поколение,
+вытесненное из кэша, не повторяет ни одно из прежних значений.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+RECIPES = "recipes"
+TAGS = "tags"
+USERS = "users"
+
+KEY_PREFIX = "generation:"
+
+
+def current(*names) -> tuple:
+    """Текущие поколения групп names (одним обращением к кэшу)."""
+    keys = [KEY_PREFIX + name for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            generation = time.time_ns()
+            cache.add(key, generation, None)
+            # Кэш без хранения (DummyCache) - новое поколение каждый раз
+            values[key] = cache.get(key, generation)
+    return tuple(values[key] for key in keys)
+
+
+def bump(*names) -> None:
+    """
+    Новые поколения групп names после фиксации транзакции: до нее
+    другие процессы еще видят прежние данные и не должны кэшировать их
+    под новым поколением.
+    """
+    def set_generations():
+        cache.set_many(
+            {KEY_PREFIX + name: time.time_ns() for name in names}, None
+        )
+
+    transaction.on_commit(set_generations)
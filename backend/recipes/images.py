@@ -0,0 +1,217 @@
+"""
+Обработка картинок Рецептов (Recipe.image) вне потока запроса.
+
+Загруженный файл сохраняется без перекодирования (удаляются только
+метаданные, recipes.metadata), а после фиксации транзакции
+в ограниченном пуле потоков картинка декодируется, поворачивается
+по EXIF и сохраняется заново без метаданных:
+- "full" - оригинал, уменьшенный до MAX_SIZE (PNG или JPEG);
+- варианты из settings.RECIPE_IMAGES["VARIANTS"] - JPEG и WebP.
+Имена файлов записываются в Recipe.image_variants.
+
+Имена вариантов зависят только от исходного файла (его имя в
+recipes.storage - sha256 содержимого) и настроек обработки, поэтому
+Рецепты с одинаковой картинкой используют одни и те же варианты.
+"""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import generations
+from .models import Recipe
+from .storage import lock_names
+
+logger = logging.getLogger(__name__)
+
+# Обработанный оригинал
+FULL = "full"
+# Форматы уменьшенных вариантов: формат Pillow -> расширение файла
+VARIANT_FORMATS = {"JPEG": "jpeg", "WEBP": "webp"}
+# Фон для картинок с прозрачностью при сохранении в JPEG
+BACKGROUND = (255, 255, 255)
+
+VARIANTS_DIR = "recipes/img/variants"
+
+# Отпечаток настроек обработки: при их изменении меняются имена вариантов
+VERSION = hashlib.sha256(
+    repr(
+        sorted(
+            (key, value)
+            for key, value in settings.RECIPE_IMAGES.items()
+            if key != "WORKERS"
+        )
+    ).encode()
+).hexdigest()[:8]
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGES["WORKERS"],
+    thread_name_prefix="recipe-images",
+)
+
+
+def storage():
+    return Recipe._meta.get_field("image").storage
+
+
+def needs_processing(recipe) -> bool:
+    """Варианты отсутствуют или сформированы для другого файла."""
+    return bool(recipe.image) and (
+        recipe.image_variants.get("source") != recipe.image.name
+    )
+
+
+def variant_names(image_variants) -> list:
+    """Все файлы вариантов из значения Recipe.image_variants."""
+    return [
+        name
+        for formats in image_variants.get("variants", {}).values()
+        for name in formats.values()
+    ]
+
+
+def variant_name(recipe, variant: str):
+    """Файл варианта variant (первый из форматов) или None."""
+    formats = recipe.image_variants.get("variants", {}).get(variant)
+    if not formats:
+        return None
+    return next(iter(formats.values()))
+
+
+def schedule(recipe) -> None:
+    """Обработать картинку Рецепта после фиксации текущей транзакции."""
+    recipe_id, name = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(process_in_thread, recipe_id, name)
+    )
+
+
+def process_in_thread(recipe_id, name, force=False) -> bool:
+    try:
+        return process(recipe_id, name, force)
+    except Exception:
+        logger.exception("Ошибка обработки картинки %s", name)
+        return False
+    finally:
+        # У каждого потока пула свое соединение с базой
+        connections.close_all()
+
+
+def _flatten(image):
+    """Картинка в RGB, прозрачные области - на белом фоне."""
+    if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, BACKGROUND)
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, image_format) -> ContentFile:
+    buffer = BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, image_format, optimize=True)
+    else:
+        image.save(
+            buffer, image_format, quality=settings.RECIPE_IMAGES["QUALITY"]
+        )
+    return ContentFile(buffer.getvalue())
+
+
+def render_variants(image_file):
+    """
+    Декодирует картинку и формирует ее варианты:
+    ((название варианта, расширение, содержимое), ...).
+    Метаданные (EXIF) в варианты не попадают.
+    """
+    image = Image.open(image_file)
+    keep_png = image.format == "PNG"
+    image = ImageOps.exif_transpose(image)
+    max_size = settings.RECIPE_IMAGES["MAX_SIZE"]
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    if keep_png:
+        image = image.convert("RGBA")
+        yield FULL, "png", _encode(image, "PNG")
+    else:
+        image = image.convert("RGB")
+        yield FULL, "jpeg", _encode(image, "JPEG")
+    flat = _flatten(image)
+    for variant, size in settings.RECIPE_IMAGES["VARIANTS"].items():
+        for image_format, extension in VARIANT_FORMATS.items():
+            source = flat if image_format == "JPEG" else image
+            resized = ImageOps.fit(source, size, Image.Resampling.LANCZOS)
+            yield variant, extension, _encode(resized, image_format)
+
+
+def process(recipe_id, name, force=False) -> bool:
+    """
+    Формирует варианты картинки name Рецепта recipe_id.
+    Готовые варианты (той же картинки у другого Рецепта)
+    повторно не формируются, кроме force - тогда файлы вариантов
+    формируются и записываются заново.
+    Возвращает False, если картинка Рецепта уже заменена.
+    """
+    files = storage()
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {}
+    existing = (
+        Recipe.objects.filter(image=name, image_variants__source=name)
+        .values_list("image_variants", flat=True)
+        .first()
+    )
+    if (
+        not force
+        and existing
+        and all(map(files.exists, variant_names(existing)))
+    ):
+        variants = existing["variants"]
+    else:
+        with files.open(name) as image_file:
+            for variant, extension, content in render_variants(image_file):
+                variant_file = (
+                    f"{VARIANTS_DIR}/{stem}_{variant}_{VERSION}.{extension}"
+                )
+                if force:
+                    files.delete(variant_file)
+                variants.setdefault(variant, {})[extension] = files.save_as(
+                    variant_file, content
+                )
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants={"source": name, "variants": variants},
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        # Картинку Рецепта заменили во время обработки
+        release(name, variant_names({"variants": variants}))
+    else:
+        # update() не вызывает сигналы
+        generations.bump(generations.RECIPES)
+    return bool(updated)
+
+
+def release(name, variants) -> None:
+    """
+    Картинка name больше не используется Рецептом: файл и его
+    варианты удаляются, если на name не ссылается ни один Рецепт.
+    Проверка и удаление - под блокировкой имени (recipes.storage).
+    """
+    if not name:
+        return
+    with transaction.atomic():
+        lock_names([name])
+        if Recipe.objects.filter(image=name).exists():
+            return
+        delete_files([name, *variants])
+
+
+def delete_files(names) -> None:
+    files = storage()
+    for name in names:
+        files.delete(name)
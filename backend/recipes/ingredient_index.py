@@ -0,0 +1,272 @@
+"""
+Индекс префиксного поиска Ингредиентов (Ingredient) в памяти процесса.
+
+Справочник ингредиентов небольшой и меняется редко, поэтому автодополнение
+в форме рецепта обслуживается из отсортированного массива названий
+(поиск через bisect) без обращений к базе данных.
+
+Нечеткий поиск (с опечатками) - по сходству триграмм, как в pg_trgm:
+в PostgreSQL кандидатов находит GIN-индекс pg_trgm, в остальных СУБД -
+обратный индекс триграмм в памяти процесса. Триграммы строятся по
+названию с редуцированными безударными гласными ("о" как "а", "е" и "я"
+как "и"): самые частые опечатки ("малако") совпадают с названием
+("молоко") полностью, а не по двум триграммам из семи.
+
+Индекс перестраивается лениво при следующем обращении, если:
+- изменился файл-метка (его обновляют сигналы модели Ingredient
+  и команда load_ingredients, в том числе из другого процесса);
+- истек срок актуальности рейтинга популярности ингредиентов.
+"""
+import hashlib
+import heapq
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count
+
+from .models import Ingredient
+
+# Максимальный символ Unicode: верхняя граница диапазона префикса.
+_MAX_CHAR = chr(0x10FFFF)
+
+# Редукция гласных для нечеткого поиска. Выражение GIN-индекса
+# (миграция 0012_ingredient_reduced_trigram_index) должно совпадать
+# с REDUCED_SQL.
+_VOWELS_FROM, _VOWELS_TO = "оея", "аии"
+_REDUCED = str.maketrans(_VOWELS_FROM, _VOWELS_TO)
+REDUCED_SQL = f"translate(lower(name), '{_VOWELS_FROM}ё', '{_VOWELS_TO}и')"
+
+IngredientEntry = namedtuple(
+    "IngredientEntry", ("id", "name", "measurement_unit", "popularity")
+)
+
+
+def fold(value: str) -> str:
+    """
+    Приводит строку к виду для сравнения без учета регистра.
+    casefold() корректно обрабатывает кириллицу, "ё" приравнивается к "е".
+    """
+    return (
+        unicodedata.normalize("NFKC", value)
+        .casefold()
+        .replace("ё", "е")
+        .strip()
+    )
+
+
+def reduce_vowels(value: str) -> str:
+    """Сложенная строка с редуцированными безударными гласными."""
+    return fold(value).translate(_REDUCED)
+
+
+def trigrams(value: str) -> set:
+    """
+    Триграммы строки с редуцированными гласными по правилам pg_trgm:
+    каждое слово дополняется двумя пробелами в начале и одним в конце.
+    """
+    result = set()
+    for word in re.findall(r"\w+", reduce_vowels(value)):
+        word = f"  {word} "
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+def _stamp_path() -> str:
+    return os.path.join(settings.RUNTIME_DIR, "ingredient_index.stamp")
+
+
+def _read_stamp():
+    """Возвращает версию файла-метки (None, если метки еще нет)."""
+    try:
+        stat = os.stat(_stamp_path())
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def invalidate() -> None:
+    """
+    Помечает индексы всех процессов устаревшими.
+    Файл-метка заменяется атомарно, поэтому меняется его inode.
+    """
+    os.makedirs(settings.RUNTIME_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.RUNTIME_DIR)
+    with os.fdopen(fd, "w") as stamp_file:
+        stamp_file.write(str(time.time_ns()))
+    os.replace(tmp_path, _stamp_path())
+
+
+class IngredientIndex:
+    """
+    Отсортированный по ключу (сложенному названию) массив Ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (ключи, записи в порядке ключей, записи в порядке названий).
+        self._data = ([], [], [])
+        # Записи по id и обратный индекс триграмм:
+        # ({id: запись}, {триграмма: [id]}, {id: количество триграмм}).
+        self._trigrams = ({}, {}, {})
+        self._stamp = None
+        self._built_at = None
+        self.version = None
+
+    def _is_stale(self, stamp) -> bool:
+        if self._built_at is None or stamp != self._stamp:
+            return True
+        ttl = settings.INGREDIENT_INDEX["POPULARITY_TTL"]
+        return time.monotonic() - self._built_at > ttl
+
+    def _build(self, stamp) -> None:
+        rows = Ingredient.objects.annotate(
+            popularity=Count("recipe_ingredient")
+        ).values_list("id", "name", "measurement_unit", "popularity")
+        items = sorted(
+            (fold(row[1]), IngredientEntry(*row)) for row in rows
+        )
+        entries = [entry for _, entry in items]
+        self._data = (
+            [key for key, _ in items],
+            entries,
+            sorted(entries, key=lambda entry: (entry.name, entry.id)),
+        )
+        postings = defaultdict(list)
+        sizes = {}
+        for entry in entries:
+            entry_trigrams = trigrams(entry.name)
+            sizes[entry.id] = len(entry_trigrams)
+            for trigram in entry_trigrams:
+                postings[trigram].append(entry.id)
+        self._trigrams = (
+            {entry.id: entry for entry in entries},
+            dict(postings),
+            sizes,
+        )
+        self._stamp = stamp
+        self._built_at = time.monotonic()
+        # Одинаковые данные дают одну версию во всех процессах
+        self.version = hashlib.md5(repr(entries).encode()).hexdigest()
+
+    def refresh(self) -> None:
+        """Перестраивает индекс, если он устарел."""
+        stamp = _read_stamp()
+        if not self._is_stale(stamp):
+            return
+        with self._lock:
+            if self._is_stale(stamp):
+                self._build(stamp)
+
+    def all(self) -> list:
+        """Все Ингредиенты в порядке Ingredient.Meta.ordering."""
+        self.refresh()
+        return self._data[2]
+
+    def search(self, prefix: str, limit: int = None) -> list:
+        """
+        Ингредиенты, название которых начинается с prefix.
+        Сначала самые популярные в рецептах, затем по алфавиту.
+        """
+        self.refresh()
+        if limit is None:
+            limit = settings.INGREDIENT_INDEX["LIMIT"]
+        key = fold(prefix)
+        keys, entries, _ = self._data
+        start = bisect_left(keys, key)
+        stop = bisect_right(keys, key + _MAX_CHAR, lo=start)
+        return heapq.nsmallest(
+            limit,
+            entries[start:stop],
+            key=lambda entry: (-entry.popularity, entry.name, entry.id),
+        )
+
+    def fuzzy(self, query: str, limit: int = None) -> list:
+        """
+        Ингредиенты, похожие на query: сначала совпадения по началу
+        названия (как search), затем по убыванию сходства триграмм
+        не ниже INGREDIENT_INDEX["SIMILARITY"].
+        """
+        if limit is None:
+            limit = settings.INGREDIENT_INDEX["LIMIT"]
+        result = self.search(query, limit)
+        if len(result) >= limit:
+            return result
+        found = {entry.id for entry in result}
+        similar = (
+            entry
+            for entry in self.similar(query, limit + len(result))
+            if entry.id not in found
+        )
+        return result + list(similar)[:limit - len(result)]
+
+    def similar(self, query: str, limit: int) -> list:
+        """
+        Ингредиенты по убыванию сходства триграмм с query,
+        при равном сходстве - самые популярные.
+        """
+        self.refresh()
+        threshold = settings.INGREDIENT_INDEX["SIMILARITY"]
+        by_id, postings, sizes = self._trigrams
+        if connections[Ingredient.objects.db].vendor == "postgresql":
+            scores = _similar_postgresql(query, threshold, limit)
+        else:
+            query_trigrams = trigrams(query)
+            hits = Counter(
+                entry_id
+                for trigram in query_trigrams
+                for entry_id in postings.get(trigram, ())
+            )
+            scores = {}
+            for entry_id, common in hits.items():
+                score = common / (
+                    len(query_trigrams) + sizes[entry_id] - common
+                )
+                if score >= threshold:
+                    scores[entry_id] = score
+        return [
+            by_id[entry_id]
+            for entry_id in heapq.nsmallest(
+                limit,
+                (entry_id for entry_id in scores if entry_id in by_id),
+                key=lambda entry_id: (
+                    -scores[entry_id],
+                    -by_id[entry_id].popularity,
+                    by_id[entry_id].name,
+                ),
+            )
+        ]
+
+
+def _similar_postgresql(query: str, threshold: float, limit: int) -> dict:
+    """
+    Сходство названий Ингредиентов с query в PostgreSQL:
+    {id: сходство}. Оператор % использует GIN-индекс pg_trgm,
+    порог сходства задается для текущей транзакции.
+    """
+    connection = connections[Ingredient.objects.db]
+    query = reduce_vowels(query)
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+                (str(threshold),),
+            )
+            cursor.execute(
+                f"SELECT id, similarity({REDUCED_SQL}, %s) AS score "
+                f"FROM {Ingredient._meta.db_table} "
+                f"WHERE {REDUCED_SQL} %% %s "
+                f"ORDER BY score DESC, id LIMIT %s",
+                (query, query, limit),
+            )
+            return dict(cursor.fetchall())
+
+
+ingredient_index = IngredientIndex()
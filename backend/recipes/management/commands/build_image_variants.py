@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Формирование вариантов картинок (Recipe.image_variants)
+    для Рецептов, загруженных до появления обработки картинок.
+    """
+
+    help = "Формирование уменьшенных вариантов картинок Рецептов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help=(
+                "Сформировать и перезаписать файлы вариантов "
+                "для всех Рецептов."
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Количество картинок, обрабатываемых одновременно.",
+        )
+
+    def handle(self, *args, **options):
+        recipes = (
+            Recipe.objects.exclude(image="")
+            .only("id", "image", "image_variants")
+            .order_by("id")
+            .iterator()
+        )
+        force = options["force"]
+        pending = [
+            (recipe.id, recipe.image.name)
+            for recipe in recipes
+            if force or images.needs_processing(recipe)
+        ]
+        # С --force файлы вариантов каждой картинки перезаписываются
+        # один раз, до Рецептов с той же картинкой: они используют
+        # уже готовые варианты
+        first, repeated, names = [], [], set()
+        for recipe_id, name in pending:
+            if force and name not in names:
+                first.append((recipe_id, name, True))
+            else:
+                repeated.append((recipe_id, name, False))
+            names.add(name)
+        self.total, self.done = len(pending), 0
+        self.processed = self.failed = 0
+        for tasks in (first, repeated):
+            self.run(tasks, options["batch_size"])
+        self.stdout.write(
+            f"Сформированы варианты: {self.processed}, "
+            f"пропущено или с ошибкой: {self.failed}."
+        )
+        self.stdout.write(self.style.SUCCESS("Картинки обработаны."))
+
+    def run(self, tasks, batch_size):
+        for start in range(0, len(tasks), batch_size):
+            batch = tasks[start:start + batch_size]
+            # Обработка в том же ограниченном пуле, что и при загрузке
+            for done in images.executor.map(
+                lambda args: images.process_in_thread(*args), batch
+            ):
+                self.processed += done
+                self.failed += not done
+            self.done += len(batch)
+            self.stdout.write(f"Обработано {self.done} из {self.total}.")
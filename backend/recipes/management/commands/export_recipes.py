@@ -0,0 +1,116 @@
+import base64
+import json
+import mimetypes
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes import images
+from recipes.models import Recipe, RecipeIngredient, Tag
+
+
+def recipe_line(recipe, embed_images: bool) -> dict:
+    """Рецепт в виде строки NDJSON (формат import_recipes)."""
+    image = recipe.image.name or None
+    if image and embed_images:
+        with images.storage().open(image) as image_file:
+            content = base64.b64encode(image_file.read()).decode()
+        media_type = mimetypes.guess_type(image)[0] or "image/jpeg"
+        image = f"data:{media_type};base64,{content}"
+    return {
+        "author": {
+            "username": recipe.author.username,
+            "email": recipe.author.email,
+            "first_name": recipe.author.first_name,
+            "last_name": recipe.author.last_name,
+        },
+        "name": recipe.name,
+        "text": recipe.text,
+        "cooking_time": recipe.cooking_time,
+        "tags": [tag.slug for tag in recipe.tags.all()],
+        "ingredients": [
+            {
+                "name": item.ingredient.name,
+                "measurement_unit": item.ingredient.measurement_unit,
+                "amount": item.amount,
+            }
+            for item in recipe.recipe_ingredient.all()
+        ],
+        "image": image,
+    }
+
+
+class Command(BaseCommand):
+    """
+    Потоковая выгрузка Рецептов в NDJSON: одна строка - один Рецепт
+    с автором, slug тегов, названиями ингредиентов и картинкой.
+    Рецепты читаются блоками по id, память не зависит от их количества.
+    """
+
+    help = "Выгрузка Рецептов в NDJSON (загрузка - import_recipes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Файл NDJSON (по умолчанию - стандартный вывод).",
+        )
+        parser.add_argument(
+            "--embed-images",
+            action="store_true",
+            help="Картинки в base64 вместо путей в хранилище.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество Рецептов в одном запросе.",
+        )
+
+    def handle(self, *args, **options):
+        if options["output"] == "-":
+            self.export(sys.stdout, options)
+            return
+        with open(options["output"], "w", encoding="utf-8") as output:
+            self.export(output, options)
+
+    def export(self, output, options):
+        started = time.monotonic()
+        queryset = (
+            Recipe.objects.select_related("author")
+            .prefetch_related(
+                Prefetch("tags", queryset=Tag.objects.only("slug")),
+                Prefetch(
+                    "recipe_ingredient",
+                    queryset=RecipeIngredient.objects.select_related(
+                        "ingredient"
+                    ).order_by("id"),
+                ),
+            )
+            .order_by("id")
+        )
+        last_id, total = 0, 0
+        while True:
+            # Блок по ключу: prefetch выполняется на каждый блок
+            batch = list(
+                queryset.filter(id__gt=last_id)[:options["batch_size"]]
+            )
+            if not batch:
+                break
+            for recipe in batch:
+                output.write(
+                    json.dumps(
+                        recipe_line(recipe, options["embed_images"]),
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+            last_id = batch[-1].id
+            total += len(batch)
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f"Выгружено Рецептов: {total} "
+            f"({total / max(elapsed, 1e-6):.0f} в секунду)."
+        )
@@ -0,0 +1,409 @@
+import csv
+import os
+import random
+import time
+from io import StringIO
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from recipes import generations
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import CustomUser, Subscribtion
+
+DATA_PATH = os.path.join(settings.BASE_DIR, "../data")
+
+# Теги, создаваемые в пустой базе: (название, цвет, slug)
+DEFAULT_TAGS = (
+    ("Завтрак", "#E26C2D", "breakfast"),
+    ("Обед", "#49B64E", "lunch"),
+    ("Ужин", "#8775D2", "dinner"),
+)
+
+# Слова описаний, кроме названий ингредиентов
+WORDS = (
+    "варить жарить запекать тушить нарезать смешать добавить посолить "
+    "поперчить охладить подавать горячим холодным духовке сковороде "
+    "кастрюле минут часа быстро медленно аккуратно домашний праздничный"
+).split()
+
+# Экранирование текстового формата COPY
+COPY_ESCAPES = str.maketrans(
+    {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+)
+
+
+class Zipf:
+    """
+    Выбор элементов с вероятностью, обратной степени ранга (закон Ципфа).
+    Ранги назначаются случайной перестановкой элементов: популярность
+    не зависит от порядка id.
+    """
+
+    def __init__(self, items, exponent, generator):
+        self.items = list(items)
+        generator.shuffle(self.items)
+        self.cum_weights = list(
+            accumulate(
+                rank ** -exponent for rank in range(1, len(self.items) + 1)
+            )
+        )
+        self.generator = generator
+
+    def choices(self, k):
+        return self.generator.choices(
+            self.items, cum_weights=self.cum_weights, k=k
+        )
+
+    def sample(self, k):
+        """k различных элементов (не больше половины всех)."""
+        k = min(k, len(self.items) // 2)
+        chosen = set()
+        while len(chosen) < k:
+            chosen.update(self.choices(k - len(chosen)))
+        return chosen
+
+
+def copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    return str(value).translate(COPY_ESCAPES)
+
+
+class Command(BaseCommand):
+    """
+    Синтетические данные для нагрузочных замеров: Пользователи,
+    Рецепты с тегами и ингредиентами из каталога, Избранное, Списки
+    покупок и Подписки. Популярность Рецептов, авторов и ингредиентов
+    распределена по закону Ципфа; при одинаковом seed на одной и той же
+    базе данные совпадают. PostgreSQL загружает строки через COPY,
+    остальные СУБД - пакетными INSERT (executemany). Счетчики и Списки
+    покупок пересчитываются командами reconcile_counters
+    и rebuild_shopping_lists.
+    """
+
+    help = "Генерация синтетических данных для нагрузочных замеров."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=10000,
+            help="Количество Пользователей.",
+        )
+        parser.add_argument(
+            "--recipes-per-author",
+            type=float,
+            default=5,
+            help="Среднее количество Рецептов на Пользователя.",
+        )
+        parser.add_argument(
+            "--ingredients-per-recipe",
+            type=int,
+            default=8,
+            help="Среднее количество ингредиентов Рецепта.",
+        )
+        parser.add_argument(
+            "--favorites",
+            type=float,
+            default=50,
+            help="Среднее количество Рецептов в Избранном Пользователя.",
+        )
+        parser.add_argument(
+            "--carts",
+            type=float,
+            default=5,
+            help="Среднее количество Рецептов в Списке покупок.",
+        )
+        parser.add_argument(
+            "--follows",
+            type=float,
+            default=20,
+            help="Среднее количество Подписок Пользователя.",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Показатель степени распределения популярности.",
+        )
+        parser.add_argument(
+            "--ingredients-path",
+            default=os.path.join(DATA_PATH, "ingredients.csv"),
+            help="Каталог Ингредиентов (загружается load_ingredients).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Количество строк в одном COPY или INSERT.",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options["users"] < 2:
+            raise CommandError("--users должен быть не меньше 2.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным.")
+        self.options = options
+        self.generator = random.Random(options["seed"])
+        call_command(
+            "load_ingredients",
+            path=options["ingredients_path"],
+            stdout=StringIO(),
+        )
+        with open(options["ingredients_path"], encoding="utf-8") as data:
+            catalog = {
+                (row[0].strip(), row[1].strip()) for row in csv.reader(data)
+                if row
+            }
+        ingredients = sorted(
+            (name, ingredient_id)
+            for ingredient_id, name, measurement_unit in (
+                Ingredient.objects.values_list(
+                    "id", "name", "measurement_unit"
+                )
+            )
+            if (name, measurement_unit) in catalog
+        )
+        if not ingredients:
+            raise CommandError("Каталог Ингредиентов пуст.")
+
+        self.stdout.write(f"СУБД: {connection.vendor}.")
+        self.total_rows, self.total_time = 0, 0.0
+        with transaction.atomic():
+            tag_ids = self.get_tags()
+            user_ids = self.create_users()
+            authors = Zipf(user_ids, options["zipf"], self.generator)
+            recipe_ids = self.create_recipes(authors, ingredients)
+            self.create_compositions(
+                recipe_ids,
+                tag_ids,
+                Zipf(
+                    [ingredient_id for _, ingredient_id in ingredients],
+                    options["zipf"],
+                    self.generator,
+                ),
+            )
+            recipes = Zipf(recipe_ids, options["zipf"], self.generator)
+            for model, mean in (
+                (Favorite, options["favorites"]),
+                (ShoppingCart, options["carts"]),
+            ):
+                self.load(
+                    model,
+                    ("user_id", "recipe_id"),
+                    (
+                        (user_id, recipe_id)
+                        for user_id in user_ids
+                        for recipe_id in recipes.sample(self.count(mean))
+                    ),
+                )
+            self.load(
+                Subscribtion,
+                ("user_id", "author_id"),
+                (
+                    (user_id, author_id)
+                    for user_id in user_ids
+                    for author_id in authors.sample(
+                        self.count(options["follows"])
+                    )
+                    if author_id != user_id
+                ),
+            )
+            if connection.vendor == "postgresql":
+                self.reset_sequences()
+        self.stdout.write(
+            f"Всего строк: {self.total_rows} "
+            f"({self.total_rows / max(self.total_time, 1e-6):.0f} строк/с)."
+        )
+
+        started = time.monotonic()
+        # Строки вставлены без сигналов: счетчики и Списки покупок
+        # пересчитываются по данным, кэш ответов сбрасывается
+        call_command("reconcile_counters", stdout=StringIO())
+        call_command("rebuild_shopping_lists", stdout=StringIO())
+        generations.bump(
+            generations.RECIPES, generations.TAGS, generations.USERS
+        )
+        self.stdout.write(
+            f"Счетчики и Списки покупок пересчитаны "
+            f"({time.monotonic() - started:.1f} с)."
+        )
+        self.stdout.write(self.style.SUCCESS("Данные сгенерированы."))
+
+    def count(self, mean):
+        """Количество с экспоненциальным распределением и средним mean."""
+        return int(self.generator.expovariate(1 / mean)) if mean > 0 else 0
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by("id").values_list("id", flat=True))
+
+    def create_users(self):
+        # id назначаются явно: связанные строки не ждут их из базы
+        first_id = self.next_id(CustomUser)
+        user_ids = range(first_id, first_id + self.options["users"])
+        password = make_password(None)
+        self.load(
+            CustomUser,
+            ("id", "username", "email", "first_name", "last_name", "password"),
+            (
+                (
+                    user_id,
+                    f"user{user_id}",
+                    f"user{user_id}@foodgram.local",
+                    "Имя",
+                    "Фамилия",
+                    password,
+                )
+                for user_id in user_ids
+            ),
+        )
+        return list(user_ids)
+
+    def create_recipes(self, authors, ingredients):
+        first_id = self.next_id(Recipe)
+        recipe_ids = range(
+            first_id,
+            first_id
+            + round(self.options["users"] * self.options["recipes_per_author"]),
+        )
+        names = [name for name, _ in ingredients]
+        generator = self.generator
+        self.load(
+            Recipe,
+            ("id", "author_id", "name", "text", "cooking_time"),
+            (
+                (
+                    recipe_id,
+                    author_id,
+                    " ".join(generator.sample(names, 2))[:200],
+                    " ".join(
+                        generator.sample(names, 5) + generator.sample(WORDS, 10)
+                    ),
+                    generator.randint(1, 180),
+                )
+                for recipe_id, author_id in zip(
+                    recipe_ids, authors.choices(len(recipe_ids))
+                )
+            ),
+        )
+        return list(recipe_ids)
+
+    def create_compositions(self, recipe_ids, tag_ids, ingredients):
+        generator = self.generator
+        recipe_tags = Recipe.tags.through
+        self.load(
+            recipe_tags,
+            ("recipe_id", "tag_id"),
+            (
+                (recipe_id, tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in generator.sample(
+                    tag_ids, generator.randint(1, min(3, len(tag_ids)))
+                )
+            ),
+        )
+        mean = self.options["ingredients_per_recipe"]
+        self.load(
+            RecipeIngredient,
+            ("recipe_id", "ingredient_id", "amount"),
+            (
+                (recipe_id, ingredient_id, generator.randint(1, 1000))
+                for recipe_id in recipe_ids
+                for ingredient_id in ingredients.sample(
+                    generator.randint(1, max(1, 2 * mean - 1))
+                )
+            ),
+        )
+
+    def load(self, model, columns, rows):
+        """
+        Записывает строки (значения столбцов columns) блоками
+        по batch_size, выводит скорость. Строки не проходят через
+        объекты моделей: остальные столбцы получают значения
+        по умолчанию, подготовленные один раз.
+        """
+        template = model()
+        defaults = {
+            field.column: field.get_db_prep_save(
+                field.pre_save(template, True), connection
+            )
+            for field in model._meta.concrete_fields
+            if not field.primary_key and field.column not in columns
+        }
+        columns = (*columns, *defaults)
+        defaults = tuple(defaults.values())
+        rows = (tuple(row) + defaults for row in rows)
+        table = model._meta.db_table
+        started = time.monotonic()
+        count = 0
+        while True:
+            batch = list(islice(rows, self.options["batch_size"]))
+            if not batch:
+                break
+            if connection.vendor == "postgresql":
+                self.copy(table, columns, batch)
+            else:
+                self.insert(table, columns, batch)
+            count += len(batch)
+        elapsed = time.monotonic() - started
+        self.total_rows += count
+        self.total_time += elapsed
+        self.stdout.write(
+            f"{table}: {count} строк за {elapsed:.1f} с "
+            f"({count / max(elapsed, 1e-6):.0f} строк/с)."
+        )
+
+    def copy(self, table, columns, batch):
+        quote_name = connection.ops.quote_name
+        buffer = StringIO()
+        for row in batch:
+            buffer.write("\t".join(map(copy_value, row)))
+            buffer.write("\n")
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {quote_name(table)} "
+                f"({', '.join(map(quote_name, columns))}) FROM STDIN",
+                buffer,
+            )
+
+    def insert(self, table, columns, batch):
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {quote_name(table)} "
+                f"({', '.join(map(quote_name, columns))}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))})",
+                batch,
+            )
+
+    def reset_sequences(self):
+        """Последовательности id после вставки с явными id."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), (CustomUser, Recipe)
+            ):
+                cursor.execute(sql)
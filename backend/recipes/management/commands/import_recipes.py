@@ -0,0 +1,410 @@
+import base64
+import binascii
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from PIL import Image
+
+from recipes import counters, generations, images, storage
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import CustomUser
+
+# Расширение файла по формату Pillow
+IMAGE_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+
+# Поля строки импорта (формат export_recipes): поле -> тип
+RECORD_FIELDS = {
+    "author": dict,
+    "name": str,
+    "text": str,
+    "cooking_time": int,
+    "tags": list,
+    "ingredients": list,
+}
+AUTHOR_FIELDS = ("username", "email", "first_name", "last_name")
+INGREDIENT_FIELDS = {"name": str, "measurement_unit": str, "amount": int}
+# Ограничения моделей: строка, нарушающая их, прервала бы вставку блока
+NAME_LENGTH = Recipe._meta.get_field("name").max_length
+AUTHOR_LENGTHS = {
+    field: CustomUser._meta.get_field(field).max_length
+    for field in AUTHOR_FIELDS
+}
+COOKING_TIME_RANGE = (1, 32767)
+AMOUNT_RANGE = (1, 1000)
+
+
+def _type_error(fields, value, prefix=""):
+    """Первое отсутствующее поле или поле неверного типа в value."""
+    for field, field_type in fields.items():
+        if field not in value:
+            return f"нет поля {prefix}{field}"
+        if not isinstance(value[field], field_type) or isinstance(
+            value[field], bool
+        ):
+            return f"неверный тип поля {prefix}{field}"
+    return None
+
+
+def _range_error(field, value, limits):
+    """Ошибка значения value вне диапазона limits."""
+    low, high = limits
+    if not low <= value <= high:
+        return f"{field} - от {low} до {high}"
+    return None
+
+
+def validate_record(item):
+    """
+    Ошибка структуры или значений строки импорта (None - строка
+    корректна). Значения проверяются по ограничениям моделей.
+    """
+    if not isinstance(item, dict):
+        return "строка - не объект JSON"
+    error = _type_error(RECORD_FIELDS, item)
+    if error:
+        return error
+    author = item["author"]
+    if not isinstance(author.get("username"), str):
+        return "нет поля author.username"
+    if set(author) - set(AUTHOR_FIELDS) or not all(
+        isinstance(value, str) for value in author.values()
+    ):
+        return f"поля author - строки из {', '.join(AUTHOR_FIELDS)}"
+    for field, value in author.items():
+        if len(value) > AUTHOR_LENGTHS[field]:
+            return f"author.{field} длиннее {AUTHOR_LENGTHS[field]} символов"
+    if not item["name"] or len(item["name"]) > NAME_LENGTH:
+        return f"name - от 1 до {NAME_LENGTH} символов"
+    error = _range_error(
+        "cooking_time", item["cooking_time"], COOKING_TIME_RANGE
+    )
+    if error:
+        return error
+    if not all(isinstance(slug, str) for slug in item["tags"]):
+        return "tags - список slug"
+    for ingredient in item["ingredients"]:
+        if not isinstance(ingredient, dict):
+            return "ingredients - список объектов"
+        error = _type_error(
+            INGREDIENT_FIELDS, ingredient, "ingredients."
+        ) or _range_error(
+            "ingredients.amount", ingredient["amount"], AMOUNT_RANGE
+        )
+        if error:
+            return error
+    if not isinstance(item.get("image") or "", str):
+        return "неверный тип поля image"
+    return None
+
+
+def store_image(value, images_root):
+    """
+    Проверяет и сохраняет картинку строки импорта (в процессе пула).
+    value - base64 (data:image/...;base64,...) или путь относительно
+    images_root. Возвращает (имя файла в хранилище, ошибка).
+    """
+    if not value:
+        return None, None
+    try:
+        if value.startswith("data:"):
+            content = base64.b64decode(value.split(";base64,", 1)[1])
+        else:
+            path = os.path.normpath(os.path.join(images_root, value))
+            if not path.startswith(os.path.normpath(images_root) + os.sep):
+                return None, f"Путь вне каталога картинок: {value}"
+            with open(path, "rb") as image_file:
+                content = image_file.read()
+        with Image.open(BytesIO(content)) as image:
+            image_format = image.format
+            image.verify()
+    except (IndexError, binascii.Error, OSError, SyntaxError) as error:
+        return None, f"Картинка не загружена: {error}"
+    extension = IMAGE_EXTENSIONS.get(image_format)
+    if extension is None:
+        return None, f"Неподдерживаемый формат картинки: {image_format}"
+    # Хранилище именует файлы по содержимому: повторы не дублируются
+    name = images.storage().save(
+        f"recipes/img/image.{extension}", ContentFile(content)
+    )
+    return name, None
+
+
+class Command(BaseCommand):
+    """
+    Потоковая загрузка Рецептов из NDJSON (формат export_recipes).
+    Строки читаются блоками: Рецепты, их состав и теги вставляются
+    через bulk_create, теги и ингредиенты находятся по словарям
+    в памяти, картинки проверяются и сохраняются в пуле процессов.
+    Рецепты, уже существующие у автора (по названию), пропускаются.
+    """
+
+    help = "Загрузка Рецептов из NDJSON (выгрузка - export_recipes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--input",
+            default="-",
+            help="Файл NDJSON (по умолчанию - стандартный ввод).",
+        )
+        parser.add_argument(
+            "--images-root",
+            default=settings.MEDIA_ROOT,
+            help="Каталог, относительно которого указаны пути картинок.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество Рецептов в одной транзакции.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Количество процессов обработки картинок.",
+        )
+        parser.add_argument(
+            "--create-authors",
+            action="store_true",
+            help="Создавать отсутствующих авторов (без пароля).",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным.")
+        self.options = options
+        self.tags = dict(Tag.objects.values_list("slug", "id"))
+        self.ingredients = {
+            (name, measurement_unit): ingredient_id
+            for ingredient_id, name, measurement_unit in (
+                Ingredient.objects.values_list(
+                    "id", "name", "measurement_unit"
+                )
+            )
+        }
+        self.stats = Counter()
+        self.started = time.monotonic()
+        # Процессы пула не работают с базой: соединение закрывается
+        # до их запуска, чтобы не наследовать его
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            self.pool = pool
+            if options["input"] == "-":
+                self.load(sys.stdin)
+            else:
+                with open(options["input"], encoding="utf-8") as data_file:
+                    self.load(data_file)
+        # bulk_create не вызывает сигналы: кэш ответов - вручную
+        generations.bump(generations.RECIPES, generations.USERS)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"Строк: {self.stats['lines']}, "
+            f"добавлено: {self.stats['created']} "
+            f"({self.stats['created'] / max(elapsed, 1e-6):.0f} в секунду), "
+            f"уже в базе: {self.stats['existing']}, "
+            f"с ошибками: {self.stats['errors']}."
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Рецепты загружены. Варианты картинок формирует "
+                "команда build_image_variants."
+            )
+        )
+
+    def load(self, data_file):
+        batch = []
+        for number, line in enumerate(data_file, 1):
+            if not line.strip():
+                continue
+            self.stats["lines"] += 1
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as error:
+                self.error(number, f"неверный JSON: {error}")
+                continue
+            error = validate_record(item)
+            if error:
+                self.error(number, error)
+                continue
+            batch.append((number, item))
+            if len(batch) >= self.options["batch_size"]:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+    def error(self, number, message):
+        self.stats["errors"] += 1
+        self.stderr.write(f"Строка {number}: {message}")
+
+    def resolve(self, number, item):
+        """
+        Теги и ингредиенты строки: (id тегов, {id ингредиента: количество})
+        или None, если строку загрузить нельзя.
+        """
+        try:
+            tag_ids = {self.tags[slug] for slug in item["tags"]}
+        except KeyError as error:
+            self.error(number, f"неизвестный тег {error}")
+            return None
+        amounts = {}
+        for ingredient in item["ingredients"]:
+            key = (ingredient["name"], ingredient["measurement_unit"])
+            if key not in self.ingredients:
+                self.error(number, f"неизвестный ингредиент {key}")
+                return None
+            amounts[self.ingredients[key]] = ingredient["amount"]
+        if not tag_ids or not amounts:
+            self.error(number, "нет тегов или ингредиентов")
+            return None
+        return tag_ids, amounts
+
+    def get_authors(self, batch):
+        """Авторы блока: {username: id}."""
+        usernames = {item["author"]["username"] for _, item in batch}
+        authors = dict(
+            CustomUser.objects.filter(username__in=usernames).values_list(
+                "username", "id"
+            )
+        )
+        missing = usernames - authors.keys()
+        if missing and self.options["create_authors"]:
+            new_authors = {}
+            for _, item in batch:
+                author = item["author"]
+                if author["username"] in missing:
+                    user = CustomUser(**author)
+                    user.set_unusable_password()
+                    new_authors[author["username"]] = user
+            CustomUser.objects.bulk_create(new_authors.values())
+            authors.update(
+                CustomUser.objects.filter(username__in=missing).values_list(
+                    "username", "id"
+                )
+            )
+        return authors
+
+    def import_batch(self, batch):
+        authors = self.get_authors(batch)
+        existing = set(
+            Recipe.objects.filter(
+                author_id__in=authors.values(),
+                name__in={item["name"] for _, item in batch},
+            ).values_list("author_id", "name")
+        )
+        rows = []
+        for number, item in batch:
+            author_id = authors.get(item["author"]["username"])
+            if author_id is None:
+                self.error(number, "автор не найден")
+                continue
+            if (author_id, item["name"]) in existing:
+                self.stats["existing"] += 1
+                continue
+            existing.add((author_id, item["name"]))
+            resolved = self.resolve(number, item)
+            if resolved is not None:
+                rows.append((number, item, author_id, *resolved))
+
+        # Картинки проверяются и сохраняются параллельно
+        stored = self.pool.map(
+            store_image,
+            [item.get("image") or "" for _, item, *_ in rows],
+            [self.options["images_root"]] * len(rows),
+            chunksize=max(1, len(rows) // (4 * self.options["workers"])),
+        )
+        recipes, compositions, sources = [], [], []
+        for row, (image, error) in zip(rows, stored):
+            number, item, author_id, tag_ids, amounts = row
+            if error:
+                self.error(number, error)
+                continue
+            recipes.append(
+                Recipe(
+                    author_id=author_id,
+                    name=item["name"],
+                    text=item["text"],
+                    cooking_time=item["cooking_time"],
+                    image=image or "",
+                )
+            )
+            compositions.append((tag_ids, amounts))
+            sources.append(item.get("image") or "")
+        try:
+            with transaction.atomic():
+                self.claim_images(recipes, sources)
+                self.insert(recipes, compositions)
+        except Exception:
+            # Рецепты блока не вставлены: картинки, сохраненные для них
+            # и не используемые другими Рецептами, удаляются
+            for name in {recipe.image.name for recipe in recipes}:
+                images.release(name, [])
+            raise
+        self.stats["created"] += len(recipes)
+        elapsed = time.monotonic() - self.started
+        self.stderr.write(
+            f"Загружено {self.stats['created']} Рецептов "
+            f"({self.stats['created'] / max(elapsed, 1e-6):.0f} в секунду)."
+        )
+
+    def claim_images(self, recipes, sources):
+        """
+        Картинки сохранены в пуле процессов вне транзакции: их имена
+        блокируются до вставки ссылок, а файлы, удаленные тем временем
+        (recipes.images.release), записываются заново.
+        """
+        names = [recipe.image.name for recipe in recipes if recipe.image]
+        storage.lock_names(names)
+        files = images.storage()
+        for recipe, value in zip(recipes, sources):
+            if recipe.image and not files.exists(recipe.image.name):
+                store_image(value, self.options["images_root"])
+
+    def insert(self, recipes, compositions):
+        batch_size = self.options["batch_size"]
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # СУБД не возвращает id вставленных строк (SQLite): id
+            # назначаются явно. Пустой UPDATE блокирует запись в базу
+            # до конца транзакции: другие процессы не вставят Рецепты
+            # между чтением Max(id) и вставкой
+            Recipe.objects.filter(pk=None).update(image="")
+            last_id = Recipe.objects.aggregate(last=Max("id"))["last"] or 0
+            for offset, recipe in enumerate(recipes, 1):
+                recipe.id = last_id + offset
+        Recipe.objects.bulk_create(recipes, batch_size=batch_size)
+        recipe_tags = Recipe.tags.through
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                )
+                for recipe, (_, amounts) in zip(recipes, compositions)
+                for ingredient_id, amount in amounts.items()
+            ),
+            batch_size=batch_size,
+        )
+        recipe_tags.objects.bulk_create(
+            (
+                recipe_tags(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe, (tag_ids, _) in zip(recipes, compositions)
+                for tag_id in tag_ids
+            ),
+            batch_size=batch_size,
+        )
+        # bulk_create не вызывает сигналы: счетчики авторов вручную
+        for author_id, total in Counter(
+            recipe.author_id for recipe in recipes
+        ).items():
+            counters.increment(CustomUser, author_id, "recipes_count", total)
@@ -1,27 +1,242 @@
+import csv
+import hashlib
 import json
 import os
+import re
+import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from recipes.models import Ingredient
+from recipes import ingredient_index
+from recipes.models import Ingredient, LoadedFile
 
 DATA_PATH = os.path.join(settings.BASE_DIR, "../data")
 
+# Размер блока чтения файла (символы)
+CHUNK_SIZE = 64 * 1024
+
+# Пробелы и разделители между элементами JSON-массива
+JSON_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def iter_json(data_file):
+    """
+    Потоковый разбор JSON-массива объектов без загрузки файла целиком:
+    (номер элемента, элемент).
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos = "", 0
+    started = False
+    number = 0
+    while True:
+        pos = JSON_SEPARATOR.match(buffer, pos).end()
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise CommandError("Ожидается JSON-массив.")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                pass
+            else:
+                number += 1
+                yield number, item
+                continue
+        chunk = data_file.read(CHUNK_SIZE)
+        if not chunk:
+            raise CommandError("Неожиданный конец JSON-файла.")
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def iter_csv(data_file):
+    """
+    Разбор CSV-файла со строками вида: название,единица измерения -
+    (номер строки, запись). Пустые строки пропускаются, в записи
+    неполной строки нет недостающих полей.
+    """
+    reader = csv.reader(data_file)
+    for row in reader:
+        if any(value.strip() for value in row):
+            yield reader.line_num, dict(
+                zip(("name", "measurement_unit"), row)
+            )
+
+
+def ingredient_key(item):
+    """
+    (название, единица измерения) записи файла
+    или None, если запись неполная.
+    """
+    if not isinstance(item, dict):
+        return None
+    name = item.get("name")
+    unit = item.get("measurement_unit")
+    if not isinstance(name, str) or not isinstance(unit, str):
+        return None
+    key = (name.strip(), unit.strip())
+    return key if all(key) else None
+
+
+READERS = {
+    ".json": iter_json,
+    ".csv": iter_csv,
+}
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as data_file:
+        for block in iter(lambda: data_file.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 
 class Command(BaseCommand):
-    """Импорте данных Ингредиентов из json."""
+    """
+    Импорт данных Ингредиентов из json или csv.
+    Загружаются только отсутствующие в базе пары
+    (название, единица измерения), повторный запуск ничего не меняет.
+    Неполные записи пропускаются с указанием номера строки (элемента).
+    Контрольная сумма загруженного файла хранится в базе (LoadedFile).
+    """
+
+    # Сколько пропущенных записей перечислять
+    REPORTED_INVALID = 20
+
+    help = "Загрузка Ингредиентов из data/ingredients.json (или .csv)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=os.path.join(DATA_PATH, "ingredients.json"),
+            help="Файл с данными (.json или .csv).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество строк в одном INSERT.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только подсчитать изменения, ничего не записывая.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Загружать, даже если файл не изменился.",
+        )
 
     def handle(self, *args, **options):
+        path = options["path"]
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError("Поддерживаются только файлы .json и .csv.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным.")
+
+        name = os.path.basename(path)
+        checksum = file_checksum(path)
+        if not options["force"] and self._is_loaded(name, checksum):
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Файл {path} не изменился с прошлой загрузки."
+                )
+            )
+            return
+
         self.stdout.write(
             self.style.WARNING("Загрузка данных из файла начата...")
         )
-        with open(
-            os.path.join(DATA_PATH, "ingredients.json"), encoding="utf-8"
-        ) as data_file:
-            data = json.loads(data_file.read())
-            for item in data:
-                Ingredient.objects.get_or_create(**item)
+        started = time.monotonic()
+        total = duplicates = skipped = 0
+        invalid = []
+        seen = set()
+        new = []
+        with transaction.atomic():
+            existing = set(
+                Ingredient.objects.values_list("name", "measurement_unit")
+            )
+            with open(path, encoding="utf-8") as data_file:
+                for number, item in reader(data_file):
+                    total += 1
+                    key = ingredient_key(item)
+                    if key is None:
+                        invalid.append(number)
+                        continue
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(key)
+                    if key in existing:
+                        skipped += 1
+                        continue
+                    new.append(
+                        Ingredient(name=key[0], measurement_unit=key[1])
+                    )
+            if not options["dry_run"]:
+                Ingredient.objects.bulk_create(
+                    new, batch_size=options["batch_size"]
+                )
+        elapsed = time.monotonic() - started
+
+        if not options["dry_run"]:
+            if new:
+                ingredient_index.invalidate()
+            self._save_checksum(name, checksum)
+        self.stdout.write(
+            f"Строк: {total} ({total / max(elapsed, 1e-6):.0f} строк/с), "
+            f"добавлено: {len(new)}, уже в базе: {skipped}, "
+            f"дубликатов в файле: {duplicates}, "
+            f"пропущено неполных: {len(invalid)}."
+        )
+        if invalid:
+            numbers = ", ".join(
+                map(str, invalid[:self.REPORTED_INVALID])
+            )
+            more = len(invalid) > self.REPORTED_INVALID
+            self.stderr.write(
+                self.style.WARNING(
+                    f"Неполные записи (нет названия или единицы "
+                    f"измерения), номера: {numbers}{' ...' if more else ''}"
+                )
+            )
+        if options["dry_run"]:
+            self.stdout.write(
+                self.style.WARNING("Пробный запуск: изменения не записаны.")
+            )
+            return
         self.stdout.write(
-            self.style.SUCCESS(f"Данные из файла {data_file.name} загружены.")
+            self.style.SUCCESS(f"Данные из файла {path} загружены.")
+        )
+
+    @staticmethod
+    def _is_loaded(name, checksum):
+        """
+        Файл уже загружен: контрольная сумма совпадает с сохраненной,
+        а количество Ингредиентов в базе не изменилось.
+        """
+        loaded = LoadedFile.objects.filter(name=name).first()
+        return (
+            loaded is not None
+            and loaded.checksum == checksum
+            and loaded.ingredients_count == Ingredient.objects.count()
+        )
+
+    @staticmethod
+    def _save_checksum(name, checksum):
+        LoadedFile.objects.update_or_create(
+            name=name,
+            defaults={
+                "checksum": checksum,
+                "ingredients_count": Ingredient.objects.count(),
+            },
         )
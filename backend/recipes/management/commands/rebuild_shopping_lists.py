@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes import shopping_list
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+class Command(BaseCommand):
+    """
+    Проверка и пересчет сумм Списков покупок (ShoppingListItem)
+    по данным ShoppingCart.
+    """
+
+    help = "Проверка и пересчет Списков покупок (ShoppingListItem)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только проверить, ничего не изменяя.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество пользователей в одной проверке.",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(ShoppingCart.objects.values_list("user_id", flat=True))
+            | set(ShoppingListItem.objects.values_list("user_id", flat=True))
+        )
+        batch_size = options["batch_size"]
+        drifted = []
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            expected = shopping_list.expected_items(batch)
+            stored = shopping_list.stored_items(batch)
+            drifted.extend(
+                sorted(
+                    {
+                        user_id
+                        for user_id, ingredient_id in expected.keys()
+                        | stored.keys()
+                        if expected.get((user_id, ingredient_id))
+                        != stored.get((user_id, ingredient_id))
+                    }
+                )
+            )
+        self.stdout.write(
+            f"Проверено пользователей: {len(user_ids)}, "
+            f"с расхождениями: {len(drifted)}."
+        )
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Списки покупок в порядке."))
+            return
+        if options["check"]:
+            raise CommandError("Списки покупок расходятся с ShoppingCart.")
+        for start in range(0, len(drifted), batch_size):
+            with transaction.atomic():
+                shopping_list.rebuild(drifted[start:start + batch_size])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Списки покупок пересчитаны: {len(drifted)} пользователей."
+            )
+        )
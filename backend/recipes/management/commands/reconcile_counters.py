@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    """
+    Пересчет счетчиков Рецептов (favorites_count, in_carts_count)
+    и Пользователей (recipes_count, followers_count).
+    """
+
+    help = "Исправление расхождений счетчиков избранного, корзин и подписок."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только проверить, ничего не изменяя.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile(apps, check=options["check"])
+        for counter, count in drift.items():
+            self.stdout.write(f"{counter}: расхождений {count}")
+        if not any(drift.values()):
+            self.stdout.write(self.style.SUCCESS("Счетчики в порядке."))
+        elif options["check"]:
+            raise CommandError("Счетчики расходятся с данными.")
+        else:
+            self.stdout.write(self.style.SUCCESS("Счетчики исправлены."))
@@ -0,0 +1,68 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes import generations, images
+from recipes.models import Recipe
+
+# Имя файла в хранилище с адресацией по содержимому
+CONTENT_NAME = re.compile(r"/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$")
+
+
+class Command(BaseCommand):
+    """
+    Перенос картинок Рецептов, загруженных до появления хранилища
+    с адресацией по содержимому (recipes.storage): файлы получают
+    имена по sha256, одинаковые картинки объединяются.
+    """
+
+    help = "Переименование картинок Рецептов по их содержимому."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только подсчитать картинки, ничего не изменяя.",
+        )
+
+    def handle(self, *args, **options):
+        files = images.storage()
+        recipes = [
+            recipe
+            for recipe in Recipe.objects.exclude(image="")
+            .only("id", "image", "image_variants")
+            .order_by("id")
+            .iterator()
+            if not CONTENT_NAME.search(recipe.image.name)
+        ]
+        self.stdout.write(f"Картинок со старыми именами: {len(recipes)}.")
+        if options["dry_run"]:
+            return
+        renamed = 0
+        for recipe in recipes:
+            name = recipe.image.name
+            # Новое имя и ссылка на него - в одной транзакции
+            # (блокировка имени в recipes.storage)
+            with transaction.atomic(), files.open(name) as image_file:
+                new_name = files.save(name, image_file)
+                renamed += Recipe.objects.filter(
+                    pk=recipe.pk, image=name
+                ).update(
+                    image=new_name,
+                    image_variants={},
+                    updated_at=timezone.now(),
+                )
+                # update() не отправляет сигналов: кэш ответов и тел
+                # Рецептов ссылается на прежнее имя
+                generations.bump(generations.RECIPES)
+            images.release(
+                name, images.variant_names(recipe.image_variants)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Переименовано картинок: {renamed}. Для новых имен "
+                "сформируйте варианты командой build_image_variants."
+            )
+        )
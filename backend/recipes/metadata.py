@@ -0,0 +1,147 @@
+"""
+Удаление метаданных из загруженных картинок без перекодирования.
+
+Загруженный файл хранится как оригинал (recipes.storage), а его
+обработка (recipes.images) выполняется позже: до сохранения из файла
+удаляются EXIF (координаты, камера, время съемки, миниатюры), XMP,
+IPTC и текстовые комментарии. Сжатые данные картинки копируются как
+есть. Сохраняется только ориентация (EXIF Orientation): по ней
+recipes.images поворачивает картинку.
+
+Поддерживаются JPEG, PNG и WebP; другие форматы не изменяются.
+"""
+import struct
+import zlib
+from io import BytesIO
+
+from PIL import Image, UnidentifiedImageError
+
+ORIENTATION = 0x0112
+
+JPEG_SOI = b"\xff\xd8"
+# Сегменты JPEG с метаданными: APP1 (EXIF, XMP), APP13 (IPTC), COM
+JPEG_METADATA = {0xE1, 0xED, 0xFE}
+# Маркеры JPEG без длины
+JPEG_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+JPEG_SOS = 0xDA
+EXIF_HEADER = b"Exif\x00\x00"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_METADATA = {b"eXIf", b"tEXt", b"zTXt", b"iTXt", b"tIME"}
+
+WEBP_METADATA = {b"EXIF", b"XMP "}
+# Флаги заголовка VP8X: есть EXIF, есть XMP
+WEBP_EXIF_FLAG, WEBP_XMP_FLAG = 0x08, 0x04
+
+
+def orientation_exif(data: bytes) -> bytes:
+    """
+    EXIF только с ориентацией картинки (b"", если ориентация обычная):
+    "Exif\\0\\0" + TIFF.
+    """
+    try:
+        with Image.open(BytesIO(data)) as image:
+            orientation = image.getexif().get(ORIENTATION, 1)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return b""
+    if orientation == 1:
+        return b""
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    return exif.tobytes()
+
+
+def strip(data: bytes) -> bytes:
+    """Содержимое картинки data без метаданных."""
+    try:
+        if data.startswith(JPEG_SOI):
+            return _strip_jpeg(data)
+        if data.startswith(PNG_SIGNATURE):
+            return _strip_png(data)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _strip_webp(data)
+    except (IndexError, struct.error):
+        # Поврежденный файл не изменяется: его отклонит обработка
+        pass
+    return data
+
+
+def _strip_jpeg(data: bytes) -> bytes:
+    exif = orientation_exif(data)
+    parts = [JPEG_SOI]
+    if exif:
+        parts.append(b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif)
+    pos = len(JPEG_SOI)
+    while pos < len(data):
+        if data[pos] != 0xFF:
+            raise IndexError("Нет маркера сегмента JPEG")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Заполнение перед маркером
+            pos += 1
+            continue
+        if marker in JPEG_STANDALONE:
+            parts.append(data[pos:pos + 2])
+            pos += 2
+            continue
+        if marker == JPEG_SOS:
+            # Дальше - сжатые данные до конца файла
+            parts.append(data[pos:])
+            break
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        end = pos + 2 + length
+        if marker not in JPEG_METADATA:
+            parts.append(data[pos:end])
+        pos = end
+    return b"".join(parts)
+
+
+def _png_chunk(chunk_type: bytes, body: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(body))
+        + chunk_type
+        + body
+        + struct.pack(">I", zlib.crc32(chunk_type + body))
+    )
+
+
+def _strip_png(data: bytes) -> bytes:
+    exif = orientation_exif(data)
+    parts = [PNG_SIGNATURE]
+    pos = len(PNG_SIGNATURE)
+    while pos < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        end = pos + 12 + length
+        if chunk_type not in PNG_METADATA:
+            parts.append(data[pos:end])
+            if chunk_type == b"IHDR" and exif:
+                parts.append(_png_chunk(b"eXIf", exif[len(EXIF_HEADER):]))
+        if chunk_type == b"IEND":
+            break
+        pos = end
+    return b"".join(parts)
+
+
+def _strip_webp(data: bytes) -> bytes:
+    exif = orientation_exif(data)
+    chunks = []
+    pos = 12
+    while pos + 8 <= len(data):
+        fourcc, length = struct.unpack("<4sI", data[pos:pos + 8])
+        end = pos + 8 + length + length % 2
+        if fourcc == b"VP8X":
+            chunk = bytearray(data[pos:end])
+            chunk[8] &= ~(WEBP_EXIF_FLAG | WEBP_XMP_FLAG) & 0xFF
+            if exif:
+                chunk[8] |= WEBP_EXIF_FLAG
+            chunks.append(bytes(chunk))
+        elif fourcc not in WEBP_METADATA:
+            chunks.append(data[pos:end])
+        pos = end
+    if exif and any(chunk[:4] == b"VP8X" for chunk in chunks):
+        # EXIF - после данных картинки, как его записывают кодировщики
+        body = exif[len(EXIF_HEADER):]
+        padding = b"\0" * (len(body) % 2)
+        chunks.append(b"EXIF" + struct.pack("<I", len(body)) + body + padding)
+    payload = b"WEBP" + b"".join(chunks)
+    return b"RIFF" + struct.pack("<I", len(payload)) + payload
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.19 on 2026-10-18 05:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_list(apps, schema_editor):
+    """Заполняет суммы Списков покупок по текущим данным ShoppingCart."""
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+    ShoppingListItem = apps.get_model("recipes", "ShoppingListItem")
+    totals = (
+        RecipeIngredient.objects.values(
+            "recipe__shopping_cart__user", "ingredient"
+        )
+        .filter(recipe__shopping_cart__user__isnull=False)
+        .annotate(total=models.Sum("amount"))
+        .order_by()
+    )
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=row["recipe__shopping_cart__user"],
+                ingredient_id=row["ingredient"],
+                amount=row["total"],
+            )
+            for row in totals.iterator()
+            if row["total"]
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке покупок',
+                'verbose_name_plural': 'Ингредиенты в списках покупок',
+                'ordering': ['user'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_list, migrations.RunPython.noop),
+    ]
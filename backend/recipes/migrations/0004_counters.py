@@ -0,0 +1,31 @@
+# Generated by Django 3.2.19 on 2026-10-18 05:34
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    from recipes.counters import reconcile
+
+    reconcile(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+        ('recipes', '0003_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.19 on 2026-10-18 05:41
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, storage=recipes.storage.get_recipe_image_storage, upload_to='recipes/img/', verbose_name='Картинка'),
+        ),
+    ]
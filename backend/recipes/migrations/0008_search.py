@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from recipes.search import install
+
+    install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from recipes.search import uninstall
+
+    uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
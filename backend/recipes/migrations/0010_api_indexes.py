@@ -0,0 +1,28 @@
+# Generated by Django 3.2.19 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_ingredient_trigram_index'),
+    ]
+
+    operations = [
+        # Рецепты по тегу (фильтр tags): таблица связи Recipe.tags
+        # создается автоматически, индекс - в SQL
+        migrations.RunSQL(
+            'CREATE INDEX "recipes_recipe_tags_tag_recipe_idx" '
+            'ON "recipes_recipe_tags" ("tag_id", "recipe_id")',
+            'DROP INDEX "recipes_recipe_tags_tag_recipe_idx"',
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'recipe'], name='favorite_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'id'], name='recipe_author_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.19 on 2026-10-18 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_api_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoadedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('checksum', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('ingredients_count', models.PositiveIntegerField(verbose_name='Ингредиентов')),
+                ('loaded_at', models.DateTimeField(auto_now=True, verbose_name='Загружен')),
+            ],
+            options={
+                'verbose_name': 'Загруженный файл',
+                'verbose_name_plural': 'Загруженные файлы',
+                'ordering': ['name'],
+            },
+        ),
+    ]
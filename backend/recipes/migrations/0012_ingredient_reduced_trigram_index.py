@@ -0,0 +1,37 @@
+from django.db import migrations
+
+OLD_INDEX = "recipes_ingredient_name_trgm_idx"
+INDEX = "recipes_ingredient_reduced_trgm_idx"
+# Совпадает с recipes.ingredient_index.REDUCED_SQL
+REDUCED = "translate(lower(name), 'оеяё', 'аиии')"
+
+
+def create_reduced_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {OLD_INDEX}")
+    schema_editor.execute(
+        f"CREATE INDEX {INDEX} ON recipes_ingredient "
+        f"USING GIN (({REDUCED}) gin_trgm_ops)"
+    )
+
+
+def drop_reduced_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+    schema_editor.execute(
+        f"CREATE INDEX {OLD_INDEX} ON recipes_ingredient "
+        f"USING GIN (name gin_trgm_ops)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_loadedfile'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_reduced_index, drop_reduced_index),
+    ]
@@ -7,6 +7,8 @@ from django.db import models
 
 from users.models import CustomUser
 
+from .storage import get_recipe_image_storage
+
 # Определяем пользователя
 USER = CustomUser
 
@@ -26,6 +28,12 @@ class Ingredient(models.Model):
         verbose_name="Единица измерения",
         max_length=200,
     )
+    # Время изменения: версия для условных GET-запросов (api.conditional)
+    updated_at = models.DateTimeField(
+        verbose_name="Изменен",
+        auto_now=True,
+        db_index=True,
+    )
 
     def __str__(self):
         return self.name
@@ -72,6 +80,12 @@ class Tag(models.Model):
         max_length=200,
         unique=True,
     )
+    # Время изменения: версия для условных GET-запросов (api.conditional)
+    updated_at = models.DateTimeField(
+        verbose_name="Изменен",
+        auto_now=True,
+        db_index=True,
+    )
 
     def __str__(self):
         return self.name
@@ -124,8 +138,18 @@ class Recipe(models.Model):
     image = models.ImageField(
         blank=True,
         upload_to="recipes/img/",
+        # Имена файлов - sha256 содержимого (recipes.storage)
+        storage=get_recipe_image_storage,
         verbose_name="Картинка",
     )
+    # Уменьшенные копии картинки (recipes.images):
+    # {"source": оригинал, "variants": {название: {формат: файл}}}
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Варианты картинки",
+    )
     # ReDoc: Описание (string)
     # REQ: Текстовое описание
     text = models.TextField(
@@ -138,11 +162,36 @@ class Recipe(models.Model):
         verbose_name="Время приготовления",
         validators=[MinValueValidator(1, "Не менее минуты!")],
     )
+    # Счетчики (обновляются через F() вместе со связанными записями,
+    # расхождения исправляет команда reconcile_counters)
+    # REQ: Общее число добавлений рецепта в избранное
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        db_index=True,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name="В списках покупок",
+        default=0,
+        db_index=True,
+        editable=False,
+    )
+    # Время изменения: версия для условных GET-запросов (api.conditional)
+    updated_at = models.DateTimeField(
+        verbose_name="Изменен",
+        auto_now=True,
+        db_index=True,
+    )
 
     def __str__(self):
         return self.name
 
     class Meta:
+        # Рецепты автора в порядке id (фильтр author, рецепты подписок)
+        indexes = [
+            models.Index(fields=("author", "id"), name="recipe_author_id_idx")
+        ]
         ordering = ["id"]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
@@ -216,6 +265,13 @@ class Favorite(models.Model):
                 name="unique_favorite",
             )
         ]
+        # Избранное пользователя (фильтр is_favorited): индекс
+        # ограничения уникальности начинается с рецепта
+        indexes = [
+            models.Index(
+                fields=("user", "recipe"), name="favorite_user_recipe_idx"
+            )
+        ]
         ordering = ["id"]
         verbose_name = "Избранное"
         verbose_name_plural = "Избранное"
@@ -251,3 +307,64 @@ class ShoppingCart(models.Model):
         ordering = ["user"]
         verbose_name = "Список покупок"
         verbose_name_plural = "Списки покупок"
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель суммарного количества Ингредиента (Ingredient)
+    в Списке покупок (ShoppingCart) Пользователя (User).
+    Поддерживается при изменении Списка покупок и состава Рецептов
+    (recipes.shopping_list).
+    """
+
+    user = models.ForeignKey(
+        USER,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField("Количество")
+
+    def __str__(self):
+        return f"{self.user}: {self.amount} {self.ingredient}"
+
+    class Meta:
+        # Ограничение уникальности Ингредиента (Ingredient)
+        # в Списке покупок Пользователя (User).
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="unique_shopping_list_item",
+            )
+        ]
+        ordering = ["user"]
+        verbose_name = "Ингредиент в списке покупок"
+        verbose_name_plural = "Ингредиенты в списках покупок"
+
+
+class LoadedFile(models.Model):
+    """
+    Загруженный файл данных (load_ingredients): контрольная сумма
+    и количество Ингредиентов после загрузки. Хранится в базе данных,
+    чтобы повторная загрузка того же файла пропускалась и после
+    пересоздания контейнера.
+    """
+
+    name = models.CharField("Файл", max_length=255, unique=True)
+    checksum = models.CharField("SHA-256", max_length=64)
+    ingredients_count = models.PositiveIntegerField("Ингредиентов")
+    loaded_at = models.DateTimeField("Загружен", auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name = "Загруженный файл"
+        verbose_name_plural = "Загруженные файлы"
@@ -0,0 +1,196 @@
+"""
+Полнотекстовый поиск Рецептов по названию и описанию.
+
+PostgreSQL: вычисляемый столбец recipes_recipe.search_vector (tsvector,
+конфигурация russian; вес A - название, B - описание) пересчитывается
+при каждой записи, по нему построен GIN-индекс. SQLite: таблица FTS5
+recipes_recipe_fts с содержимым из recipes_recipe, синхронизируется
+триггерами. Столбец и таблица не описаны в модели: их создает
+миграция 0008_search. В остальных СУБД поиск - по вхождению подстроки.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+TABLE = "recipes_recipe"
+FTS_TABLE = "recipes_recipe_fts"
+CONFIG = "russian"
+
+# Вес совпадений в названии относительно описания (bm25, SQLite)
+NAME_WEIGHT = 10.0
+
+POSTGRESQL_INSTALL = (
+    f"""
+    ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{CONFIG}', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('{CONFIG}', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    f"CREATE INDEX {TABLE}_search_idx ON {TABLE} USING GIN (search_vector)",
+)
+POSTGRESQL_UNINSTALL = (
+    f"DROP INDEX IF EXISTS {TABLE}_search_idx",
+    f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector",
+)
+
+SQLITE_TRIGGERS = {
+    f"{FTS_TABLE}_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+        AFTER INSERT ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END
+    """,
+    f"{FTS_TABLE}_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+        AFTER DELETE ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+        END
+    """,
+    f"{FTS_TABLE}_update": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+        AFTER UPDATE OF name, text ON {TABLE} BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+            INSERT INTO {FTS_TABLE} (rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END
+    """,
+}
+
+# Наличие таблицы FTS5 по базам данных: {(alias, NAME): bool}
+_fts_available = {}
+
+
+def install(connection):
+    """Создает индекс поиска (миграция 0008_search)."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for sql in POSTGRESQL_INSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == "sqlite" and fts5_supported(connection):
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(name, text, content='{TABLE}', "
+                f"content_rowid='id', tokenize='unicode61')"
+            )
+            restore_triggers(connection)
+    _fts_available.clear()
+
+
+def uninstall(connection):
+    """Удаляет индекс поиска (откат миграции 0008_search)."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for sql in POSTGRESQL_UNINSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == "sqlite":
+            for trigger in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_available.clear()
+
+
+def fts5_supported(connection) -> bool:
+    """Собран ли SQLite с модулем FTS5."""
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return ("ENABLE_FTS5",) in cursor.fetchall()
+
+
+def restore_triggers(connection):
+    """
+    Создает недостающие триггеры SQLite. Миграции, пересоздающие
+    таблицу recipes_recipe, удаляют ее триггеры: в этом случае
+    индекс перестраивается по содержимому таблицы.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = %s AND name = %s",
+            ("table", FTS_TABLE),
+        )
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = %s AND tbl_name = %s",
+            ("trigger", TABLE),
+        )
+        existing = {name for name, in cursor.fetchall()}
+        if existing.issuperset(SQLITE_TRIGGERS):
+            return
+        for sql in SQLITE_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def fts_available(connection) -> bool:
+    """Есть ли в базе SQLite таблица FTS5 (результат кэшируется)."""
+    key = (connection.alias, connection.settings_dict["NAME"])
+    if key not in _fts_available:
+        _fts_available[key] = (
+            FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[key]
+
+
+def fts_query(value: str) -> str:
+    """
+    Запрос FTS5 из строки пользователя: все слова (по началу слова),
+    в кавычках - без операторов синтаксиса FTS5.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", value))
+
+
+def search(queryset, value: str):
+    """
+    Рецепты выборки, найденные по строке value, с аннотацией
+    search_rank (больше - релевантнее), по убыванию релевантности.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        queryset = _search_postgresql(queryset, value)
+    elif connection.vendor == "sqlite" and fts_available(connection):
+        value = fts_query(value)
+        if not value:
+            return queryset.none()
+        queryset = _search_sqlite(queryset, value)
+    else:
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        )
+    return queryset.order_by("-search_rank", "-id")
+
+
+def _search_postgresql(queryset, value: str):
+    query = f"websearch_to_tsquery('{CONFIG}', %s)"
+    return queryset.filter(
+        RawSQL(
+            f"{TABLE}.search_vector @@ {query}",
+            (value,),
+            output_field=BooleanField(),
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f"ts_rank_cd({TABLE}.search_vector, {query})",
+            (value,),
+            output_field=FloatField(),
+        )
+    )
+
+
+def _search_sqlite(queryset, value: str):
+    # Соединение с таблицей FTS5, а не коррелированный подзапрос:
+    # статистика bm25 вычисляется один раз на запрос, а не на строку.
+    # bm25 тем меньше, чем релевантнее совпадение
+    return queryset.extra(
+        select={"search_rank": f"-bm25({FTS_TABLE}, {NAME_WEIGHT}, 1.0)"},
+        tables=(FTS_TABLE,),
+        where=(f"{FTS_TABLE}.rowid = {TABLE}.id", f"{FTS_TABLE} MATCH %s"),
+        params=(value,),
+    )
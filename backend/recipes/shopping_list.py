@@ -0,0 +1,146 @@
+"""
+Поддержка сумм Ингредиентов в Списках покупок (ShoppingListItem).
+
+Суммы изменяются в той же транзакции, что и Список покупок
+или состав Рецепта, поэтому скачивание Списка покупок -
+простое чтение по индексу (user, ingredient).
+"""
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+BATCH_SIZE = 1000
+
+
+def recipe_amounts(recipe_id) -> dict:
+    """Состав Рецепта: {id ингредиента: количество}."""
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            "ingredient_id", "amount"
+        )
+    )
+
+
+def apply_changes(user_ids, deltas: dict) -> None:
+    """
+    Прибавляет изменения deltas ({id ингредиента: количество})
+    к Спискам покупок пользователей user_ids.
+    Вызывается внутри транзакции: строки блокируются до ее завершения.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items()
+        if delta
+    }
+    user_ids = list(user_ids)
+    if not user_ids or not deltas:
+        return
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.select_for_update().filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    to_create.append(
+                        ShoppingListItem(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=delta,
+                        )
+                    )
+                continue
+            item.amount += delta
+            if item.amount > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.id)
+    ShoppingListItem.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    ShoppingListItem.objects.bulk_update(
+        to_update, ["amount"], batch_size=BATCH_SIZE
+    )
+    if to_delete:
+        ShoppingListItem.objects.filter(id__in=to_delete).delete()
+
+
+def add_recipe(user_id, recipe_id) -> None:
+    """Рецепт добавлен в Список покупок пользователя."""
+    apply_changes([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id) -> None:
+    """Рецепт удален из Списка покупок пользователя."""
+    amounts = recipe_amounts(recipe_id)
+    apply_changes(
+        [user_id],
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()},
+    )
+
+
+def change_recipe(recipe_id, old_amounts: dict, new_amounts: dict) -> None:
+    """
+    Состав Рецепта изменен: разница применяется к Спискам покупок
+    всех пользователей, у которых Рецепт в корзине.
+    """
+    deltas = {
+        ingredient_id: new_amounts.get(ingredient_id, 0)
+        - old_amounts.get(ingredient_id, 0)
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    if not any(deltas.values()):
+        return
+    user_ids = ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+        "user_id", flat=True
+    )
+    apply_changes(user_ids, deltas)
+
+
+def expected_items(user_ids):
+    """
+    Суммы, вычисленные заново по ShoppingCart:
+    {(id пользователя, id ингредиента): количество}.
+    """
+    totals = (
+        RecipeIngredient.objects.filter(
+            recipe__shopping_cart__user__in=user_ids
+        )
+        .values_list("recipe__shopping_cart__user", "ingredient")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in totals
+        if total
+    }
+
+
+def stored_items(user_ids):
+    """Суммы из таблицы ShoppingListItem в том же виде."""
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in ShoppingListItem.objects.filter(
+            user_id__in=user_ids
+        ).values_list("user_id", "ingredient_id", "amount")
+    }
+
+
+def rebuild(user_ids) -> None:
+    """Пересчитывает Списки покупок пользователей user_ids."""
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for (user_id, ingredient_id), amount in expected_items(
+                user_ids
+            ).items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
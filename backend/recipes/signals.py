@@ -0,0 +1,157 @@
+"""
+Обработчики сигналов моделей recipes.
+"""
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import CustomUser
+
+from . import (counters, generations, images, ingredient_index, search,
+               shopping_list)
+from .models import Ingredient, Recipe, ShoppingCart, Tag
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """
+    Справочник Ингредиентов изменен: индексы процессов устарели после
+    фиксации транзакции, иначе другой процесс перестроит индекс по
+    прежним данным и сохранит новую метку.
+    """
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_recipes_generation(sender, **kwargs):
+    """Рецепты или их ингредиенты изменены: кэш ответов устарел."""
+    generations.bump(generations.RECIPES)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_generation(sender, **kwargs):
+    """Теги изменены: кэш ответов устарел."""
+    generations.bump(generations.TAGS)
+
+
+@receiver((post_save, post_delete), sender=CustomUser)
+def bump_users_generation(sender, update_fields=None, **kwargs):
+    """
+    Профиль Пользователя (автора Рецептов) изменен: кэш ответов
+    устарел. Вход (обновление last_login) ответы не меняет.
+    """
+    if update_fields is None or set(update_fields) - {"last_login"}:
+        generations.bump(generations.USERS)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created=False, **kwargs):
+    """
+    Ингредиент входит в описание Рецептов:
+    их время изменения (версия для условных GET-запросов) обновляется.
+    """
+    if not created:
+        Recipe.objects.filter(recipe_ingredient__ingredient=instance).update(
+            updated_at=timezone.now()
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(sender, instance, created=False, **kwargs):
+    """Тег изменен или удален: обновляется время изменения Рецептов."""
+    if not created:
+        Recipe.objects.filter(tags=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    """
+    Удаляемый Рецепт исключается из Списков покупок до того,
+    как будут удалены его ингредиенты и записи ShoppingCart.
+    """
+    user_ids = ShoppingCart.objects.filter(recipe=instance).values_list(
+        "user_id", flat=True
+    )
+    amounts = shopping_list.recipe_amounts(instance.id)
+    shopping_list.apply_changes(
+        user_ids,
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()},
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    """Счетчик рецептов автора."""
+    if created:
+        counters.increment(CustomUser, instance.author_id, "recipes_count")
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    """Счетчик рецептов автора."""
+    counters.increment(CustomUser, instance.author_id, "recipes_count", -1)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    """Новая картинка Рецепта: варианты формируются в пуле потоков."""
+    if images.needs_processing(instance):
+        images.schedule(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def release_replaced_recipe_image(sender, instance, raw=False, **kwargs):
+    """Картинка Рецепта заменена: прежний файл освобождается."""
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Recipe.objects.filter(pk=instance.pk)
+        .values_list("image", "image_variants")
+        .first()
+    )
+    if previous is None or previous[0] == instance.image.name:
+        return
+    name, variants = previous[0], images.variant_names(previous[1])
+    transaction.on_commit(lambda: images.release(name, variants))
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    """Картинка удаленного Рецепта освобождается."""
+    name = instance.image.name
+    variants = images.variant_names(instance.image_variants)
+    transaction.on_commit(lambda: images.release(name, variants))
+
+
+@receiver(pre_delete, sender=CustomUser)
+def decrement_user_counters(sender, instance, **kwargs):
+    """
+    Избранное, Списки покупок и Подписки удаляемого пользователя
+    удаляются каскадно: уменьшаются счетчики рецептов и авторов.
+    """
+    for queryset, field in (
+        (Recipe.objects.filter(favorite__user=instance), "favorites_count"),
+        (
+            Recipe.objects.filter(shopping_cart__user=instance),
+            "in_carts_count",
+        ),
+        (CustomUser.objects.filter(author__user=instance), "followers_count"),
+    ):
+        queryset.update(**{field: F(field) - 1})
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    """
+    Миграции SQLite, пересоздающие таблицу Рецептов, удаляют триггеры
+    индекса поиска: они создаются заново после миграций.
+    """
+    connection = connections[using]
+    if sender.name == "recipes" and connection.vendor == "sqlite":
+        search.restore_triggers(connection)
@@ -0,0 +1,101 @@
+"""
+Хранилище картинок Рецептов с адресацией по содержимому.
+
+Имя файла - sha256 его содержимого: <каталог>/<ab>/<sha256>.<расширение>.
+Одинаковые загрузки хранятся одним файлом, а имя никогда не указывает
+на другое содержимое, поэтому файлы можно кэшировать бессрочно
+(Cache-Control: immutable). Один файл могут использовать несколько
+Рецептов: удаляет файлы recipes.images.release, когда ссылок не осталось.
+Загруженные файлы сохраняются без метаданных (recipes.metadata).
+
+Сохранение загрузки и release блокируют имя файла (lock_names)
+до конца транзакции: ссылка на уже сохраненный файл создается
+в той же транзакции, поэтому release либо видит новую ссылку,
+либо удаляет файл раньше - тогда загрузка записывает его заново.
+"""
+import hashlib
+import posixpath
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+
+from . import metadata
+
+
+def lock_names(names) -> None:
+    """
+    Блокирует имена файлов names до конца текущей транзакции.
+    PostgreSQL - рекомендательные блокировки по хэшу имени,
+    другие СУБД (SQLite) - блокировка записи всей базы пустым UPDATE.
+    """
+    names = set(names)
+    if not names:
+        return
+    if connection.vendor == "postgresql":
+        keys = sorted(
+            int.from_bytes(
+                hashlib.sha256(name.encode()).digest()[:8], "big", signed=True
+            )
+            for name in names
+        )
+        with connection.cursor() as cursor:
+            # Блокировки берутся по возрастанию ключа: без взаимоблокировок
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(key) FROM "
+                "(SELECT unnest(%s::bigint[]) AS key ORDER BY 1) AS keys",
+                [keys],
+            )
+    else:
+        apps.get_model("recipes", "Recipe").objects.filter(pk=None).update(
+            image=""
+        )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, именующее файлы по их содержимому.
+    """
+
+    def content_name(self, name, content) -> str:
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, base_name = posixpath.split(name)
+        extension = posixpath.splitext(base_name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        content.seek(0)
+        content = ContentFile(metadata.strip(b"".join(content.chunks())))
+        name = self.content_name(name, content)
+        if connection.in_atomic_block:
+            # Транзакция создаст ссылку на файл. Вне транзакции
+            # (пул процессов import_recipes) имя блокируется позже,
+            # при вставке ссылок
+            lock_names([name])
+        return self.save_as(name, content)
+
+    def save_as(self, name, content) -> str:
+        """
+        Сохраняет content под именем name, если такого файла еще нет:
+        содержимое файла с этим именем уже совпадает с content.
+        """
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+
+recipe_image_storage = ContentAddressedStorage()
+
+
+def get_recipe_image_storage():
+    return recipe_image_storage
@@ -0,0 +1,233 @@
+"""
+Изменения состава Рецептов, Списков покупок, Избранного и Подписок
+через админку: суммы Списков покупок и счетчики сходятся
+с фактическими данными, кэш ответов api устаревает.
+"""
+from api.tests.factories import (LOCMEM_CACHES, client_for, create_ingredients,
+                                 create_recipe, create_tags, create_user)
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from recipes import shopping_list
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import CustomUser, Subscribtion
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AdminShoppingListTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user("admin", is_staff=True, is_superuser=True)
+        cls.buyers = [create_user(f"buyer{number}") for number in range(2)]
+        author = create_user("author")
+        tags = create_tags(1)
+        cls.ingredients = create_ingredients(3)
+        cls.recipe = create_recipe(author, tags, cls.ingredients[:2])
+        cls.other = create_recipe(author, tags, cls.ingredients[1:])
+        for buyer in cls.buyers:
+            ShoppingCart.objects.create(user=buyer, recipe=cls.recipe)
+        Recipe.objects.filter(id=cls.recipe.id).update(in_carts_count=2)
+        shopping_list.rebuild([buyer.id for buyer in cls.buyers])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def assert_consistent(self):
+        user_ids = [buyer.id for buyer in self.buyers]
+        self.assertEqual(
+            shopping_list.stored_items(user_ids),
+            shopping_list.expected_items(user_ids),
+        )
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.in_carts_count,
+                ShoppingCart.objects.filter(recipe=recipe).count(),
+            )
+
+    def test_recipe_ingredient_change_add_delete(self):
+        part = RecipeIngredient.objects.get(
+            recipe=self.recipe, ingredient=self.ingredients[0]
+        )
+        url = "/admin/recipes/recipeingredient/"
+        response = self.client.post(
+            f"{url}{part.id}/change/",
+            {
+                "recipe": self.other.id,
+                "ingredient": self.ingredients[0].id,
+                "amount": 25,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        response = self.client.post(
+            f"{url}add/",
+            {
+                "recipe": self.recipe.id,
+                "ingredient": self.ingredients[0].id,
+                "amount": 7,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        added = RecipeIngredient.objects.latest("id")
+        response = self.client.post(
+            f"{url}{added.id}/delete/", {"post": "yes"}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        response = self.client.post(
+            url,
+            {
+                "action": "delete_selected",
+                "_selected_action": list(
+                    RecipeIngredient.objects.filter(
+                        recipe=self.recipe
+                    ).values_list("id", flat=True)
+                ),
+                "post": "yes",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(
+            RecipeIngredient.objects.filter(recipe=self.recipe).exists()
+        )
+        self.assert_consistent()
+
+    def test_shopping_cart_change_add_delete(self):
+        url = "/admin/recipes/shoppingcart/"
+        cart = ShoppingCart.objects.get(user=self.buyers[0])
+        response = self.client.post(
+            f"{url}{cart.id}/change/",
+            {"user": self.buyers[0].id, "recipe": self.other.id},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        response = self.client.post(
+            f"{url}add/", {"user": self.buyers[0].id, "recipe": self.recipe.id}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        response = self.client.post(f"{url}{cart.id}/delete/", {"post": "yes"})
+        self.assertEqual(response.status_code, 302)
+        self.assert_consistent()
+        response = self.client.post(
+            url,
+            {
+                "action": "delete_selected",
+                "_selected_action": list(
+                    ShoppingCart.objects.values_list("id", flat=True)
+                ),
+                "post": "yes",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assert_consistent()
+
+    def assert_amount_change_visible(self, user, amount):
+        """
+        Ответ api пользователю user закэширован, затем количество
+        ингредиента изменено в админке: api отдает новое количество.
+        """
+        part = RecipeIngredient.objects.get(
+            recipe=self.recipe, ingredient=self.ingredients[0]
+        )
+        path = f"/api/recipes/{self.recipe.id}/"
+        client = client_for(user)
+        client.get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/admin/recipes/recipeingredient/{part.id}/change/",
+                {
+                    "recipe": self.recipe.id,
+                    "ingredient": self.ingredients[0].id,
+                    "amount": amount,
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        amounts = {
+            item["id"]: item["amount"]
+            for item in client.get(path).data["ingredients"]
+        }
+        self.assertEqual(amounts[self.ingredients[0].id], amount)
+
+    def test_recipe_ingredient_change_invalidates_response_cache(self):
+        self.assert_amount_change_visible(None, 30)
+
+    @override_settings(
+        RESPONSE_CACHE={**settings.RESPONSE_CACHE, "SHARED_RECIPES": True}
+    )
+    def test_recipe_ingredient_change_invalidates_shared_bodies(self):
+        self.assert_amount_change_visible(self.buyers[0], 40)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AdminCountersTest(TestCase):
+    """Избранное и Подписки в админке: счетчики объектов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user("admin", is_staff=True, is_superuser=True)
+        cls.users = [create_user(f"user{number}") for number in range(2)]
+        cls.authors = [create_user(f"author{number}") for number in range(2)]
+        tags, ingredients = create_tags(1), create_ingredients(1)
+        cls.recipes = [
+            create_recipe(author, tags, ingredients) for author in cls.authors
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assert_counters(self):
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.favorites_count,
+                Favorite.objects.filter(recipe=recipe).count(),
+            )
+        for user in CustomUser.objects.all():
+            self.assertEqual(
+                user.followers_count,
+                Subscribtion.objects.filter(author=user).count(),
+            )
+
+    def check_admin(self, url, model, field, targets):
+        for user in self.users:
+            response = self.client.post(
+                f"{url}add/", {"user": user.id, field: targets[0].id}
+            )
+            self.assertEqual(response.status_code, 302)
+        self.assert_counters()
+        link = model.objects.earliest("id")
+        response = self.client.post(
+            f"{url}{link.id}/change/",
+            {"user": link.user_id, field: targets[1].id},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_counters()
+        response = self.client.post(f"{url}{link.id}/delete/", {"post": "yes"})
+        self.assertEqual(response.status_code, 302)
+        self.assert_counters()
+        response = self.client.post(
+            url,
+            {
+                "action": "delete_selected",
+                "_selected_action": list(
+                    model.objects.values_list("id", flat=True)
+                ),
+                "post": "yes",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(model.objects.exists())
+        self.assert_counters()
+
+    def test_favorite(self):
+        self.check_admin(
+            "/admin/recipes/favorite/", Favorite, "recipe", self.recipes
+        )
+
+    def test_subscribtion(self):
+        self.check_admin(
+            "/admin/users/subscribtion/", Subscribtion, "author", self.authors
+        )
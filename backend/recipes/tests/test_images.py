@@ -0,0 +1,220 @@
+"""
+Картинки Рецептов: метаданные загруженного файла и --force
+команды build_image_variants.
+"""
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from api.tests.factories import (LOCMEM_CACHES, create_ingredients,
+                                 create_recipe, create_tags, create_user)
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from recipes import generations, images, metadata
+from recipes.models import Recipe
+from recipes.storage import ContentAddressedStorage
+
+GPS_INFO = 0x8825
+MAKE = 0x010F
+
+
+def encode(image_format, orientation=6, **params):
+    """Картинка 40x20 с EXIF: ориентация, камера и координаты."""
+    exif = Image.Exif()
+    exif[metadata.ORIENTATION] = orientation
+    exif[MAKE] = "Камера"
+    exif[GPS_INFO] = {1: "N", 2: (55.0, 45.0, 0.0)}
+    buffer = BytesIO()
+    Image.new("RGB", (40, 20), (200, 30, 30)).save(
+        buffer, image_format, exif=exif.tobytes(), **params
+    )
+    return buffer.getvalue()
+
+
+class MetadataTest(TestCase):
+    def assert_stripped(self, data, image_format):
+        stripped = metadata.strip(data)
+        self.assertLess(len(stripped), len(data))
+        self.assertNotIn("Камера".encode(), stripped)
+        with Image.open(BytesIO(stripped)) as image:
+            self.assertEqual(image.format, image_format)
+            exif = image.getexif()
+            self.assertEqual(dict(exif), {metadata.ORIENTATION: 6})
+            self.assertEqual(image.size, (40, 20))
+            image.load()
+
+    def test_jpeg(self):
+        self.assert_stripped(encode("JPEG", comment=b"comment"), "JPEG")
+
+    def test_png(self):
+        self.assert_stripped(encode("PNG"), "PNG")
+
+    def test_webp(self):
+        self.assert_stripped(encode("WEBP"), "WEBP")
+
+    def test_plain_orientation_removes_exif(self):
+        stripped = metadata.strip(encode("JPEG", orientation=1))
+        with Image.open(BytesIO(stripped)) as image:
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_not_image_unchanged(self):
+        for data in (b"", b"text", b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n"):
+            self.assertEqual(metadata.strip(data), data)
+
+    def test_storage_saves_stripped_content(self):
+        with tempfile.TemporaryDirectory() as location:
+            files = ContentAddressedStorage(location=location)
+            data = encode("JPEG")
+            name = files.save("recipes/img/image.jpg", ContentFile(data))
+            with files.open(name) as stored:
+                self.assertEqual(stored.read(), metadata.strip(data))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProcessForceTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.files = images.storage()
+
+    def test_force_rewrites_variants(self):
+        author = create_user("author")
+        recipe = create_recipe(author, create_tags(1), create_ingredients(1))
+        name = self.files.save(
+            "recipes/img/image.jpg", ContentFile(encode("JPEG"))
+        )
+        recipe.image = name
+        recipe.save()
+        self.assertTrue(images.process(recipe.id, name))
+        recipe.refresh_from_db()
+        variant = images.variant_name(recipe, images.FULL)
+        path = self.files.path(variant)
+        with open(path, "wb") as damaged:
+            damaged.write(b"damaged")
+        self.assertTrue(images.process(recipe.id, name))
+        with open(path, "rb") as variant_file:
+            self.assertEqual(variant_file.read(), b"damaged")
+        self.assertTrue(images.process(recipe.id, name, force=True))
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (20, 40))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReleaseTest(TransactionTestCase):
+    """Удаление файла без ссылок и одновременная загрузка того же файла."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.files = images.storage()
+        # Варианты не формируются: проверяется только исходный файл
+        schedule = mock.patch.object(images, "schedule")
+        schedule.start()
+        self.addCleanup(schedule.stop)
+        self.author = create_user("author")
+        self.tags = create_tags(1)
+        self.ingredients = create_ingredients(1)
+        self.content = encode("JPEG")
+
+    def upload(self):
+        with transaction.atomic():
+            recipe = create_recipe(self.author, self.tags, self.ingredients)
+            recipe.image = ContentFile(self.content, "image.jpg")
+            recipe.save()
+        return recipe
+
+    def test_release_keeps_referenced_file(self):
+        first, second = self.upload(), self.upload()
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        first.delete()
+        self.assertTrue(self.files.exists(name))
+        second.delete()
+        self.assertFalse(self.files.exists(name))
+
+    @skipUnless(
+        connection.vendor == "postgresql",
+        "Блокировки имен файлов между соединениями - PostgreSQL",
+    )
+    def test_release_waits_for_concurrent_upload(self):
+        name = self.upload().image.name
+        Recipe.objects.all().delete()
+        # Файл остался: release вызывается ниже, одновременно с загрузкой
+        with open(self.files.path(name), "wb") as image_file:
+            image_file.write(metadata.strip(self.content))
+        saved, release_started = threading.Event(), threading.Event()
+
+        def upload():
+            try:
+                with transaction.atomic():
+                    recipe = create_recipe(
+                        self.author, self.tags, self.ingredients
+                    )
+                    recipe.image = ContentFile(self.content, "image.jpg")
+                    recipe.save()
+                    saved.set()
+                    release_started.wait(5)
+                    # release ждет фиксации этой транзакции
+                    time.sleep(0.3)
+            finally:
+                connection.close()
+
+        def release():
+            try:
+                saved.wait(5)
+                release_started.set()
+                images.release(name, [])
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=upload),
+            threading.Thread(target=release),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(Recipe.objects.filter(image=name).exists())
+        self.assertTrue(self.files.exists(name))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RenameTest(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.files = images.storage()
+
+    def test_rename_bumps_recipes_generation(self):
+        recipe = create_recipe(
+            create_user("author"), create_tags(1), create_ingredients(1)
+        )
+        path = self.files.path("recipes/img/old.jpg")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as image_file:
+            image_file.write(encode("JPEG"))
+        Recipe.objects.filter(pk=recipe.pk).update(image="recipes/img/old.jpg")
+        generation = generations.current(generations.RECIPES)
+        call_command("rename_recipe_images", stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.image.name, "recipes/img/old.jpg")
+        self.assertTrue(self.files.exists(recipe.image.name))
+        self.assertNotEqual(
+            generations.current(generations.RECIPES), generation
+        )
@@ -0,0 +1,142 @@
+"""
+Команда import_recipes: проверка структуры и значений строк.
+"""
+import base64
+import json
+import os
+import tempfile
+from io import BytesIO, StringIO
+
+from api.tests.factories import (LOCMEM_CACHES, create_ingredients,
+                                 create_tags, create_user)
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+from recipes.models import Recipe
+
+
+def image_value(color):
+    buffer = BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImportRecipesTest(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media = media.name
+        self.author = create_user("author")
+        self.tag = create_tags(1)[0]
+        self.ingredient = create_ingredients(1)[0]
+
+    def record(self, name, **fields):
+        return {
+            "author": {"username": self.author.username},
+            "name": name,
+            "text": "Описание",
+            "cooking_time": 5,
+            "tags": [self.tag.slug],
+            "ingredients": [
+                {
+                    "name": self.ingredient.name,
+                    "measurement_unit": self.ingredient.measurement_unit,
+                    "amount": 3,
+                }
+            ],
+            **fields,
+        }
+
+    def run_import(self, lines):
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".ndjson", encoding="utf-8", delete=False
+        ) as data_file:
+            data_file.write("\n".join(lines) + "\n")
+        self.addCleanup(os.remove, data_file.name)
+        stderr = StringIO()
+        call_command(
+            "import_recipes",
+            input=data_file.name,
+            workers=2,
+            stdout=StringIO(),
+            stderr=stderr,
+        )
+        return stderr.getvalue()
+
+    def stored_files(self):
+        return [
+            name
+            for _, _, names in os.walk(self.media)
+            for name in names
+        ]
+
+    def test_malformed_records_are_reported_by_line(self):
+        valid = self.record("Рецепт")
+        without_author = self.record("Без автора")
+        del without_author["author"]
+        lines = [
+            json.dumps(valid),
+            json.dumps(without_author),
+            json.dumps(self.record("Без состава", ingredients=None)),
+            json.dumps(self.record("Без тегов", tags="tag-0")),
+            json.dumps(
+                self.record("Автор", author={"username": "x", "is_staff": 1})
+            ),
+            json.dumps(
+                self.record("Ингредиент", ingredients=[{"name": "соль"}])
+            ),
+            json.dumps(["не", "объект"]),
+            "{",
+        ]
+        stderr = self.run_import(lines)
+        self.assertEqual(
+            list(Recipe.objects.values_list("name", flat=True)), ["Рецепт"]
+        )
+        for number in range(2, 9):
+            self.assertIn(f"Строка {number}:", stderr)
+        self.assertNotIn("Строка 1:", stderr)
+
+    def test_out_of_range_records_are_rejected(self):
+        def with_amount(name, amount):
+            return self.record(
+                name,
+                ingredients=[
+                    {
+                        "name": self.ingredient.name,
+                        "measurement_unit": self.ingredient.measurement_unit,
+                        "amount": amount,
+                    }
+                ],
+            )
+
+        lines = [
+            json.dumps(
+                self.record("Рецепт", cooking_time=-1, image=image_value(1))
+            ),
+            json.dumps(self.record("Без времени", cooking_time=0)),
+            json.dumps(with_amount("Без количества", 0)),
+            json.dumps(with_amount("Много", 1001)),
+            json.dumps(self.record("Р" * 201)),
+            json.dumps(self.record("")),
+            json.dumps(
+                self.record(
+                    "Автор", author={"username": self.author.username * 50}
+                )
+            ),
+            json.dumps(with_amount("Рецепт", 1000)),
+        ]
+        stderr = self.run_import(lines)
+        self.assertEqual(
+            list(Recipe.objects.values_list("name", flat=True)), ["Рецепт"]
+        )
+        for number in range(1, 8):
+            self.assertIn(f"Строка {number}:", stderr)
+        self.assertNotIn("Строка 8:", stderr)
+        # Картинка отклоненной строки не сохраняется
+        self.assertEqual(self.stored_files(), [])
@@ -0,0 +1,63 @@
+"""
+Нечеткий поиск Ингредиентов (параметр q): опечатки из запроса
+на доработку.
+"""
+from api.tests.factories import LOCMEM_CACHES, client_for
+from django.test import TestCase, override_settings
+from recipes import ingredient_index
+from recipes.models import Ingredient
+
+NAMES = (
+    "мак",
+    "малина",
+    "маш",
+    "молоко",
+    "молоко 3,2%",
+    "сахар",
+    "сливки",
+    "сливки 10-20%",
+    "сливки 20%",
+    "сливы",
+)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FuzzySearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            for name in NAMES:
+                Ingredient.objects.create(name=name, measurement_unit="г")
+
+    def search(self, query):
+        response = client_for().get("/api/ingredients/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [item["name"] for item in response.data]
+
+    def test_typos(self):
+        for query, expected in (
+            ("малако", ["молоко", "молоко 3,2%"]),
+            ("МАЛОКО", ["молоко", "молоко 3,2%"]),
+            ("сахр", ["сахар"]),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query)[:len(expected)], expected)
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(
+            self.search("сливки 20")[:3],
+            ["сливки 20%", "сливки 10-20%", "сливки"],
+        )
+
+    def test_unrelated_not_found(self):
+        self.assertEqual(self.search("шпинат"), [])
+
+
+class InvalidateTest(TestCase):
+    def test_stamp_replaced_after_commit(self):
+        ingredient_index.invalidate()
+        stamp = ingredient_index._read_stamp()
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name="укроп", measurement_unit="г")
+            self.assertEqual(ingredient_index._read_stamp(), stamp)
+        self.assertNotEqual(ingredient_index._read_stamp(), stamp)
@@ -0,0 +1,100 @@
+"""
+Одновременные переключения Избранного, Списка покупок и Подписок
+(recipes.toggles): счетчики и суммы Списка покупок сходятся
+с фактическими данными.
+"""
+import threading
+from collections import Counter
+from io import StringIO
+from unittest import skipUnless
+
+from api.tests.factories import (LOCMEM_CACHES, create_ingredients,
+                                 create_recipe, create_tags, create_user)
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from recipes import shopping_list
+from recipes.models import Recipe, ShoppingCart
+from rest_framework.test import APIClient
+
+THREADS = 6
+ROUNDS = 5
+
+
+@skipUnless(
+    connection.vendor == "postgresql",
+    "Одновременные транзакции в тестовой базе - PostgreSQL",
+)
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConcurrentTogglesTest(TransactionTestCase):
+    def setUp(self):
+        self.user = create_user("buyer")
+        self.author = create_user("author")
+        self.tags = create_tags(1)
+        self.ingredients = create_ingredients(5)
+
+    def test_one_pair_from_many_threads(self):
+        create_recipe(self.author, self.tags, self.ingredients)
+        call_command(
+            "stress_toggles", threads=THREADS, rounds=2, stdout=StringIO()
+        )
+
+    def test_cart_add_and_remove_of_shared_ingredients(self):
+        # Все Рецепты из одних Ингредиентов: каждое переключение
+        # меняет одни и те же строки Списка покупок
+        recipes = [
+            create_recipe(
+                self.author, self.tags, self.ingredients, amount=number + 1
+            )
+            for number in range(THREADS * 2)
+        ]
+        for recipe in recipes[:THREADS]:
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        Recipe.objects.filter(
+            id__in=[recipe.id for recipe in recipes[:THREADS]]
+        ).update(in_carts_count=1)
+        shopping_list.rebuild([self.user.id])
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def worker(removed, added):
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(self.user)
+            try:
+                for number in range(ROUNDS * 2):
+                    # Рецепты меняются местами в каждом раунде
+                    for recipe, method in (
+                        (removed, "delete"),
+                        (added, "post"),
+                    ):
+                        barrier.wait()
+                        response = getattr(client, method)(
+                            f"/api/recipes/{recipe.id}/shopping_cart/"
+                        )
+                        statuses.append(response.status_code)
+                    removed, added = added, removed
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(
+                target=worker, args=(recipe, recipes[THREADS + number])
+            )
+            for number, recipe in enumerate(recipes[:THREADS])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        waves = THREADS * ROUNDS * 2
+        self.assertEqual(Counter(statuses), Counter({201: waves, 204: waves}))
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.in_carts_count,
+                ShoppingCart.objects.filter(recipe=recipe).count(),
+            )
+        self.assertEqual(
+            shopping_list.stored_items([self.user.id]),
+            shopping_list.expected_items([self.user.id]),
+        )
@@ -0,0 +1,225 @@
+"""
+Добавление и удаление Избранного, Списка покупок и Подписок.
+
+Добавление - INSERT ... ON CONFLICT DO NOTHING, удаление - DELETE
+с количеством удаленных строк: из одновременных запросов одной пары
+изменение выполняет один, остальные получают «уже добавлено» /
+«не найдено» (400), а не нарушение ограничения уникальности (500).
+
+PostgreSQL: проверка существования Рецепта (автора), счетчик
+(recipes.counters) и суммы Списка покупок (recipes.shopping_list)
+входят в тот же оператор (изменяющие данные CTE) - один запрос
+к базе данных на переключение. Другие СУБД (SQLite): те же шаги
+в транзакции, первым выполняется изменение (INSERT OR IGNORE
+в SQLite или удаление).
+"""
+from collections import namedtuple
+
+from django.db import connection, transaction
+
+from users.models import Subscribtion
+
+from . import counters, shopping_list
+from .models import Favorite, RecipeIngredient, ShoppingCart, ShoppingListItem
+
+# Связь пользователя с объектом: модель, поле объекта, счетчик объекта,
+# поддержка сумм Списка покупок
+Relation = namedtuple(
+    "Relation", ("model", "field", "counter", "shopping_list")
+)
+
+FAVORITE = Relation(Favorite, "recipe", "favorites_count", False)
+SHOPPING_CART = Relation(ShoppingCart, "recipe", "in_carts_count", True)
+SUBSCRIBTION = Relation(Subscribtion, "author", "followers_count", False)
+
+# Результат: объект (None - не найден) и признак изменения связи
+Toggle = namedtuple("Toggle", ("target", "changed"))
+
+# Столбец признака изменения в ответе оператора PostgreSQL
+CHANGED = "toggle_changed"
+
+
+def add(relation, user_id, target_id) -> Toggle:
+    """Связь пользователя user_id с объектом target_id добавлена."""
+    return toggle(relation, user_id, target_id, True)
+
+
+def remove(relation, user_id, target_id) -> Toggle:
+    """Связь пользователя user_id с объектом target_id удалена."""
+    return toggle(relation, user_id, target_id, False)
+
+
+def toggle(relation, user_id, target_id, added) -> Toggle:
+    if connection.vendor == "postgresql":
+        sql, params = statement(relation, user_id, target_id, added)
+        target = next(
+            iter(target_model(relation).objects.raw(sql, params)), None
+        )
+        if target is None:
+            return Toggle(None, False)
+        return Toggle(target, target.__dict__.pop(CHANGED))
+    return toggle_in_transaction(relation, user_id, target_id, added)
+
+
+def target_model(relation):
+    return relation.model._meta.get_field(relation.field).related_model
+
+
+def toggle_in_transaction(relation, user_id, target_id, added) -> Toggle:
+    """
+    Переключение без изменяющих данные CTE. Изменение выполняется
+    до чтения объекта: в SQLite транзакция сразу берет блокировку
+    записи и не взаимоблокируется с одновременной.
+    """
+    model = target_model(relation)
+    with transaction.atomic():
+        if added:
+            changed = insert_or_ignore(relation, user_id, target_id)
+        else:
+            changed = (
+                relation.model.objects.filter(
+                    user_id=user_id, **{f"{relation.field}_id": target_id}
+                ).delete()[0]
+                > 0
+            )
+        target = model.objects.filter(pk=target_id).first()
+        if target is None:
+            # Связь с несуществующим объектом (SQLite проверяет внешние
+            # ключи при фиксации) отменяется
+            transaction.set_rollback(True)
+            return Toggle(None, False)
+        if changed:
+            counters.increment(
+                model, target_id, relation.counter, 1 if added else -1
+            )
+            if relation.shopping_list:
+                if added:
+                    shopping_list.add_recipe(user_id, target_id)
+                else:
+                    shopping_list.remove_recipe(user_id, target_id)
+    return Toggle(target, changed)
+
+
+def insert_or_ignore(relation, user_id, target_id) -> bool:
+    """
+    Вставка связи без ошибки при нарушении уникальности
+    (как bulk_create(ignore_conflicts=True)): добавлена ли строка.
+    """
+    ops = connection.ops
+    link = names(relation.model, "user", relation.field)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{ops.insert_statement(ignore_conflicts=True)} {link['table']} "
+            f"({link['user']}, {link[relation.field]}) VALUES (%s, %s) "
+            f"{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}",
+            (user_id, target_id),
+        )
+        return cursor.rowcount == 1
+
+
+def names(model, *fields) -> dict:
+    """Экранированные имена таблицы и столбцов модели."""
+    quote = connection.ops.quote_name
+    return {
+        "table": quote(model._meta.db_table),
+        **{
+            field: quote(model._meta.get_field(field).column)
+            for field in fields
+        },
+    }
+
+
+def statement(relation, user_id, target_id, added):
+    """
+    Оператор PostgreSQL: строка объекта (нет строки - объект
+    не найден) со столбцом CHANGED.
+    """
+    target = target_model(relation)
+    target_sql, params = (
+        target.objects.filter(pk=target_id).order_by().query.sql_with_params()
+    )
+    link = names(relation.model, "user", relation.field)
+    counter = names(target, target._meta.pk.name, relation.counter)
+    pk, field = counter[target._meta.pk.name], link[relation.field]
+    if added:
+        change = (
+            f"INSERT INTO {link['table']} ({link['user']}, {field}) "
+            f"SELECT %s, {pk} FROM target "
+            f"ON CONFLICT DO NOTHING RETURNING {field}"
+        )
+    else:
+        change = (
+            f"DELETE FROM {link['table']} WHERE {link['user']} = %s "
+            f"AND {field} IN (SELECT {pk} FROM target) RETURNING {field}"
+        )
+    delta = "+ 1" if added else "- 1"
+    ctes = [
+        f"target AS ({target_sql})",
+        f"changed AS ({change})",
+        f"counted AS (UPDATE {counter['table']} "
+        f"SET {counter[relation.counter]} = "
+        f"{counter[relation.counter]} {delta} "
+        f"WHERE {pk} IN (SELECT {field} FROM changed))",
+    ]
+    params = (*params, user_id)
+    if relation.shopping_list:
+        listed, listed_params = shopping_list_ctes(field, user_id, added)
+        ctes.extend(listed)
+        params += listed_params
+    sql = (
+        f"WITH {', '.join(ctes)} "
+        f"SELECT target.*, EXISTS (SELECT 1 FROM changed) AS {CHANGED} "
+        f"FROM target"
+    )
+    return sql, params
+
+
+def shopping_list_ctes(recipe, user_id, added):
+    """
+    Суммы Списка покупок как в shopping_list.add_recipe / remove_recipe:
+    состав Рецепта из CTE changed прибавляется к строкам пользователя
+    (новые создаются) или вычитается (строки без остатка удаляются).
+
+    Строки блокируются по порядку Ингредиентов. При удалении новые
+    суммы вычисляются по заблокированным строкам (CTE locked): условия
+    UPDATE и DELETE по снимку оператора не видят сумму, измененную
+    одновременным добавлением, и строка не попадала ни в один из них.
+    """
+    item = names(ShoppingListItem, "id", "user", "ingredient", "amount")
+    part = names(RecipeIngredient, "recipe", "ingredient", "amount")
+    table, amount = item["table"], item["amount"]
+    if added:
+        return (
+            [
+                f"listed AS (INSERT INTO {table} "
+                f"({item['user']}, {item['ingredient']}, {amount}) "
+                f"SELECT %s, {part['ingredient']}, {part['amount']} "
+                f"FROM {part['table']} "
+                f"WHERE {part['recipe']} IN (SELECT {recipe} FROM changed) "
+                f"AND {part['amount']} > 0 "
+                f"ORDER BY {part['ingredient']} "
+                f"ON CONFLICT ({item['user']}, {item['ingredient']}) "
+                f"DO UPDATE SET {amount} = "
+                f"{table}.{amount} + EXCLUDED.{amount})"
+            ],
+            (user_id,),
+        )
+    return (
+        [
+            f"locked AS (SELECT {table}.{item['id']} AS item_id, "
+            f"{table}.{amount} - part.{part['amount']} AS left_amount "
+            f"FROM {table} JOIN {part['table']} AS part "
+            f"ON {table}.{item['ingredient']} = part.{part['ingredient']} "
+            f"WHERE part.{part['recipe']} IN (SELECT {recipe} FROM changed) "
+            f"AND {table}.{item['user']} = %s "
+            f"ORDER BY {table}.{item['ingredient']} "
+            f"FOR UPDATE OF {table})",
+            f"listed AS (UPDATE {table} SET {amount} = locked.left_amount "
+            f"FROM locked WHERE {table}.{item['id']} = locked.item_id "
+            f"AND locked.left_amount > 0)",
+            f"unlisted AS (DELETE FROM {table} USING locked "
+            f"WHERE {table}.{item['id']} = locked.item_id "
+            f"AND locked.left_amount <= 0)",
+        ],
+        (user_id,),
+    )
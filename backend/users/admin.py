@@ -1,4 +1,6 @@
 from django.contrib import admin
+from recipes.admin import CountedLinkAdmin
+from recipes.toggles import SUBSCRIBTION
 
 from . import models
 
@@ -16,26 +18,37 @@ class CustomUserAdmin(admin.ModelAdmin):
         "password",
         "first_name",
         "last_name",
+        "recipes_count",
+        "followers_count",
     )
     # REQ: Администратор обладает всеми правами авторизованного пользователя
     # REQ: Плюс к этому он может:
     # REQ: - изменять пароль любого пользователя
     list_editable = ("password",)
     # REQ: Добавить фильтр списка по email и имени пользователя
-    list_filter = ("email", "username")
+    # Фильтры по уникальным полям перечисляли бы всех пользователей,
+    # email и имя пользователя ищутся через поиск.
+    list_filter = ("is_staff", "is_active")
     search_fields = (
-        "pk",
         "username",
         "email",
         "first_name",
         "last_name",
     )
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE
 
 
-class SubscribtionAdmin(admin.ModelAdmin):
+class SubscribtionAdmin(CountedLinkAdmin):
+    relation = SUBSCRIBTION
     list_display = ("pk", "user", "author")
-    list_editable = ("user", "author")
+    search_fields = (
+        "user__username",
+        "author__username",
+    )
+    autocomplete_fields = ("user", "author")
+    list_select_related = ("user", "author")
+    show_full_result_count = False
     empty_value_display = EMPTY_VALUE
 
 
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.19 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscribtion',
+            index=models.Index(fields=['user', 'id'], name='subscribtion_user_id_idx'),
+        ),
+    ]
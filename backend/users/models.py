@@ -58,6 +58,21 @@ class CustomUser(AbstractUser):
         null=False,
     )
 
+    # Счетчики (обновляются через F() вместе со связанными записями,
+    # расхождения исправляет команда reconcile_counters)
+    recipes_count = models.PositiveIntegerField(
+        "Рецептов",
+        default=0,
+        db_index=True,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        "Подписчиков",
+        default=0,
+        db_index=True,
+        editable=False,
+    )
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = (
         "username",
@@ -102,5 +117,11 @@ class Subscribtion(models.Model):
                 name="unique_user_author",
             )
         ]
+        # Подписки пользователя в порядке id (users/subscriptions/)
+        indexes = [
+            models.Index(
+                fields=("user", "id"), name="subscribtion_user_id_idx"
+            )
+        ]
         verbose_name = "Подписка на авторов"
         verbose_name_plural = "Подписка на авторов"